@@ -0,0 +1,200 @@
+# File: CMZ_data_explorer/CMZ_explorer.py
+# -*- coding: utf-8 -*-
+"""
+Combined app of the shock and protostellar object explorers: one server process with one page per model
+grid, and a page comparing the two grids.
+
+    /shocks                  the shock explorer (as Shocks.py)
+    /protostellar-objects    the protostellar object explorer (as Protostellar_objects.py)
+    /comparison              the same species in the selections of both pages, overlaid (see comparison.py)
+    /_stats                  size of the data and of the caches of both grids, as JSON
+
+Both grids are loaded once, by their data engines (see data_engine.py), and share the process, the session
+store, the background jobs and, in the low-memory mode, the memory budget of the caches. Run it with:
+
+    python CMZ_explorer.py
+"""
+# Import necessary libraries
+import dash
+import flask
+import plotly.express as px
+from dash import dcc
+from dash import html
+from data_engine import MODELS, DataEngine
+from model_page import ModelPage
+from aggregation import envelope_band
+from comparison import MODEL_LABELS, common_species, selection_percentiles, comparison_figure
+from background_jobs import make_background_manager
+from serialization import configure_json_engine, compression_enabled
+from serving import serve
+from selection_cache import cache_budget
+from session_store import make_session_store
+from config import AGGREGATE_PERCENTILES, DEFAULT_MARKER_SIZE
+
+# Page shown at each path
+PAGE_PATHS = {
+    "/": "cshock",
+    "/shocks": "cshock",
+    "/protostellar-objects": "hotcore",
+    "/comparison": "comparison",
+}
+# Links of the navigation bar
+NAVIGATION = [
+    ("Shocks", "/shocks"),
+    ("Protostellar objects", "/protostellar-objects"),
+    ("Comparison", "/comparison"),
+]
+
+# Heavy callbacks run as background jobs when possible (see background_jobs.py); their stored results are only reused
+# for the versions of the data they were computed from
+background_manager = make_background_manager(lambda: tuple(engine.data_version for engine in engines.values()))
+# Selected rows of every browser tab, for both pages (see session_store.py)
+session_store = make_session_store(shared=background_manager is not None)
+
+# Data of both grids: tables, indices, caches and sessions (see data_engine.py)
+engines = {model: DataEngine(model, session_store) for model in MODELS}
+
+# Initialize the Dash app - responses are serialized with orjson and compressed when possible (see serialization.py)
+configure_json_engine()
+app = dash.Dash(__name__, background_callback_manager=background_manager, compress=compression_enabled(),
+                title="CMZ Data Explorer")
+# WSGI application, for serving with any WSGI server (see serving.py)
+server = app.server
+
+# One page per grid; the ids of their components start with the model, e.g. 'cshock-df-graph' (see model_page.py)
+pages = {model: ModelPage(app, engine, background_manager, prefix=f"{model}-") for model, engine in engines.items()}
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+def comparison_layout():
+    """
+    Layout of the comparison page.
+
+    Returns:
+        dash.html.Div: The layout.
+    """
+    return html.Div([
+        html.H1("Shocks versus Protostellar Objects 🔎"),
+        html.P("Abundance of a species in the selection of the shock page and in the selection of the protostellar "
+               "object page (stage and parameters as set on each page), shown as the median and a percentile band "
+               "per age bin."),
+        html.Div([
+            html.Div([
+                html.Label("Species:", style={"font-weight": "bold", "margin-right": "10px"}),
+                dcc.Dropdown(
+                    id="comparison-species",
+                    options=[{"label": species, "value": species} for species in common_species(engines)],
+                    placeholder="Select a species...",
+                ),
+            ], style={"display": "inline-block", "width": "250px", "margin-right": "30px", "vertical-align": "middle"}),
+            html.Div([
+                html.Label("Y-axis scale:", style={"font-weight": "bold", "margin-right": "10px"}),
+                dcc.RadioItems(
+                    id="comparison-y-axis-scale",
+                    options=[
+                        {"label": "Logarithmic", "value": "log"},
+                        {"label": "Linear", "value": "linear"}
+                    ],
+                    value="log",
+                    inline=True,
+                ),
+            ], style={"display": "inline-block", "margin-right": "30px", "vertical-align": "middle"}),
+            html.Div([
+                html.Label("Envelope percentiles:", style={"font-weight": "bold", "margin-right": "10px"}),
+                dcc.RangeSlider(
+                    id="comparison-percentiles",
+                    min=0,
+                    max=100,
+                    step=1,
+                    value=[AGGREGATE_PERCENTILES[0], AGGREGATE_PERCENTILES[-1]],
+                    marks={i: str(i) for i in range(0, 101, 25)},
+                    tooltip={"placement": "bottom", "always_visible": True}
+                ),
+            ], style={"display": "inline-block", "width": "250px", "vertical-align": "middle"}),
+        ], style={"margin-bottom": "10px"}),
+        html.Div(id="comparison-validation-message", style={"color": "red", "margin": "10px 0"}),
+        dcc.Graph(id="comparison-graph"),
+    ])
+
+# Define the Dash layout - every page is in the layout, the path only sets which one is shown
+app.layout = html.Div(
+    [
+        dcc.Location(id="url"),
+        html.Div(
+            [dcc.Link(text, href=path, style={"margin-right": "20px"}) for text, path in NAVIGATION],
+            style={"margin-bottom": "10px"},
+        ),
+        *[html.Div(page.layout, id=f"page-{model}") for model, page in pages.items()],
+        html.Div(comparison_layout(), id="page-comparison"),
+    ]
+)
+
+# Show the page of the path
+@app.callback(
+    [dash.Output(f"page-{name}", "style") for name in [*pages, "comparison"]],
+    dash.Input("url", "pathname"),
+)
+def show_page(pathname):
+    shown = PAGE_PATHS.get(pathname, "cshock")
+    return [{"display": "block" if name == shown else "none"} for name in [*pages, "comparison"]]
+
+# Comparison of a species in the selections of both pages - runs in the request, only while the page is shown
+@app.callback(
+    [
+        dash.Output("comparison-graph", "figure"),
+        dash.Output("comparison-validation-message", "children"),
+    ],
+    [
+        dash.Input("url", "pathname"),
+        dash.Input("comparison-species", "value"),
+        dash.Input("comparison-percentiles", "value"),
+        dash.Input("comparison-y-axis-scale", "value"),
+    ],
+    [
+        state
+        for page in pages.values()
+        for state in [dash.State(page.id("df-dropdown-type"), "value"),
+                      *[dash.State(page.id(control), "value") for control, _ in page.filters]]
+    ],
+)
+def update_comparison(pathname, species, percentiles, y_scale, *page_values):
+    if PAGE_PATHS.get(pathname) != "comparison":
+        raise dash.exceptions.PreventUpdate
+    if not species:
+        return px.scatter(title="No species selected"), ""
+
+    lower, _, upper = envelope_band(percentiles)
+    tables = {}
+    start  = 0
+    for model, page in pages.items():
+        # Stage and filters of the page
+        stage, *values = page_values[start:start + len(page.filters) + 1]
+        start += len(page.filters) + 1
+        table = selection_percentiles(engines[model], stage, page.selection(values), species, (lower, 50, upper))
+        if not table.empty:
+            tables[f"{MODEL_LABELS[model]} ({stage})"] = table
+    if not tables:
+        return dash.no_update, "⚠️ The selections of both pages have no data for this species."
+    return comparison_figure(tables, species, (lower, 50, upper), y_scale, DEFAULT_MARKER_SIZE, ["grid"]), ""
+
+# Size of the data and of the caches of both grids - the metrics of the process
+@server.route("/_stats")
+def stats():
+    budget = None
+    if cache_budget is not None:
+        budget = {"megabytes": round(cache_budget.n_bytes / 2 ** 20, 1),
+                  "max_megabytes": round(cache_budget.max_bytes / 2 ** 20, 1)}
+    return flask.jsonify({"models": {model: engine.stats() for model, engine in engines.items()},
+                          "memory_budget": budget})
+
+def start_background_tasks():
+    """Prewarm the caches and start watching the data files of both grids, in the process that serves the requests."""
+    for model, page in pages.items():
+        page.prewarm_caches()
+        engines[model].start()
+
+# Run the server - the development server or the threaded production server, as set in config.py
+if __name__ == "__main__":
+    serve(app, on_start=start_background_tasks)
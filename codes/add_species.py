@@ -0,0 +1,187 @@
+# File: CMZ_data_explorer/add_species.py
+# -*- coding: utf-8 -*-
+"""
+Incremental extraction: add species to the existing pickle files without extracting the whole grid again.
+
+data_extraction.py reads every run of the HDF5 grid for all the species of mol_all, which takes hours.
+Here only the requested species are read, only for the runs that are already in the pickle file, in
+parallel worker processes. They are aligned to the existing rows by (run_id, timestep) - the position of
+a row within its run, as written by data_extraction.py - and written as new species column files, which
+the apps read when the species is selected (see species_catalog.py). The species are added to the
+catalog, and the per-run summary table (see run_summary.py) is extended with them. Example:
+
+    python add_species.py cshock H2S OCS "#H2S" "@H2S" --processes 4
+
+Species that are already in the pickle file or have a column file are skipped. Running apps list the new
+species in their dropdowns after a restart.
+"""
+# Import necessary libraries
+import argparse
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
+import pandas as pd
+from functionality import cube_axes_cshock, cube_axes_hotcore
+from run_summary import summarize_runs
+from species_catalog import load_catalog, catalog_species, make_catalog, write_catalog, SpeciesColumns
+from config import (
+                cshock_pkl,
+                hotcore_pkl,
+                cshock_summary_pkl,
+                hotcore_summary_pkl,
+                cshock_catalog_json,
+                hotcore_catalog_json,
+                cshock_species_dir,
+                hotcore_species_dir,
+                grid_path
+               )
+
+# Data files and run parameters of each model
+MODELS = {
+    "cshock":  dict(pkl=cshock_pkl, summary_pkl=cshock_summary_pkl, catalog_json=cshock_catalog_json,
+                    species_dir=cshock_species_dir, parameters=cube_axes_cshock),
+    "hotcore": dict(pkl=hotcore_pkl, summary_pkl=hotcore_summary_pkl, catalog_json=hotcore_catalog_json,
+                    species_dir=hotcore_species_dir, parameters=cube_axes_hotcore),
+}
+RUNS_PER_TASK = 50  # Number of runs read by a worker process at once (the grid file is opened once per task)
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+def read_run_species(path, run_ids, species):
+    """
+    Abundances of some species in some runs of the grid.
+
+    Args:
+        path (str): Path to the grid file.
+        run_ids (list): Runs to read.
+        species (list): Species to read.
+
+    Returns:
+        dict: {run_id: np.ndarray of shape (timesteps, species)}, with the timesteps in the order of the grid.
+    """
+    values = {}
+    with pd.HDFStore(path, mode='r') as store:
+        for run_id in run_ids:
+            try:
+                # Runs stored in the 'table' format are read column by column
+                df = store.select(run_id, columns=list(species))
+            except TypeError:
+                # The 'fixed' format can only be read whole
+                df = store.get(run_id)
+            missing = [name for name in species if name not in df.columns]
+            if missing:
+                raise KeyError(f"Species {missing} are not in run {run_id} of {path}.")
+            values[run_id] = df[list(species)].to_numpy(dtype=float)
+    return values
+
+def add_species(df, species, path=grid_path, processes=1, runs_per_task=RUNS_PER_TASK):
+    """
+    Append the abundances of some species, read from the grid, to a long model table.
+
+    Args:
+        df (pd.DataFrame): Long model table written by data_extraction.py (all timesteps of every run,
+                           in the order of the grid).
+        species (list): Species to add; they must not be columns of df yet.
+        path (str): Path to the grid file.
+        processes (int): Number of worker processes. With 1 (or less) the runs are read in this process.
+        runs_per_task (int): Number of runs read by a worker process at once.
+
+    Returns:
+        pd.DataFrame: df with one new column per species.
+    """
+    # Positions of the rows of every run, in timestep order
+    rows_of_run = df.groupby('run_id', sort=False).indices
+    run_ids     = list(rows_of_run)
+    tasks       = [run_ids[first:first + runs_per_task] for first in range(0, len(run_ids), runs_per_task)]
+
+    values = np.full((len(df), len(species)), np.nan)
+    if processes > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(read_run_species, repeat(path), tasks, repeat(species)))
+    else:
+        results = [read_run_species(path, task, species) for task in tasks]
+    for result in results:
+        for run_id, run_values in result.items():
+            rows = rows_of_run[run_id]
+            if len(run_values) != len(rows):
+                raise ValueError(f"Run {run_id} has {len(run_values)} timesteps in the grid but {len(rows)} "
+                                 f"rows in the table; extract the grid again with data_extraction.py.")
+            values[rows] = run_values
+
+    return pd.concat([df, pd.DataFrame(values, columns=list(species), index=df.index)], axis=1)
+
+def extend_summary(summary, df, parameters, species):
+    """
+    Add the rows of some species to a per-run summary table.
+
+    Args:
+        summary (pd.DataFrame): Output of summarize_runs.
+        df (pd.DataFrame): Long model table with the species.
+        parameters (list): Parameter columns of the runs.
+        species (list): Species to add.
+
+    Returns:
+        pd.DataFrame: The summary of all the species.
+    """
+    extended = pd.concat([summary, summarize_runs(df, parameters, species=species)], ignore_index=True)
+    for column in ['run_id', 'stage', 'species']:
+        extended[column] = extended[column].astype(str).astype('category')
+    return extended
+
+def write_pickle(data, path):
+    """Write a pickle file, replacing the old one atomically (readers see either the old or the new file)."""
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'wb') as file:
+        pickle.dump(data, file)
+    os.replace(temporary, path)
+
+def main(argv=None):
+    """
+    Parse the model and species from the command line and add the species to the model's data files.
+
+    Args:
+        argv (list): Command-line arguments (sys.argv[1:] if None).
+
+    Returns:
+        list: The added species.
+    """
+    parser = argparse.ArgumentParser(description="Add species to the extracted pickle files without extracting the whole grid.")
+    parser.add_argument("model", choices=list(MODELS), help="Model grid.")
+    parser.add_argument("species", nargs="+", help="Species to add, e.g. H2S '#H2S' '@H2S'.")
+    parser.add_argument("--grid", default=grid_path, help="Path to the grid file (grid_path in config.py by default).")
+    parser.add_argument("--processes", type=int, default=1, help="Number of worker processes.")
+    args = parser.parse_args(argv)
+    model = MODELS[args.model]
+
+    with open(model["pkl"], 'rb') as file:
+        model_df = pickle.load(file)
+    species_columns = SpeciesColumns(model["species_dir"])
+    species = [name for name in dict.fromkeys(args.species)
+               if name not in model_df.columns and name not in species_columns]
+    skipped = [name for name in args.species if name not in species]
+    if skipped:
+        print(f"Already extracted: {skipped}")
+    if not species:
+        return []
+
+    model_df = add_species(model_df, species, path=args.grid, processes=args.processes)
+    for name in species:
+        species_columns.write(name, model_df[name].to_numpy())
+    write_catalog(make_catalog(catalog_species(load_catalog(model["catalog_json"])) + species), model["catalog_json"])
+    print(f"Added {species} to {model['species_dir']} and {model['catalog_json']}")
+
+    # Without a summary file the apps summarize all the species when they start
+    if os.path.exists(model["summary_pkl"]):
+        with open(model["summary_pkl"], 'rb') as file:
+            summary = pickle.load(file)
+        write_pickle(extend_summary(summary, model_df, model["parameters"], species), model["summary_pkl"])
+        print(f"Added {species} to {model['summary_pkl']}")
+    return species
+
+
+if __name__ == "__main__":
+    main()
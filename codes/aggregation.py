@@ -0,0 +1,168 @@
+# File: CMZ_data_explorer/aggregation.py
+# -*- coding: utf-8 -*-
+"""
+This module contains the functions used by the visualization apps (Shocks.py and Protostellar_objects.py)
+to keep oversized selections responsive and readable:
+- the number of rows of a selection is estimated before filtering, from the number of rows of every
+  combination of grid parameters (counted once when the data is loaded), and
+- selections can be shown aggregated (the "envelope" plot mode, used automatically for selections that
+  are too large): per logarithmic age bin, and optionally per group of runs, the median and a
+  percentile band of every species across the runs, instead of every single point.
+"""
+# Import necessary libraries
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from functionality import format_molecule_HTML
+from config import AGGREGATE_N_BINS, AGGREGATE_PERCENTILES
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+def parameter_row_counts(df, parameters):
+    """
+    Count the rows of every combination of parameter values present in a DataFrame.
+
+    Args:
+        df (pd.DataFrame): Model table.
+        parameters (list): Parameter columns, e.g. ['shock_vel', 'initialDens', 'zeta', 'radfield', 'initialTemp'].
+
+    Returns:
+        pd.DataFrame: One row per parameter combination with the parameter columns and a 'rows' column.
+    """
+    return df.groupby(parameters, sort=False).size().rename('rows').reset_index()
+
+def estimate_rows(row_counts, selection):
+    """
+    Number of rows of a selection, computed from the row counts of the parameter combinations
+    (without filtering the model table itself).
+
+    Args:
+        row_counts (pd.DataFrame): Output of parameter_row_counts.
+        selection (dict): Selected values for each parameter, e.g. {'zeta': [10., 100.], ...}.
+
+    Returns:
+        int: Number of rows of the selection.
+    """
+    mask = np.ones(len(row_counts), dtype=bool)
+    for parameter, values in selection.items():
+        mask &= row_counts[parameter].isin(values or []).to_numpy()
+    return int(row_counts['rows'].to_numpy()[mask].sum())
+
+def binned_percentiles(df, species, n_bins=AGGREGATE_N_BINS, percentiles=AGGREGATE_PERCENTILES, group_columns=()):
+    """
+    Per logarithmic age bin (and per group of runs), compute percentiles of the abundance of every species
+    across the runs in the bin. Every run is first reduced to its median in the bin, so runs with many (adaptive)
+    timesteps in a bin weigh as much as the others. The size of the result scales with the number of bins, not
+    with the number of rows.
+
+    Args:
+        df (pd.DataFrame): Selected rows, with the columns 'age' and 'run_id', the species columns and the
+                           group columns.
+        species (list): Species to aggregate.
+        n_bins (int): Number of logarithmic age bins spanning the ages of df.
+        percentiles (tuple): Three percentiles (lower, middle, upper), e.g. (16, 50, 84).
+        group_columns (list): Parameters whose values are aggregated separately, e.g. ['zeta'].
+
+    Returns:
+        pd.DataFrame: Long table with the group columns and the columns 'age' (bin center), 'species',
+                      'lower', 'median', 'upper' and 'runs' (number of runs with timesteps in the bin).
+    """
+    group_columns = list(group_columns)
+    age      = df['age'].to_numpy(dtype=float)
+    with_age = age > 0
+    log_age  = np.log10(age[with_age])
+    if log_age.size == 0:
+        return pd.DataFrame(columns=group_columns + ['age', 'species', 'lower', 'median', 'upper', 'runs'])
+
+    edges   = np.linspace(log_age.min(), log_age.max() + 1e-9, n_bins + 1)
+    age_bin = np.searchsorted(edges, log_age, side="right") - 1
+    centers = 10 ** (0.5 * (edges[:-1] + edges[1:]))
+
+    # One value per run and bin: the median of its timesteps in the bin (NaN abundances are ignored)
+    keys    = [df[column].to_numpy()[with_age] for column in group_columns + ['run_id']] + [age_bin]
+    per_run = df.loc[with_age, species].groupby(keys, sort=True).median()
+    per_run.index.names = group_columns + ['run_id', 'age_bin']
+    grouped = per_run.groupby(level=group_columns + ['age_bin'], sort=True)
+
+    # Every percentile is computed on its own and named by its position, so equal or unordered percentiles
+    # (e.g. (50, 50, 84)) keep their place
+    columns = {}
+    for name, percentile in zip(['lower', 'median', 'upper'], percentiles):
+        quantile = grouped.quantile(percentile / 100)
+        quantile.columns.name = 'species'
+        columns[name] = quantile.stack()
+    table = pd.DataFrame(columns)
+    table = table.join(grouped.size().rename('runs')).reset_index()
+    # Keep the species in the order they were selected
+    table['species'] = pd.Categorical(table['species'], categories=species)
+    table = table.sort_values(['species'] + group_columns + ['age_bin'], kind="stable")
+    table['species'] = table['species'].astype(str)
+    table.insert(len(group_columns), 'age', centers[table.pop('age_bin').to_numpy()])
+    return table.reset_index(drop=True)
+
+def envelope_band(envelope_percentiles):
+    """
+    Percentiles of the envelope of a selection, from the value of the envelope percentile slider. The band always
+    surrounds the median: its lower end is kept below 50 and its upper end above 50.
+
+    Args:
+        envelope_percentiles (list): [lower, upper] value of the slider, e.g. [16, 84].
+
+    Returns:
+        tuple: (lower, 50, upper) percentiles, e.g. (16, 50, 84).
+    """
+    lower, upper = sorted(envelope_percentiles)
+    return min(lower, 49), 50, max(upper, 51)
+
+def aggregated_figure(table, title, y_scale, marker_size, group_columns=()):
+    """
+    Plot binned percentiles as a median line with a shaded percentile band for every species (and group).
+
+    Args:
+        table (pd.DataFrame): Output of binned_percentiles.
+        title (str): Title of the figure.
+        y_scale (str): 'log' or 'linear'.
+        marker_size (int): Size of the markers of the median.
+        group_columns (list): Group columns used in binned_percentiles.
+
+    Returns:
+        plotly.graph_objects.Figure: The figure.
+    """
+    fig    = go.Figure()
+    colors = px.colors.qualitative.Plotly
+    for i, (keys, rows) in enumerate(table.groupby(['species'] + list(group_columns), sort=False)):
+        species, *group_values = keys
+        color = colors[i % len(colors)]
+        name  = format_molecule_HTML(species)
+        if group_values:
+            name += " (" + ", ".join(f"{column}={value:g}" for column, value in zip(group_columns, group_values)) + ")"
+        group = f"{species}{group_values}"
+        fig.add_trace(go.Scatter(
+            x=rows['age'], y=rows['upper'], mode="lines", line=dict(width=0, color=color),
+            legendgroup=group, showlegend=False, hoverinfo="skip",
+        ))
+        fig.add_trace(go.Scatter(
+            x=rows['age'], y=rows['lower'], mode="lines", line=dict(width=0, color=color),
+            fill="tonexty", fillcolor="rgba({}, {}, {}, 0.25)".format(*px.colors.hex_to_rgb(color)),
+            legendgroup=group, showlegend=False, hoverinfo="skip",
+        ))
+        fig.add_trace(go.Scatter(
+            x=rows['age'], y=rows['median'], mode="lines+markers", name=name,
+            line=dict(color=color), marker=dict(size=marker_size / 2, color=color),
+            legendgroup=group,
+            customdata=np.c_[rows['lower'], rows['upper'], rows['runs']],
+            hovertemplate=(
+                f'{name}<br>' +
+                'Median: %{y:.2e}<br>' +
+                'Band: %{customdata[0]:.2e} - %{customdata[1]:.2e}<br>' +
+                'Time: %{x:.2e} yr<br>' +
+                'Runs: %{customdata[2]:.0f}<extra></extra>'
+            ),
+        ))
+    fig.update_layout(title=title)
+    fig.update_xaxes(type="log")
+    fig.update_yaxes(type="log" if y_scale == "log" else "linear")
+    return fig
@@ -0,0 +1,187 @@
+# File: CMZ_data_explorer/background_jobs.py
+# -*- coding: utf-8 -*-
+"""
+This module contains the helpers used by the visualization apps (Shocks.py and Protostellar_objects.py)
+to run heavy callbacks as background jobs.
+
+Background jobs are executed in separate worker processes by Dash's DiskcacheManager, with a local,
+disk-backed job store (no external broker is needed). While a job runs, the app stays responsive, a
+progress indicator is shown, and when the inputs of the callback change, the job still in flight is
+terminated before the new one starts. Identical requests are served from the job store for
+BACKGROUND_RESULT_EXPIRE seconds, as long as the app serves the same version of the data (see
+data_reload.py). The results a job adds to the caches of the app (see JobResults) are kept in the job
+store too, so the app's process finds them once the job has ended.
+
+The extra dependencies are installed with:
+
+    pip install "dash[diskcache]"
+
+If they are missing (or BACKGROUND_CALLBACKS is False in config.py), the callbacks simply run in the
+request, as before.
+"""
+# Import necessary libraries
+import functools
+import os
+import threading
+import warnings
+import dash
+from config import (
+                BACKGROUND_CALLBACKS,
+                BACKGROUND_CACHE_DIR,
+                BACKGROUND_RESULT_EXPIRE
+               )
+
+# Methods of the manager that use the job store or the job processes
+_SERIALIZED_METHODS = ['call_job_fn', 'get_progress', 'result_ready', 'get_result', 'get_updated_props',
+                       'job_running', 'terminate_job', 'terminate_unhealthy_job', 'clear_cache_entry',
+                       'get_or_create_signing_secret']
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+def _serialized(name):
+    """Method of DiskcacheManager run while holding the lock of the manager."""
+    method = getattr(dash.DiskcacheManager, name)
+
+    @functools.wraps(method)
+    def serialized(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return serialized
+
+class SerializedDiskcacheManager(dash.DiskcacheManager):
+    """
+    DiskcacheManager whose methods run one at a time, for servers that handle requests in several threads.
+
+    A job process is forked from the request thread that starts it and inherits the state of the SQLite
+    connections of the whole process: if another thread was writing to the job store at that moment, the
+    job waits for a lock that is never released. Jobs are also reaped by the next job start, which races
+    with the check of whether they are still running.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.RLock()
+        # The jobs are forked while the lock is held
+        os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self._lock = threading.RLock()
+
+for _name in _SERIALIZED_METHODS:
+    # Some methods only exist in recent versions of Dash
+    if hasattr(dash.DiskcacheManager, _name):
+        setattr(SerializedDiskcacheManager, _name, _serialized(_name))
+
+class JobResults:
+    """
+    Results added to a cache of the app (see selection_cache.ResultCache) by the background jobs, kept in the job
+    store of the manager for BACKGROUND_RESULT_EXPIRE seconds. A job process ends with the job, so the results it
+    only kept in its memory would be lost; the app's process reads them from here when they are not in its memory.
+    The results computed in the app's process itself stay in its memory only.
+
+    Example:
+        engine.figure_cache.shared = JobResults(background_manager, "cshock figures")
+    """
+
+    def __init__(self, manager, namespace, expire=BACKGROUND_RESULT_EXPIRE):
+        """
+        Args:
+            manager (SerializedDiskcacheManager): Output of make_background_manager.
+            namespace (str): Name of the cache, keeping its keys apart from those of the other caches.
+            expire (float): Seconds a result is kept.
+        """
+        self.manager   = manager
+        self.namespace = namespace
+        self.expire    = expire
+        # Process of the app; the processes forked from it are jobs
+        self.pid       = os.getpid()
+
+    def get(self, key, default=None):
+        """Result of a key stored by a job, or default."""
+        with self.manager._lock:
+            return self.manager.handle.get((self.namespace, key), default=default)
+
+    def __contains__(self, key):
+        with self.manager._lock:
+            return (self.namespace, key) in self.manager.handle
+
+    def set(self, key, result):
+        """Store a result computed in a job (results computed in the app's process are not stored)."""
+        if os.getpid() == self.pid:
+            return
+        with self.manager._lock:
+            self.manager.handle.set((self.namespace, key), result, expire=self.expire)
+
+def make_background_manager(data_version):
+    """
+    Create the background callback manager of an app.
+
+    Args:
+        data_version (callable): Returns the id of the data version the app serves; stored results are only
+                                 reused while it is unchanged.
+
+    Returns:
+        SerializedDiskcacheManager or None: The manager, or None if background callbacks are disabled
+                                            or their dependencies are not installed.
+    """
+    if not BACKGROUND_CALLBACKS:
+        return None
+    try:
+        import diskcache
+        return SerializedDiskcacheManager(
+            diskcache.Cache(BACKGROUND_CACHE_DIR),
+            cache_by=[data_version],
+            expire=BACKGROUND_RESULT_EXPIRE,
+        )
+    except ImportError:
+        warnings.warn('Background callbacks need extra dependencies (pip install "dash[diskcache]"); '
+                      'the callbacks will run in the request instead.')
+        return None
+
+def _ignore_progress(*progress):
+    """Stand-in for set_progress when a callback does not run in the background."""
+
+def heavy_callback(app, manager, *dependencies, progress, running=None, cancel=None, **kwargs):
+    """
+    Register a heavy callback, as a background job if a manager is available.
+
+    The decorated function always receives a set_progress function as its first argument; it is
+    called with the values of the progress outputs, e.g. set_progress((step, n_steps)).
+
+    Args:
+        app (dash.Dash): The app.
+        manager (SerializedDiskcacheManager or None): Output of make_background_manager.
+        *dependencies: Outputs, inputs and states of the callback, as for app.callback.
+        progress (list): Outputs updated by set_progress.
+        running (list): (Output, value while running, value when done) tuples.
+        cancel (list): Inputs that cancel the running job when they change.
+        **kwargs: Other arguments of app.callback (e.g. prevent_initial_call).
+
+    Returns:
+        callable: The decorator.
+    """
+    def decorator(function):
+        if manager is not None:
+            @functools.wraps(function)
+            def in_job(set_progress, *args):
+                # The job process inherits the connection of the request thread that forked it; SQLite
+                # connections must not be used across processes, so the job opens its own
+                manager.handle.close()
+                return function(set_progress, *args)
+            return app.callback(
+                *dependencies,
+                background=True,
+                manager=manager,
+                progress=progress,
+                running=running,
+                cancel=cancel,
+                **kwargs
+            )(in_job)
+
+        @functools.wraps(function)
+        def in_request(*args):
+            return function(_ignore_progress, *args)
+        return app.callback(*dependencies, **kwargs)(in_request)
+    return decorator
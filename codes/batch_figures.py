@@ -0,0 +1,169 @@
+# File: CMZ_data_explorer/batch_figures.py
+# -*- coding: utf-8 -*-
+"""
+Command-line generation of the abundance plot of the apps for every combination of a parameter sweep,
+e.g. for a paper appendix, without starting a server.
+
+The figures are built with the same code as in the apps (figures.py, aggregation.py, the data engine and
+the hover settings of model_page.py) and rendered in parallel worker processes, each of which loads the
+model data once. Example - one figure per shock velocity and density, at fixed CRIR, FUV field and
+initial temperature:
+
+    python batch_figures.py cshock --stage postshock --species CH3OH SIO HNCO \\
+        --sweep shock_vel initialDens --fix zeta=10 radfield=100 initialTemp=15 \\
+        --formats html png --output appendix --processes 4
+
+Swept parameters take all their values in the data unless given explicitly (e.g. --sweep shock_vel=10,20),
+parameters that are neither swept nor fixed are not filtered. Static images (png, pdf, svg) need kaleido;
+without it only the html and json files are written.
+"""
+# Import necessary libraries
+import argparse
+import importlib.util
+import itertools
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import config
+from functionality import mol_all
+from figures import abundance_figure, style_figure
+from aggregation import aggregated_figure
+from data_engine import MODELS, DataEngine
+from model_page import PAGES
+
+STATIC_FORMATS = ("png", "pdf", "svg")
+
+# Data engine of the model, loaded by each worker process
+_engine = None
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+def _load_engine(model):
+    """Worker initializer: create the data engine of the model, which loads the model data once per worker."""
+    global _engine
+    _engine = DataEngine(model)
+
+def _parameter_values(stage, parameter):
+    """All values of a parameter in a stage table."""
+    return sorted(_engine.stage_tables[stage][parameter].unique().tolist())
+
+def _render(model, stage, species, selection, formats, output_dir, plot_mode, y_scale, marker_size):
+    """
+    Build the figure of one selection and write it in every format.
+
+    Args:
+        model (str): 'cshock' or 'hotcore'.
+        stage (str): Stage table, e.g. 'postshock'.
+        species (list): Plotted species.
+        selection (dict): Selected values of each filtered parameter.
+        formats (list): File formats, e.g. ['html', 'png'].
+        output_dir (str): Directory of the files.
+        plot_mode (str): 'points' or 'envelope'.
+        y_scale (str): 'log' or 'linear'.
+        marker_size (int): Size of the markers.
+
+    Returns:
+        list: Paths of the written files (none if the selection is empty).
+    """
+    _engine.ensure_species(species)
+    df = _engine.query.select(stage, selection)
+    if df.empty:
+        return []
+
+    title = stage.capitalize() + ": " + ", ".join(
+        f"{parameter}={'/'.join(f'{value:g}' for value in values)}" for parameter, values in selection.items()
+    )
+    if plot_mode == "envelope":
+        binned = _engine.query.binned_percentiles(stage, selection, species)
+        fig = aggregated_figure(binned, title=title, y_scale=y_scale, marker_size=marker_size)
+    else:
+        # Standalone files have no server to look up the details of a point - embed them in the hover
+        fig = abundance_figure(
+            df, species, title=title, y_scale=y_scale, marker_size=marker_size,
+            hover_data=PAGES[model]["abundance_hover_data"], labels=PAGES[model]["abundance_labels"],
+            hovertemplate=PAGES[model]["abundance_hovertemplate"], compact_hover=False,
+        )
+    style_figure(fig, df, species, show_grid=["grid"])
+
+    name  = "_".join([model, stage] + [f"{parameter}-{'-'.join(f'{value:g}' for value in values)}"
+                                       for parameter, values in selection.items()])
+    paths = []
+    for file_format in formats:
+        path = Path(output_dir) / f"{name}.{file_format}"
+        if file_format == "html":
+            fig.write_html(path, include_plotlyjs="cdn")
+        elif file_format == "json":
+            fig.write_json(path)
+        else:
+            fig.write_image(path)
+        paths.append(str(path))
+    return paths
+
+def _parse_assignment(text):
+    """'name=1,2' -> ('name', [1.0, 2.0]); 'name' -> ('name', None)."""
+    name, _, values = text.partition("=")
+    return name, [float(value) for value in values.split(",")] if values else None
+
+def main(argv=None):
+    """
+    Parse the sweep specification from the command line and render all its figures.
+
+    Args:
+        argv (list): Command-line arguments (sys.argv[1:] if None).
+
+    Returns:
+        list: Paths of the written files.
+    """
+    parser = argparse.ArgumentParser(description="Render the abundance plot for every combination of a parameter sweep.")
+    parser.add_argument("model", choices=list(MODELS), help="Model grid.")
+    parser.add_argument("--stage", required=True, help="Stage: shock/postshock (cshock) or warmup/hotcore (hotcore).")
+    parser.add_argument("--species", nargs="+", required=True, help="Plotted species.")
+    parser.add_argument("--sweep", nargs="+", required=True, metavar="PARAMETER[=V1,V2]",
+                        help="Parameters with one figure per value (all values in the data unless given).")
+    parser.add_argument("--fix", nargs="*", default=[], metavar="PARAMETER=V1[,V2]",
+                        help="Parameters with the same value(s) in every figure.")
+    parser.add_argument("--formats", nargs="+", default=["html"], choices=["html", "json"] + list(STATIC_FORMATS))
+    parser.add_argument("--output", default="figures", help="Output directory.")
+    parser.add_argument("--processes", type=int, default=1, help="Number of worker processes.")
+    parser.add_argument("--plot-mode", choices=["points", "envelope"], default="points")
+    parser.add_argument("--y-scale", choices=["log", "linear"], default="log")
+    parser.add_argument("--marker-size", type=int, default=config.DEFAULT_MARKER_SIZE)
+    args = parser.parse_args(argv)
+
+    if args.stage not in MODELS[args.model]["stages"]:
+        parser.error(f"--stage must be one of {list(MODELS[args.model]['stages'])} for {args.model} models.")
+    unknown = [name for name in args.species if name not in mol_all]
+    if unknown:
+        parser.error(f"Unknown species: {unknown}.")
+    fixed = dict(_parse_assignment(text) for text in args.fix)
+    if any(values is None for values in fixed.values()):
+        parser.error("Every --fix parameter needs a value, e.g. zeta=10.")
+    formats = list(args.formats)
+    if importlib.util.find_spec("kaleido") is None and set(formats) & set(STATIC_FORMATS):
+        warnings.warn("Static images need kaleido (pip install kaleido); only html/json files are written.")
+        formats = [file_format for file_format in formats if file_format not in STATIC_FORMATS]
+    if not formats:
+        return []
+    Path(args.output).mkdir(parents=True, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=args.processes, initializer=_load_engine,
+                             initargs=(args.model,)) as executor:
+        sweep = {}
+        for name, values in map(_parse_assignment, args.sweep):
+            sweep[name] = values or executor.submit(_parameter_values, args.stage, name).result()
+
+        jobs = []
+        for combination in itertools.product(*sweep.values()):
+            selection = {**fixed, **{name: [value] for name, value in zip(sweep, combination)}}
+            jobs.append(executor.submit(_render, args.model, args.stage, args.species, selection, formats,
+                                        args.output, args.plot_mode, args.y_scale, args.marker_size))
+        paths = [path for job in jobs for path in job.result()]
+
+    print(f"Wrote {len(paths)} files for {len(jobs)} parameter combinations to {args.output}/")
+    return paths
+
+
+if __name__ == "__main__":
+    main()
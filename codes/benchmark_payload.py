@@ -0,0 +1,94 @@
+# File: CMZ_data_explorer/benchmark_payload.py
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the abundance plot responses of the apps (see serialization.py).
+
+For selections of increasing size from the shock models, the figure returned by update_output is built
+(with the classic and the compact hover), serialized with the json and orjson engines of Plotly, and
+compressed as Flask-Compress does by default (gzip level 6, brotli quality 4). Run it with:
+
+    python benchmark_payload.py
+"""
+# Import necessary libraries
+import gzip
+import importlib.util
+import time
+import pandas as pd
+from plotly.io.json import to_json_plotly
+from functionality import ranges_cshock
+from figures import abundance_figure, style_figure
+from data_engine import DataEngine
+from model_page import PAGES
+
+# Species plotted in every selection
+SPECIES = ["CH3OH", "SIO", "HNCO"]
+
+# Selections of increasing size: number of values taken from the start of each parameter range
+SELECTIONS = {
+    "small":  dict(shock_vel=1, initialDens=1, zeta=1, radfield=1, initialTemp=1),
+    "medium": dict(shock_vel=3, initialDens=3, zeta=2, radfield=2, initialTemp=1),
+    "large":  dict(shock_vel=7, initialDens=3, zeta=4, radfield=4, initialTemp=5),
+}
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+def best_time(function, repeat=3):
+    """Shortest of several wall-clock times of a function call [ms]."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return 1e3 * min(times)
+
+def benchmark(df, species=SPECIES, selections=SELECTIONS):
+    """
+    Size and serialization time of the abundance plot for every selection, hover mode and JSON engine.
+
+    Args:
+        df (pd.DataFrame): Stage table of the shock models (e.g. the 'postshock' table of their data engine).
+        species (list): Plotted species.
+        selections (dict): Number of values of each parameter, per selection name.
+
+    Returns:
+        pd.DataFrame: One row per selection, hover mode and engine.
+    """
+    engines = ["json"] + (["orjson"] if importlib.util.find_spec("orjson") else [])
+    brotli  = importlib.import_module("brotli") if importlib.util.find_spec("brotli") else None
+
+    results = []
+    for name, counts in selections.items():
+        mask = pd.Series(True, index=df.index)
+        for parameter, count in counts.items():
+            mask &= df[parameter].isin(ranges_cshock[parameter][:count])
+        selection = df[mask]
+
+        for compact in (False, True):
+            fig = abundance_figure(
+                selection, species, title="Benchmark", y_scale="log", marker_size=12,
+                hover_data=PAGES["cshock"]["abundance_hover_data"], labels=PAGES["cshock"]["abundance_labels"],
+                hovertemplate=PAGES["cshock"]["abundance_hovertemplate"], compact_hover=compact,
+            )
+            style_figure(fig, selection, species, show_grid=["grid"])
+            payload = fig.to_plotly_json()
+
+            for engine in engines:
+                encoded = to_json_plotly(payload, engine=engine).encode()
+                results.append({
+                    'selection': name,
+                    'rows': len(selection),
+                    'hover': "compact" if compact else "classic",
+                    'engine': engine,
+                    'serialize [ms]': best_time(lambda: to_json_plotly(payload, engine=engine)),
+                    'raw [kB]': len(encoded) / 1e3,
+                    'gzip [kB]': len(gzip.compress(encoded, compresslevel=6)) / 1e3,
+                    'brotli [kB]': len(brotli.compress(encoded, quality=4)) / 1e3 if brotli else float("nan"),
+                })
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    engine = DataEngine("cshock")
+    print(benchmark(engine.stage_tables["postshock"]).to_string(index=False, float_format="{:.1f}".format))
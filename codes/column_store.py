@@ -0,0 +1,123 @@
+# File: CMZ_data_explorer/column_store.py
+# -*- coding: utf-8 -*-
+"""
+This module contains the read-only column store of the stage tables, used by the "numpy" query backend
+(see query_backend.py) and meant for the threaded serving mode (see serving.py).
+
+Every column of a table is kept as one contiguous, read-only NumPy array (text columns such as run_id
+as integer codes), so it can be shared by all the threads of a server without locks: any attempt to
+modify it raises an error. Selections are computed with NumPy comparisons on these arrays, which run
+without holding Python's global interpreter lock (GIL), so requests on different threads filter in
+parallel. Only the small result tables are built as DataFrames.
+"""
+# Import necessary libraries
+import copy
+from types import MappingProxyType
+import numpy as np
+import pandas as pd
+
+
+class ColumnStore:
+    """
+    Read-only, contiguous NumPy columns of a table.
+
+    Example:
+        store = ColumnStore(shock_df)
+        positions = np.flatnonzero(store.mask({'zeta': [10.], 'shock_vel': [20., 30.]}))
+        df = store.take(positions, ['age', 'run_id', 'CH3OH'])
+    """
+
+    def __init__(self, df):
+        columns, categories = {}, {}
+        for name in df.columns:
+            values = df[name]
+            if values.dtype == object or isinstance(values.dtype, pd.CategoricalDtype):
+                # Text columns are stored as integer codes of their distinct values
+                codes, categories[name] = pd.factorize(values)
+                array = codes.astype(np.int32)
+            else:
+                # A column of a pandas block is already contiguous, so this is a view, not a copy
+                array = np.ascontiguousarray(values.to_numpy()).view()
+            array.flags.writeable = False
+            columns[name] = array
+
+        self.n_rows     = len(df)
+        self.dtypes     = df.dtypes
+        self.columns    = MappingProxyType(columns)
+        self.categories = MappingProxyType(categories)
+
+    def with_columns(self, df, names):
+        """
+        Store of a table with the same rows as the stored one and some new (numeric) columns; only those are stored.
+
+        Args:
+            df (pd.DataFrame): The table, with the new columns.
+            names (list): The new columns, e.g. species read from their column files.
+
+        Returns:
+            ColumnStore: A new store sharing the columns of this one, which is not changed.
+        """
+        columns = dict(self.columns)
+        for name in names:
+            array = np.ascontiguousarray(df[name].to_numpy()).view()
+            array.flags.writeable = False
+            columns[name] = array
+        store         = copy.copy(self)
+        store.dtypes  = df.dtypes
+        store.columns = MappingProxyType(columns)
+        return store
+
+    def _codes(self, name, values):
+        """Values of a column as stored (codes for text columns; unknown values are dropped)."""
+        if name not in self.categories:
+            return list(values)
+        codes = self.categories[name].get_indexer(list(values))
+        return codes[codes >= 0].tolist()
+
+    def mask(self, selection, age_range=None):
+        """
+        Rows within a selection, computed without holding the GIL.
+
+        Args:
+            selection (dict): Selected values of each filtered parameter, e.g. {'zeta': [10., 100.], ...}.
+            age_range (tuple): (min, max) age [yr] of the rows (optional, both ends included).
+
+        Returns:
+            np.ndarray: Boolean mask of the rows.
+        """
+        mask  = np.ones(self.n_rows, dtype=bool)
+        match = np.empty(self.n_rows, dtype=bool)
+        equal = np.empty(self.n_rows, dtype=bool)
+        for parameter, values in selection.items():
+            column = self.columns[parameter]
+            match[:] = False
+            for value in self._codes(parameter, values or []):
+                np.equal(column, value, out=equal)
+                np.logical_or(match, equal, out=match)
+            np.logical_and(mask, match, out=mask)
+        if age_range is not None:
+            age = self.columns["age"]
+            np.logical_and(mask, np.greater_equal(age, age_range[0], out=equal), out=mask)
+            np.logical_and(mask, np.less_equal(age, age_range[1], out=equal), out=mask)
+        return mask
+
+    def take(self, positions, columns):
+        """
+        Some rows and columns as a DataFrame.
+
+        Args:
+            positions (np.ndarray): Positions of the rows, in the order to return them.
+            columns (list): Columns to return.
+
+        Returns:
+            pd.DataFrame: The rows; the index holds their positions.
+        """
+        data = {}
+        for name in columns:
+            values = self.columns[name].take(positions)
+            if name in self.categories:
+                # Missing values have the code -1
+                values = np.asarray(pd.Categorical.from_codes(values, self.categories[name]), dtype=object)
+            data[name] = values
+        df = pd.DataFrame(data, index=pd.Index(positions, dtype=np.int64), columns=list(columns))
+        return df.astype({name: self.dtypes[name] for name in columns})
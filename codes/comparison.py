@@ -0,0 +1,109 @@
+# File: CMZ_data_explorer/comparison.py
+# -*- coding: utf-8 -*-
+"""
+This module contains the cross-model comparison of the combined app (CMZ_explorer.py): the abundance of
+one species in the selection of the C-shock page and in the selection of the hot-core page, each shown as
+the median and a percentile band per age bin (see aggregation.py), overlaid on the same axes.
+
+The binned percentiles of a selection are computed by the query backend of its model (see
+query_backend.py) and kept in the figure cache of its data engine (see data_engine.py), so they share the
+cache (and, in the low-memory mode, the memory budget) of the pages.
+"""
+# Import necessary libraries
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from functionality import format_molecule_HTML
+from figures import style_figure
+
+# Name of each model in the legend of the comparison
+MODEL_LABELS = {"cshock": "C-shock", "hotcore": "Hot core"}
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+def common_species(engines):
+    """
+    Species that can be selected in every model.
+
+    Args:
+        engines (dict): Data engines by model (see data_engine.py).
+
+    Returns:
+        list: The species, in the order of the catalog of the first model.
+    """
+    first, *others = engines.values()
+    return [name for name in first.all_species if all(name in engine.all_species for engine in others)]
+
+def selection_percentiles(engine, stage, selection, species, percentiles):
+    """
+    Binned percentiles of one species in a selection, computed only if they are not cached.
+
+    Args:
+        engine (DataEngine): Data of the model.
+        stage (str): Stage table, e.g. 'postshock'.
+        selection (dict): Selected values of each parameter.
+        species (str): Compared species.
+        percentiles (tuple): (lower, middle, upper) percentiles.
+
+    Returns:
+        pd.DataFrame: Output of binned_percentiles (see aggregation.py).
+    """
+    engine.ensure_species([species])
+    key = (*engine.selection_key(stage, selection), "comparison", species, tuple(percentiles))
+    return engine.figure_cache.get_or_compute(
+        key, lambda: engine.query.binned_percentiles(stage, selection, [species], percentiles=percentiles)
+    )
+
+def comparison_figure(tables, species, percentiles, y_scale, marker_size, show_grid):
+    """
+    Overlay the median and percentile band of one species in the selections of several models.
+
+    Args:
+        tables (dict): Output of selection_percentiles, by legend name, e.g. {'C-shock (postshock)': ...}.
+        species (str): Compared species.
+        percentiles (tuple): (lower, middle, upper) percentiles of the tables.
+        y_scale (str): 'log' or 'linear'.
+        marker_size (int): Size of the markers of the median.
+        show_grid (list): Value of the 'show-grid' checklist.
+
+    Returns:
+        plotly.graph_objects.Figure: The figure.
+    """
+    lower, _, upper = percentiles
+    fig    = go.Figure()
+    colors = px.colors.qualitative.Plotly
+    for i, (name, rows) in enumerate(tables.items()):
+        color = colors[i % len(colors)]
+        fig.add_trace(go.Scatter(
+            x=rows['age'], y=rows['upper'], mode="lines", line=dict(width=0, color=color),
+            legendgroup=name, showlegend=False, hoverinfo="skip",
+        ))
+        fig.add_trace(go.Scatter(
+            x=rows['age'], y=rows['lower'], mode="lines", line=dict(width=0, color=color),
+            fill="tonexty", fillcolor="rgba({}, {}, {}, 0.25)".format(*px.colors.hex_to_rgb(color)),
+            legendgroup=name, showlegend=False, hoverinfo="skip",
+        ))
+        fig.add_trace(go.Scatter(
+            x=rows['age'], y=rows['median'], mode="lines+markers", name=name,
+            line=dict(color=color), marker=dict(size=marker_size / 2, color=color),
+            legendgroup=name,
+            customdata=np.c_[rows['lower'], rows['upper'], rows['runs']],
+            hovertemplate=(
+                f'{name}<br>' +
+                'Median: %{y:.2e}<br>' +
+                'Band: %{customdata[0]:.2e} - %{customdata[1]:.2e}<br>' +
+                'Time: %{x:.2e} yr<br>' +
+                'Runs: %{customdata[2]:.0f}<extra></extra>'
+            ),
+        ))
+    fig.update_layout(title=f"{format_molecule_HTML(species)} (median and {lower}-{upper}th percentiles)")
+    fig.update_xaxes(type="log")
+    fig.update_yaxes(type="log" if y_scale == "log" else "linear")
+
+    # The band of every model sets the range of the y-axis
+    style_figure(fig, pd.concat(tables.values()), ["lower", "upper"], show_grid)
+    fig.update_layout(legend_title="Model")
+    return fig
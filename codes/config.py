@@ -8,10 +8,107 @@
 hotcore_pkl = "/Users/kasia/Postdoc/30_Projects/33_ACES/33.03 - Scripts/pkl_files/hotcore.pkl"
 cshock_pkl  = "/Users/kasia/Postdoc/30_Projects/33_ACES/33.03 - Scripts/pkl_files/cshock.pkl"
 
+# Per-run summary tables (see run_summary.py) - written next to the pickle files by data_extraction.py
+hotcore_summary_pkl = hotcore_pkl.replace(".pkl", "_summary.pkl")
+cshock_summary_pkl  = cshock_pkl.replace(".pkl", "_summary.pkl")
+SUMMARY_OFFSET_AGE  = 1e5       # The summary includes the abundances this many years after the start of each stage
+
+# Species catalogs and species columns (see species_catalog.py) - written next to the pickle files by data_extraction.py
+hotcore_catalog_json = hotcore_pkl.replace(".pkl", "_species.json")
+cshock_catalog_json  = cshock_pkl.replace(".pkl", "_species.json")
+hotcore_species_dir  = hotcore_pkl.replace(".pkl", "_species")  # One column file per species that is not in the pickle file
+cshock_species_dir   = cshock_pkl.replace(".pkl", "_species")
+EXTRACT_ALL_SPECIES  = True      # Extract every species of the grid; those not in mol_all (functionality.py) are read by the apps when selected
+
+# Low-memory mode (see mapped_store.py) - for computers that cannot load the pickle files; build the stores once with: python mapped_store.py
+LOW_MEMORY_MODE   = False   # Read the data from memory-mapped column files per query instead of loading the pickle files
+MEMORY_BUDGET_MB  = 512     # In the low-memory mode: total size of the cached results of an app (selections, plots, ratios, sweeps)
+hotcore_store_dir = hotcore_pkl.replace(".pkl", "_store")  # Memory-mapped column files, written next to the pickle files
+cshock_store_dir  = cshock_pkl.replace(".pkl", "_store")
+
 ZETA_SCALE_FACTOR   = 1.310e-17 # Scale factor for zeta values: the data is presented as ZETA/ZETA_0, where ZETA_0 = 1.310e-17
 DEFAULT_MARKER_SIZE = 12        # Default marker size for the scatter plot - but it is also adjustable in the visualization
 DEFAULT_OPACITY     = 0.7       # Default opacity for the scatter plot
 
+RATIO_CACHE_SIZE      = 32      # Number of recent selections whose ratio tables are kept in memory
+RATIO_PANEL_COLUMNS   = 2       # Number of panels per row in the multi-panel ratio plot
+SWEEP_CACHE_SIZE      = 64      # Number of recent (stage, species, reference point) per-run tables of the parameter sweep
+SWEEP_ABUNDANCE_FLOOR = 1e-30   # Abundances below this value are set to it before interpolating the sweep in log space
+
+# Characteristic timescales (see timescales.py)
+TIMESCALE_THRESHOLD           = 1e-14   # Default abundance whose first crossing is reported - the horizontal line of the abundance plots
+TIMESCALE_DESORPTION_FRACTION = 0.1     # An ice species is desorbed when its abundance drops below this fraction of its peak
+TIMESCALE_CACHE_SIZE          = 64      # Number of recent (table, timescale, species) per-run tables
+TIMESCALE_HISTOGRAM_BINS      = 40      # Number of bins of log10(age) of the timescale histogram
+
+# Oversized selections (see aggregation.py)
+MAX_RAW_POINTS        = 300000  # Above this many points (rows x species) the plot shows the aggregated view
+MAX_TABLE_ROWS        = 50000   # Above this many rows the table shows the aggregated view
+AGGREGATE_N_BINS      = 60      # Number of logarithmic age bins of the aggregated view
+AGGREGATE_PERCENTILES = (16, 50, 84)  # Lower, middle and upper percentiles of the aggregated view
+
+# Zoom-driven level of detail (see level_of_detail.py)
+LOD_BASE_BINS  = 32      # Logarithmic time bins per run at the coarsest level
+LOD_N_LEVELS   = 5       # Number of levels; each one doubles the time resolution of the previous one
+LOD_MAX_POINTS = 50000   # Maximum number of points (rows x species) drawn at once; zooming in refines the plot
+
+# Progressive rendering (see preview.py): large selections are previewed from a small sample before the full plot is drawn
+PREVIEW_MIN_POINTS = 100000  # Selections with more points (rows x species) are previewed first
+PREVIEW_MAX_ROWS   = 20000   # Rows of the sample of every stage table - bounds the time of a preview, whatever the selection
+
+# Hover of the abundance plot (see figures.py): points only carry their row, details are shown below the plot
+COMPACT_HOVER  = True
+
+# Size and speed of the responses (see serialization.py)
+FAST_JSON          = True   # Serialize figures and tables with orjson, if it is installed
+COMPRESS_RESPONSES = True   # Compress responses with brotli/gzip, if Flask-Compress is installed
+
+# Query backend (see query_backend.py) - how the apps filter the stage tables
+QUERY_BACKEND = "pandas"    # 'pandas' or 'numpy' (in memory; 'numpy' for the threaded server), 'duckdb' (needs: pip install duckdb) or 'sqlite' (database file next to the pickle file)
+QUERY_THREADS = 0           # Threads of a DuckDB query; 0 uses all cores
+
+# Serving (see serving.py)
+SERVER_MODE    = "development"  # 'development' (Dash debug server) or 'threaded' (production WSGI server, needs: pip install waitress)
+SERVER_HOST    = "127.0.0.1"
+SERVER_PORT    = 8050
+SERVER_THREADS = 8              # Worker threads of the threaded server - requests are handled concurrently
+
+# Selection log and result caches (see selection_cache.py)
+LOG_SELECTIONS       = False                 # Append every selection of the abundance plot to SELECTION_LOG_FILE
+SELECTION_LOG_FILE   = "./selections.jsonl"  # Local selection log (relative to where the app is started)
+PREWARM_TOP_N        = 5                     # Most frequent logged selections computed at startup (at most FIGURE_CACHE_SIZE); 0 disables it
+PREWARM_LOG_LINES    = 10000                 # Number of most recent log lines counted for prewarming
+SELECTION_CACHE_SIZE = 8                     # Number of recent filtered selections (rows of the selected species) kept in memory
+FIGURE_CACHE_SIZE    = 8                     # Number of recent abundance plots (with their tables) kept in memory
+
+# Reloading the data while the app runs (see data_reload.py)
+WATCH_DATA_FILES    = True   # Reload the pickle files (and run summaries) when they change, without restarting the app
+DATA_WATCH_INTERVAL = 10     # Seconds between two checks of the data files; a change is loaded once the files are unchanged for one interval
+
+# Session store (see session_store.py) - the selected rows of every browser tab, shared by the callbacks that depend on the selection
+SESSION_STORE     = "memory"       # "memory" (in the app's process) or "disk" (shared by all its processes; used with background jobs)
+SESSION_STORE_DIR = "./.sessions"  # Local folder of the disk store (relative to where the app is started)
+SESSION_TTL       = 1800           # Seconds an unused session entry is kept
+
+# Observation fitting (see fitting.py)
+FIT_TOP_K             = 20      # Number of best models shown
+FIT_DEFAULT_ERROR_DEX = 0.3     # Uncertainty [dex] used when an observation is given without one
+FIT_ABUNDANCE_FLOOR   = 1e-30   # Abundances below this value are set to it before taking the logarithm
+FIT_CHUNK_SIZE        = 200000  # Number of (run, timestep) rows scored at once
+FIT_N_PROCESSES       = 1       # Number of worker processes used for scoring; 1 scores in the app's own process
+
+# Background jobs for heavy callbacks (see background_jobs.py) - needs: pip install "dash[diskcache]"
+BACKGROUND_CALLBACKS     = True                   # Run heavy callbacks in background worker processes when possible
+BACKGROUND_CACHE_DIR     = "./.background_jobs"   # Local folder of the job store (relative to where the app is started)
+BACKGROUND_RESULT_EXPIRE = 600                    # Seconds a finished result is kept and reused for identical requests
+
+# Parameter cubes (see parameter_cube.py) - dense, memory-mapped copies of the grid resampled onto a common age axis
+BUILD_PARAMETER_CUBE = False    # Set to True to also write the cubes when running data_extraction.py
+cshock_cube_dir      = "/absolute/path/to/cubes/cshock"
+hotcore_cube_dir     = "/absolute/path/to/cubes/hotcore"
+CUBE_N_AGES          = 200      # Number of ages on the common (logarithmic) age axis
+CUBE_ABUNDANCE_FLOOR = 1e-30    # Abundances below this value are set to it before interpolating in log space
+
 # --------------------------------------------------------------
 # IF YOU NEED TO GENERATE PKL FILES FROM THE GRID DATA
 # Define the absolute path to the grid file,
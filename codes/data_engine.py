@@ -0,0 +1,387 @@
+# File: CMZ_data_explorer/data_engine.py
+# -*- coding: utf-8 -*-
+"""
+This module contains the data engine of the visualization apps: everything they do with the data of one
+model grid (hot cores or C-shocks), independent of the pages that show it (see model_page.py):
+
+- loading the pickle file (or the memory-mapped store of the low-memory mode, see mapped_store.py) and
+  splitting it into the stage tables,
+- indexing: levels of detail, preview samples, row counts, run indices and the per-run summary,
+- filtering selections with the query backend (see query_backend.py), with the caches of recent selections
+  and plots,
+- the species read from their column files when they are first selected (see species_catalog.py),
+- reloading the data when the files change (see data_reload.py),
+- the selected rows of every browser tab in the session store (see session_store.py), and their export.
+
+An engine is created once per model and process. The standalone apps (Shocks.py, Protostellar_objects.py)
+each create one; the combined app (CMZ_explorer.py) creates both, which then share one process, one cache
+budget (in the low-memory mode, see selection_cache.py) and one session store. Example:
+
+    engine = DataEngine("cshock", session_store)
+    df = engine.selected_rows("postshock", selection, ["CH3OH"])
+"""
+# Import necessary libraries
+import datetime
+import pickle
+import threading
+import pandas as pd
+from functionality import make_selection_key, ranges_cshock, ranges_hotcore
+from aggregation import parameter_row_counts
+from level_of_detail import lod_levels
+from preview import PreviewSample
+from run_index import RunIndex
+from query_backend import make_query_backend
+from run_summary import load_run_summary
+from ratios import clear_ratio_cache
+from sweep import clear_sweep_cache
+from timescales import clear_timescale_cache
+from selection_cache import ResultCache, cache_budget, result_nbytes
+from data_reload import files_version, swap_data, DataWatcher
+from species_catalog import load_catalog, catalog_species, SpeciesColumns
+from mapped_store import STAGE_TABLES, load_mapped_store, store_version_file
+from config import (
+                LOW_MEMORY_MODE,
+                SELECTION_CACHE_SIZE,
+                FIGURE_CACHE_SIZE,
+                cshock_pkl,
+                hotcore_pkl,
+                cshock_summary_pkl,
+                hotcore_summary_pkl,
+                cshock_catalog_json,
+                hotcore_catalog_json,
+                cshock_species_dir,
+                hotcore_species_dir,
+                cshock_store_dir,
+                hotcore_store_dir
+               )
+
+# Data files, stage tables and parameters of each model grid
+MODELS = {
+    "cshock": dict(
+        pkl=cshock_pkl, summary_pkl=cshock_summary_pkl, catalog_json=cshock_catalog_json,
+        species_dir=cshock_species_dir, store_dir=cshock_store_dir,
+        # Stage tables: {name of the table: value of the 'stage' column}
+        stages=STAGE_TABLES["cshock"],
+        # Parameters identifying a model - used for filtering and fitting observations
+        parameters=list(ranges_cshock),
+        # Columns of the data table and of the downloaded CSV file besides the species
+        table_columns=["age", "locDens", "locTemp", "Av", "run_id", "shock_vel", "initialDens", "initialTemp",
+                       "zeta_scaled", "radfield"],
+        # Start of the names of the downloaded files
+        file_prefix="Shock",
+    ),
+    "hotcore": dict(
+        pkl=hotcore_pkl, summary_pkl=hotcore_summary_pkl, catalog_json=hotcore_catalog_json,
+        species_dir=hotcore_species_dir, store_dir=hotcore_store_dir,
+        stages=STAGE_TABLES["hotcore"],
+        parameters=list(ranges_hotcore) + ["index", "cloud_radfield"],
+        table_columns=["age", "locDens", "locTemp", "Av", "run_id", "initialTemp", "final_temp", "zeta_scaled",
+                       "radfield", "cloud_radfield", "index"],
+        file_prefix="PO",
+    ),
+}
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+class DataEngine:
+    """
+    Data of one model grid, with its indices, caches and sessions.
+
+    The tables (model_df, stage_tables, lod_by_stage, preview_by_stage, row_counts, query, metadata_columns,
+    fit_tables, run_index, stage_runs and run_summary) are attributes of the engine, replaced all at once when
+    the data files change or species are added; the cached results are keyed by data_version.
+    """
+
+    def __init__(self, model, session_store=None):
+        """
+        Args:
+            model (str): 'cshock' or 'hotcore'.
+            session_store (MemorySessionStore or DiskSessionStore): Store of the selected rows of every browser
+                                                                     tab (see session_store.py); needed by
+                                                                     save_session and session_rows only.
+        """
+        spec = MODELS[model]
+        self.model         = model
+        self.stages        = spec["stages"]
+        self.parameters    = spec["parameters"]
+        self.table_columns = spec["table_columns"]
+        self.file_prefix   = spec["file_prefix"]
+        self.pkl           = spec["pkl"]
+        self.summary_pkl   = spec["summary_pkl"]
+        self.store_dir     = spec["store_dir"]
+        self.session_store = session_store
+
+        # Data files of the model - watched while the app runs, and reloaded when they change (see data_reload.py);
+        # in the low-memory mode the pickle file is replaced by the memory-mapped store (see mapped_store.py)
+        self.data_files = [store_version_file(self.store_dir) if LOW_MEMORY_MODE else self.pkl, self.summary_pkl]
+
+        # Species of the grid by phase, for the dropdowns (see species_catalog.py) - the species that are not in the
+        # pickle file are read from their column files when they are first selected
+        self.species_catalog = load_catalog(spec["catalog_json"])
+        self.all_species     = catalog_species(self.species_catalog)
+        self.species_columns = SpeciesColumns(spec["species_dir"])
+        self.species_lock    = threading.Lock()
+
+        self.data_version = files_version(self.data_files)
+        vars(self).update(self.load())
+        if LOW_MEMORY_MODE:
+            # Only the species of the store can be selected - species extracted later need a new store
+            self.species_catalog = {phase: [name for name in names if name in self.model_df.columns]
+                                    for phase, names in self.species_catalog.items()}
+            self.all_species     = catalog_species(self.species_catalog)
+
+        # Recent filtered selections and abundance plots (see selection_cache.py) - within the memory budget in the
+        # low-memory mode
+        self.selection_cache = ResultCache(SELECTION_CACHE_SIZE, cache_budget)
+        self.figure_cache    = ResultCache(FIGURE_CACHE_SIZE, cache_budget)
+        # Called without arguments after every reload of the data, e.g. to prewarm the caches again
+        self.reload_hooks = []
+        self.data_watcher = DataWatcher(self.data_files, self.data_version, self.reload)
+
+    def load(self, species=()):
+        """
+        Read the master dataframe and build the tables of the engine from it. Called when the engine is created,
+        and again in a background thread whenever the data files change (see data_reload.py). In the low-memory
+        mode the tables are opened from the memory-mapped store instead (see mapped_store.py), and the argument
+        is not used.
+
+        Args:
+            species (list): Species to add from their column files (see species_catalog.py).
+
+        Returns:
+            dict: The tables by their attribute name, e.g. {'stage_tables': ..., 'query': ...}.
+        """
+        if LOW_MEMORY_MODE:
+            # Memory-mapped tables with all the species (see mapped_store.py) - their columns are read per query
+            tables = load_mapped_store(self.store_dir, self.stages)
+            model_df, stage_tables = tables.pop("all"), tables
+        else:
+            # Read the master dataframe from a pickle file
+            with open(self.pkl, 'rb') as file:
+                model_df = pickle.load(file)
+
+            # Find the position of the 'zeta' column
+            zeta_index = model_df.columns.get_loc('zeta')
+            # Insert 'zeta_scaled' right after the 'zeta' column - this way it is more intuitive to read
+            model_df.insert(zeta_index + 1, 'zeta_scaled', 1.310 * 1e-17 * model_df['zeta'])
+            model_df = self.species_columns.append_to(model_df, species)
+
+            # Divide the master DataFrame into segments - increases the speed of the application
+            stage_tables = {table: model_df[model_df['stage'] == stage].reset_index(drop=True)
+                            for table, stage in self.stages.items()}
+
+        # Level of detail of every row (see level_of_detail.py) - the plot starts coarse and is refined when zooming in
+        lod_by_stage = {table: lod_levels(df) for table, df in stage_tables.items()}
+
+        # Fixed-size sample of every stage table, plotted as a quick preview of large selections (see preview.py)
+        preview_by_stage = {table: PreviewSample(df, lod_by_stage[table], self.parameters)
+                            for table, df in stage_tables.items()}
+
+        # Number of rows of every parameter combination - used to estimate the size of a selection before filtering it
+        row_counts = {table: parameter_row_counts(df, self.parameters) for table, df in stage_tables.items()}
+
+        # Filtering, projection, ratios and envelopes of the stage tables (see query_backend.py)
+        query = make_query_backend(stage_tables, self.store_dir if LOW_MEMORY_MODE else self.pkl)
+        # Columns of the selected rows besides the species
+        first_table = next(iter(stage_tables.values()))
+        metadata_columns = [column for column in first_table.columns if column not in self.all_species]
+
+        # Model tables used for fitting observations, by value of the 'stage' column
+        fit_tables = {"all": model_df, **{stage: stage_tables[table] for table, stage in self.stages.items()}}
+
+        # Rows of every run in the full table (all stages) - for the run drill-down (see run_index.py) and the stage
+        # transitions (see timescales.py)
+        run_index = RunIndex(model_df)
+
+        # Rows of every run of each stage table - for the parameter sweep and the timescales (see sweep.py, timescales.py)
+        stage_runs = {table: RunIndex(df) for table, df in stage_tables.items()}
+
+        # Per-run, per-stage summary of every species (see run_summary.py) - for the run overview and the y-axis range
+        run_summary = load_run_summary(self.summary_pkl, model_df, self.parameters)
+
+        return {
+            "model_df": model_df,
+            "stage_tables": stage_tables,
+            "lod_by_stage": lod_by_stage,
+            "preview_by_stage": preview_by_stage,
+            "row_counts": row_counts,
+            "query": query,
+            "metadata_columns": metadata_columns,
+            "fit_tables": fit_tables,
+            "run_index": run_index,
+            "stage_runs": stage_runs,
+            "run_summary": run_summary,
+        }
+
+    def with_species(self, species):
+        """
+        The tables that hold species columns, extended with the columns of some species read from their column
+        files. Only the new columns are read and added: the indices, samples and summary do not depend on the
+        species, and the query backend only processes the new columns (see QueryBackend.with_columns).
+
+        Args:
+            species (list): Species that are not in the tables yet and have a column file.
+
+        Returns:
+            dict: The new tables by their attribute name, e.g. {'stage_tables': ..., 'query': ...}.
+        """
+        model_df = self.species_columns.append_to(self.model_df, species)
+        added    = [name for name in model_df.columns if name not in self.model_df.columns]
+        columns  = model_df[added].to_numpy()
+
+        # The stage tables are the rows of the master dataframe of each stage, in the same order
+        stages       = model_df['stage'].to_numpy()
+        stage_tables = {}
+        for table, stage in self.stages.items():
+            df = self.stage_tables[table]
+            stage_tables[table] = pd.concat(
+                [df, pd.DataFrame(columns[stages == stage], columns=added, index=df.index)], axis=1
+            )
+
+        return {
+            "model_df": model_df,
+            "stage_tables": stage_tables,
+            "query": self.query.with_columns(stage_tables, added),
+            "fit_tables": {"all": model_df, **{stage: stage_tables[table] for table, stage in self.stages.items()}},
+            "run_index": self.run_index.with_table(model_df),
+            "stage_runs": {table: runs.with_table(stage_tables[table]) for table, runs in self.stage_runs.items()},
+        }
+
+    def ensure_species(self, species):
+        """Add the selected species that are not in the tables yet; the extended tables are swapped in at once."""
+        if LOW_MEMORY_MODE:
+            # The store has all the species
+            return
+        missing = [name for name in species if name not in self.model_df.columns and name in self.species_columns]
+        if not missing:
+            return
+        with self.species_lock:
+            # The tables may have been extended by another request in the meantime
+            missing = [name for name in missing if name not in self.model_df.columns]
+            if missing:
+                swap_data(vars(self), self.with_species(missing))
+
+    def selection_key(self, stage, selection):
+        """Key of a selection of the current version of the data, shared by the caches."""
+        return (self.data_version, make_selection_key(stage, **selection))
+
+    def selected_rows(self, stage, selection, species):
+        """Selected rows with the species that are shown, computed only if they are not cached."""
+        key = (*self.selection_key(stage, selection), tuple(species))
+        return self.selection_cache.get_or_compute(
+            key, lambda: self.query.select(stage, selection, self.metadata_columns + list(species))
+        )
+
+    def selected_positions(self, stage, selection):
+        """Positions of the rows of a selection in its stage table, cached, without reading the species columns."""
+        key = (*self.selection_key(stage, selection), "positions")
+        return self.selection_cache.get_or_compute(
+            key, lambda: self.query.select(stage, selection, ["age"]).index.to_numpy()
+        )
+
+    def save_session(self, session, stage, selection, species, positions, new_session_id):
+        """
+        Save the positions of the selected rows of a browser tab in the session store (see session_store.py).
+
+        Args:
+            session (dict): Data of the selection store of the tab (None for a new tab).
+            stage (str): Selected stage table.
+            selection (dict): Selected values of each parameter.
+            species (list): Selected species.
+            positions (np.ndarray): Positions of the selected rows in the stage table.
+            new_session_id (callable): Returns the id of a new session.
+
+        Returns:
+            dict: New data of the selection store (None if it has not changed).
+        """
+        session_id = (session or {}).get("session") or new_session_id()
+        key   = self.selection_key(stage, selection)
+        entry = self.session_store.get(session_id)
+        if entry is None or entry["key"] != key:
+            self.session_store.set(session_id, {"key": key, "positions": positions})
+        data = {"session": session_id, "stage": stage, "selection": selection, "species": species}
+        return None if data == session else data
+
+    def session_rows(self, session, columns, age_range=None):
+        """
+        Rows of the selection of a browser tab, read at the positions saved in the session store.
+
+        Args:
+            session (dict): Data of the selection store of the tab (session id, stage, selection and species).
+            columns (list): Columns to return.
+            age_range (tuple): (min, max) age [yr] of the rows (optional, both ends included).
+
+        Returns:
+            pd.DataFrame: The rows in table order; the index is the position of a row in the stage table.
+        """
+        stage = session["stage"]
+        frame = self.stage_tables[stage]
+        key   = self.selection_key(stage, session["selection"])
+        entry = self.session_store.get(session["session"])
+        if entry is None or entry["key"] != key:
+            # Expired, or saved for another version of the data: filter the stage table again
+            positions = self.query.select(stage, session["selection"], ["age"]).index.to_numpy()
+            self.session_store.set(session["session"], {"key": key, "positions": positions})
+        else:
+            positions = entry["positions"]
+        if age_range is not None:
+            age       = frame["age"].to_numpy()[positions]
+            positions = positions[(age >= age_range[0]) & (age <= age_range[1])]
+        return frame.iloc[positions, [frame.columns.get_loc(column) for column in columns]]
+
+    def export_rows(self, session):
+        """Rows of the data table (and CSV file) of the selection of a browser tab."""
+        self.ensure_species(session["species"])
+        return self.session_rows(session, self.table_columns + session["species"])
+
+    def export_name(self, kind):
+        """Name of a downloaded CSV file, e.g. 'Shock_model_20250101_120000.csv' for kind 'model'."""
+        current_time = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        return f"{self.file_prefix}_{kind}_{current_time}.csv"
+
+    def reload(self, version):
+        """Load a new version of the data, swap it in, and drop (then prewarm again) the cached results."""
+        # Species added by a request meanwhile (see ensure_species) would be dropped by the swap, and their tables
+        # cached with the previous version of the data
+        with self.species_lock:
+            # The species read from column files so far are read again
+            species  = [name for name in self.model_df.columns if name in self.species_columns]
+            previous = self.data_version
+            swap_data(vars(self), {**self.load(species), "data_version": version})
+            self.selection_cache.clear()
+            self.figure_cache.clear()
+            # The ratio, sweep and timescale caches are shared with the engines of the other models (see
+            # CMZ_explorer.py): only the results of the previous version of this model's data are dropped
+            clear_ratio_cache(previous)
+            clear_sweep_cache(previous)
+            clear_timescale_cache(previous)
+        for hook in self.reload_hooks:
+            hook()
+
+    def start(self):
+        """Start watching the data files, in the process that serves the requests."""
+        self.data_watcher.start()
+
+    def stats(self):
+        """
+        Size of the data and of the caches of the engine, e.g. for a metrics endpoint.
+
+        Returns:
+            dict: JSON-serializable statistics.
+        """
+        def cache_stats(cache):
+            with cache.lock:
+                results = list(cache.entries.values())
+            return {"entries": len(results), "megabytes": round(sum(map(result_nbytes, results)) / 1e6, 1)}
+
+        return {
+            "model": self.model,
+            "data_version": self.data_version,
+            "query_backend": self.query.name,
+            "rows": {table: len(df) for table, df in self.stage_tables.items()},
+            "species": len(self.all_species),
+            "selection_cache": cache_stats(self.selection_cache),
+            "figure_cache": cache_stats(self.figure_cache),
+        }
@@ -14,12 +14,27 @@ import pickle
 from functionality import(
                           extract_cshock,
                           extract_hotcore,
-                          mol_all
+                          mol_all,
+                          cube_axes_cshock,
+                          cube_axes_hotcore
                          )
+from parameter_cube import build_parameter_cube
+from run_summary import summarize_runs
+from species_catalog import discover_species, make_catalog, write_catalog, SpeciesColumns
 from config import (
                 cshock_pkl,
                 hotcore_pkl,
-                grid_path
+                cshock_summary_pkl,
+                hotcore_summary_pkl,
+                cshock_catalog_json,
+                hotcore_catalog_json,
+                cshock_species_dir,
+                hotcore_species_dir,
+                EXTRACT_ALL_SPECIES,
+                grid_path,
+                BUILD_PARAMETER_CUBE,
+                cshock_cube_dir,
+                hotcore_cube_dir
                )
 
 # Read the grid file
@@ -45,13 +60,43 @@ hotcore_succesful = hotcore_df[hotcore_df["is_in_dataset_keys"]].reset_index(dro
 cshock_unsuccesful  = cshock_df[~cshock_df["is_in_dataset_keys"]].reset_index(drop=True)
 hotcore_unsuccesful = hotcore_df[~hotcore_df["is_in_dataset_keys"]].reset_index(drop=True)
 
-processed_cshock  = extract_cshock(grid_path, grid_df, cshock_succesful, mol_all)
-processed_hotcore = extract_hotcore(grid_path, grid_df, hotcore_succesful, mol_all)
+# Species to extract - every species of the grid (discovered from the columns of a run, see species_catalog.py; the cshock
+# and hotcore runs share the chemical network), or only mol_all
+if EXTRACT_ALL_SPECIES:
+    species_all = list(dict.fromkeys(mol_all + discover_species(grid_path, cshock_succesful["run_id"].iloc[0])))
+else:
+    species_all = mol_all
+species_catalog = make_catalog(species_all)
+write_catalog(species_catalog, cshock_catalog_json)
+write_catalog(species_catalog, hotcore_catalog_json)
 
-cshock_df = pd.DataFrame(processed_cshock)
-with open(cshock_pkl, 'wb') as file:
-    pickle.dump(cshock_df, file)
+processed_cshock  = extract_cshock(grid_path, grid_df, cshock_succesful, species_all)
+processed_hotcore = extract_hotcore(grid_path, grid_df, hotcore_succesful, species_all)
 
+cshock_df  = pd.DataFrame(processed_cshock)
 hotcore_df = pd.DataFrame(processed_hotcore)
+
+# Write the per-run summary tables (runs x stages x species x statistics)
+with open(cshock_summary_pkl, 'wb') as file:
+    pickle.dump(summarize_runs(cshock_df, cube_axes_cshock, species=species_all), file)
+with open(hotcore_summary_pkl, 'wb') as file:
+    pickle.dump(summarize_runs(hotcore_df, cube_axes_hotcore, species=species_all), file)
+
+# The species of mol_all go to the pickle files, the others to one column file each - read by the apps when selected
+species_on_demand = [species for species in species_all if species not in mol_all]
+for model_df, species_dir in [(cshock_df, cshock_species_dir), (hotcore_df, hotcore_species_dir)]:
+    species_columns = SpeciesColumns(species_dir)
+    for species in species_on_demand:
+        species_columns.write(species, model_df[species].to_numpy())
+cshock_df  = cshock_df.drop(columns=species_on_demand)
+hotcore_df = hotcore_df.drop(columns=species_on_demand)
+
+with open(cshock_pkl, 'wb') as file:
+    pickle.dump(cshock_df, file)
 with open(hotcore_pkl, 'wb') as file:
-    pickle.dump(hotcore_df, file)
\ No newline at end of file
+    pickle.dump(hotcore_df, file)
+
+# Optionally, write the memory-mapped parameter cubes
+if BUILD_PARAMETER_CUBE:
+    build_parameter_cube(cshock_df, cube_axes_cshock, cshock_cube_dir)
+    build_parameter_cube(hotcore_df, cube_axes_hotcore, hotcore_cube_dir)
@@ -0,0 +1,117 @@
+# File: CMZ_data_explorer/data_reload.py
+# -*- coding: utf-8 -*-
+"""
+This module reloads the data of the visualization apps (Shocks.py and Protostellar_objects.py) while they
+run, so a new hotcore.pkl/cshock.pkl (or run summary) is served without restarting the app.
+
+With WATCH_DATA_FILES = True in config.py, a background thread checks the data files of the app every
+DATA_WATCH_INTERVAL seconds. Once they have changed and then stayed unchanged for one interval (so a file
+that is still being written is not read), the new version is loaded in that thread while the app keeps
+serving the old one. The module-level tables of the app are then replaced all at once, the old version is
+released, and the cached results are dropped. Every version has an id computed from the modification
+times and sizes of the files; the caches of the apps include it in their keys, so a result computed from
+one version is never served for another.
+
+At most two versions are in memory, and only while the new one is loaded: the thread loads one version
+at a time. If loading fails (e.g. a truncated file), a warning is shown and the app keeps the old version
+until the files change again.
+"""
+# Import necessary libraries
+import gc
+import hashlib
+import logging
+import os
+import threading
+import time
+import warnings
+from config import WATCH_DATA_FILES, DATA_WATCH_INTERVAL
+
+# Messages of the watcher thread, e.g. the reloads
+logger = logging.getLogger(__name__)
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+def files_version(paths):
+    """
+    Id of the current version of some data files, from their modification times and sizes.
+
+    Args:
+        paths (list): Data files; missing files are allowed.
+
+    Returns:
+        str: The version id, e.g. '3f9a0c1b2d4e'.
+    """
+    state = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            state.append((path, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            state.append((path, None, None))
+    return hashlib.sha1(repr(state).encode()).hexdigest()[:12]
+
+def swap_data(namespace, values):
+    """
+    Replace some names (module-level names or attributes) at once, then release their old values.
+
+    The old values are kept alive until all the names are replaced, so no memory is freed (and no other
+    thread can run) in the middle of the update: a request reads either the old or the new value of a name.
+
+    Args:
+        namespace (dict): Globals of a module or attributes of an object, e.g. vars(engine).
+        values (dict): New values by name.
+    """
+    previous = {name: namespace.get(name) for name in values}
+    namespace.update(values)
+    del previous
+    gc.collect()
+
+class DataWatcher:
+    """
+    Background thread reloading the data of an app when its data files change.
+
+    Example:
+        watcher = DataWatcher([cshock_pkl, cshock_summary_pkl], engine.data_version, engine.reload)
+        watcher.start()
+    """
+
+    def __init__(self, paths, version, reload, interval=DATA_WATCH_INTERVAL):
+        """
+        Args:
+            paths (list): Data files of the app.
+            version (str): Id of the version the app serves (output of files_version).
+            reload (callable): Called with the id of a new version; it loads the version and swaps it in.
+            interval (float): Seconds between two checks of the files.
+        """
+        self.paths    = list(paths)
+        self.version  = version
+        self.reload   = reload
+        self.interval = interval
+        self.thread   = None
+
+    def start(self):
+        """Start watching the files, if WATCH_DATA_FILES is set (only once)."""
+        if not WATCH_DATA_FILES or self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self._watch, name="data watcher", daemon=True)
+        self.thread.start()
+
+    def _watch(self):
+        seen = self.version
+        while True:
+            time.sleep(self.interval)
+            current = files_version(self.paths)
+            if current == self.version or current != seen:
+                # Unchanged, or changed since the last check and possibly still being written
+                seen = current
+                continue
+            try:
+                self.reload(current)
+                logger.info("Reloaded the data from %s (version %s)", self.paths, current)
+            except Exception as error:
+                warnings.warn(f"Could not reload the data from {self.paths}: {error!r}; "
+                              f"still serving version {self.version}.")
+            # Also after a failure, so the same files are not read again until they change
+            self.version = current
@@ -0,0 +1,280 @@
+# File: CMZ_data_explorer/figures.py
+# -*- coding: utf-8 -*-
+"""
+This module contains the figure builders of the abundance plot of the visualization apps
+(Shocks.py and Protostellar_objects.py), shared by all the callbacks that draw it.
+
+With COMPACT_HOVER (see config.py), every point of the plot only carries its row position in the
+stage table instead of a copy of all the hover columns, which are mostly constant within a run. The
+details of a point are looked up on the server when it is hovered or clicked (see point_details).
+Without it, the row position follows the hover columns, so a clicked point can still be found.
+"""
+# Import necessary libraries
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+from dash import dcc
+from functionality import format_molecule_HTML
+from config import DEFAULT_OPACITY, COMPACT_HOVER
+
+# Above this many rows the traces are drawn with WebGL, as px.scatter does
+WEBGL_MIN_ROWS = 1000
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+def abundance_figure(df, species, title, y_scale, marker_size, hover_data, labels, hovertemplate,
+                     compact_hover=COMPACT_HOVER):
+    """
+    Plot the abundances of the selected species versus age, one trace per species.
+
+    Args:
+        df (pd.DataFrame): Selected rows.
+        species (list): Species to plot.
+        title (str): Title of the figure.
+        y_scale (str): 'log' or 'linear'.
+        marker_size (int): Size of the markers.
+        hover_data (dict): Columns to show on hover, passed to px.scatter.
+        labels (dict): Labels of the columns, passed to px.scatter.
+        hovertemplate (str): Hover template of the traces.
+        compact_hover (bool): If True, the hover columns are not sent with the figure and the points
+                              only carry their row position in the stage table (see point_details);
+                              otherwise the row position is the last item of their customdata.
+
+    Returns:
+        plotly.graph_objects.Figure: The figure.
+    """
+    if compact_hover:
+        return compact_abundance_figure(df, species, title, y_scale, marker_size)
+
+    fig = px.scatter(
+        df,
+        x="age",
+        y=species,
+        title=title,
+        log_x=True,
+        log_y=(y_scale == "log"),
+        hover_data=hover_data,
+        labels=labels,
+    )
+    # Every trace has the rows of df in order: the row position in the stage table follows the hover columns
+    row = df.index.to_numpy(dtype=np.int32)[:, None]
+    for trace, name in zip(fig.data, species):
+        trace.name       = format_molecule_HTML(name)
+        trace.customdata = row if trace.customdata is None else np.hstack([trace.customdata, row])
+
+    # Set alpha for face and edge of scatter points and increase marker size
+    fig.update_traces(
+        marker=dict(size=marker_size, opacity=DEFAULT_OPACITY),
+        hoverlabel=dict(font_size=16),
+        hovertemplate=hovertemplate,
+    )
+    return fig
+
+def compact_abundance_figure(df, species, title, y_scale, marker_size):
+    """
+    Plot the abundances of the selected species versus age, one trace per species, where every point
+    only carries its row position in the stage table (df.index) as customdata.
+
+    Args:
+        df (pd.DataFrame): Selected rows of a stage table with a RangeIndex.
+        species (list): Species to plot.
+        title (str): Title of the figure.
+        y_scale (str): 'log' or 'linear'.
+        marker_size (int): Size of the markers.
+
+    Returns:
+        plotly.graph_objects.Figure: The figure.
+    """
+    trace_type = go.Scattergl if len(df) > WEBGL_MIN_ROWS else go.Scatter
+    age = df['age'].to_numpy()
+    row = df.index.to_numpy(dtype=np.int32)
+
+    fig = go.Figure()
+    for name in species:
+        fig.add_trace(trace_type(
+            x=age,
+            y=df[name].to_numpy(),
+            customdata=row,
+            mode="markers",
+            name=format_molecule_HTML(name),
+            marker=dict(size=marker_size, opacity=DEFAULT_OPACITY),
+            hoverlabel=dict(font_size=16),
+            hovertemplate=(
+                'Abundance: %{y:.2e}<br>' +
+                'Time: %{x:.2e} yr<br>' +
+                '<i>Details below the plot</i>'
+            ),
+        ))
+    fig.update_layout(title=title)
+    fig.update_xaxes(type="log")
+    fig.update_yaxes(type="log" if y_scale == "log" else "linear")
+    return fig
+
+def point_row(event, ages):
+    """
+    Row position in the stage table of the point of an abundance plot that is hovered or clicked: the customdata
+    of a point of a compact plot, or the last item of its customdata otherwise (see abundance_figure).
+
+    Args:
+        event (dict): hoverData or clickData of the dcc.Graph.
+        ages (np.ndarray): Ages of the rows of the stage table.
+
+    Returns:
+        int or None: The row position, or None if the event is not about a point of an abundance plot
+                     (e.g. the median of an envelope, whose customdata is not a row).
+    """
+    points = (event or {}).get("points") or []
+    if not points:
+        return None
+    position = points[0].get("customdata")
+    if isinstance(position, list):
+        position = position[-1] if position else None
+    # Through JSON, the position of a plot with numeric hover columns is a float
+    if isinstance(position, float) and position.is_integer():
+        position = int(position)
+    if not isinstance(position, int) or isinstance(position, bool) or not 0 <= position < len(ages):
+        return None
+    # The point must be this row of the stage table
+    if not np.isclose(points[0].get("x", np.nan), ages[position], rtol=1e-6):
+        return None
+    return position
+
+def point_details(event, df, hover_data, labels):
+    """
+    Details of the point of an abundance plot that is hovered or clicked.
+
+    Args:
+        event (dict): hoverData or clickData of the dcc.Graph.
+        df (pd.DataFrame): Stage table the plot was drawn from.
+        hover_data (dict): Columns to show (those with a True value), as for px.scatter.
+        labels (dict): Labels of the columns.
+
+    Returns:
+        dcc.Markdown or None: The details, or None if the event is not about a point of an abundance plot.
+    """
+    position = point_row(event, df['age'].to_numpy())
+    if position is None:
+        return None
+    point = event["points"][0]
+    row   = df.iloc[position]
+
+    lines = [f"**Abundance**: {point['y']:.2e}", f"**Run**: {row['run_id']} ({row['stage']})"]
+    for column, shown in hover_data.items():
+        if shown:
+            value = row[column]
+            lines.append(f"**{labels.get(column, column)}**: {value:.3g}" if isinstance(value, (int, float, np.number))
+                         else f"**{labels.get(column, column)}**: {value}")
+    return dcc.Markdown(" &nbsp;|&nbsp; ".join(lines), dangerously_allow_html=True)
+
+def style_figure(fig, df, species, show_grid, y_range=None):
+    """
+    Apply the common layout of the abundance plot: template, axis titles, grid and the X = 1e-14 line.
+
+    Args:
+        fig (plotly.graph_objects.Figure): Figure to style (modified in place).
+        df (pd.DataFrame): Selected rows, used to decide whether the X = 1e-14 line is within the y range.
+        species (list): Plotted species.
+        show_grid (list): Value of the 'show-grid' checklist.
+        y_range (tuple): (smallest positive, largest) abundance of the whole selection, e.g. from the run
+                         summary (see run_summary.py). If given, df is not scanned and a logarithmic y-axis
+                         is fixed to this range, so a thinned plot keeps the axis of the full selection.
+
+    Returns:
+        plotly.graph_objects.Figure: The styled figure.
+    """
+    # Add horizontal line only if it is within the y-axis range
+    if y_range is None:
+        y_min = np.min([df[name].min() for name in species])
+        y_max = np.max([df[name].max() for name in species])
+    else:
+        y_min, y_max = y_range
+        if fig.layout.yaxis.type == "log":
+            fig.update_yaxes(range=[np.log10(y_min) - 0.2, np.log10(y_max) + 0.2])
+    if y_min <= 1E-14 <= y_max:
+        fig.add_hline(y=1E-14, line_width=3)
+
+    fig.update_layout(
+        template="seaborn",
+        xaxis_title="Time (yr)",
+        yaxis_title="X(species)",
+        legend_title="Species",
+        font=dict(size=16),
+    )
+
+    grid_style = {
+        "showgrid": "grid" in show_grid,
+        "gridcolor": "rgba(128, 128, 128, 0.3)",
+        "gridwidth": 1,
+        "showline": True,
+        "linecolor": "Black",
+        "linewidth": 2,
+        "ticks": "outside",
+        "ticklen": 8,
+        "tickwidth": 1,
+        "tickcolor": "black",
+        "mirror": True,
+        "exponentformat": "e",
+        "showexponent": "all",
+        "minor": dict(ticklen=4, tickwidth=1)
+    }
+    fig.update_xaxes(**grid_style)
+    fig.update_yaxes(**grid_style)
+
+    fig.update_traces(showlegend=False, selector=dict(type="box"))
+    return fig
+
+def run_figure(run_df, species, title, y_scale):
+    """
+    Full time evolution of one run: the abundances of the selected species, and the local temperature,
+    density and visual extinction, with the stages of the run shaded.
+
+    Args:
+        run_df (pd.DataFrame): Rows of the run in time order (see RunIndex.rows).
+        species (list): Species to plot.
+        title (str): Title of the figure.
+        y_scale (str): 'log' or 'linear' (abundance panel).
+
+    Returns:
+        plotly.graph_objects.Figure: The figure.
+    """
+    physics = [('locTemp', 'T [K]', "linear"), ('locDens', 'n<sub>H</sub> [cm<sup>-3</sup>]', "log"), ('Av', 'A<sub>V</sub> [mag]', "linear")]
+    fig = make_subplots(rows=1 + len(physics), cols=1, shared_xaxes=True, vertical_spacing=0.03,
+                        row_heights=[0.55] + [0.45 / len(physics)] * len(physics))
+    age = run_df['age'].to_numpy(dtype=float)
+
+    for name in species:
+        fig.add_trace(go.Scatter(
+            x=age, y=run_df[name].to_numpy(), mode="lines+markers", name=format_molecule_HTML(name),
+            marker=dict(size=4), hovertemplate='X: %{y:.2e}<br>Time: %{x:.2e} yr',
+        ), row=1, col=1)
+    fig.update_yaxes(title_text="X(species)", type="log" if y_scale == "log" else "linear", row=1, col=1)
+    for row, (column, label, axis_type) in enumerate(physics, start=2):
+        fig.add_trace(go.Scatter(
+            x=age, y=run_df[column].to_numpy(), mode="lines", name=label, showlegend=False,
+            line=dict(color="black"), hovertemplate=label + ': %{y:.3g}<br>Time: %{x:.2e} yr<extra></extra>',
+        ), row=row, col=1)
+        fig.update_yaxes(title_text=label, type=axis_type, row=row, col=1)
+
+    # Shade the consecutive timesteps of each stage (ages of 0 cannot be placed on the logarithmic axis)
+    positive = age[age > 0]
+    if positive.size:
+        edges  = np.clip(age, positive.min(), None)
+        stages = run_df['stage'].to_numpy()
+        starts = np.flatnonzero(np.r_[True, stages[1:] != stages[:-1]])
+        colors = px.colors.qualitative.Pastel
+        names  = list(dict.fromkeys(stages))
+        for start, stop in zip(starts, np.r_[starts[1:], len(stages)]):
+            shading = dict(x0=edges[start], x1=edges[min(stop, len(stages) - 1)], col=1, line_width=0, layer="below",
+                           fillcolor=colors[names.index(stages[start]) % len(colors)], opacity=0.3)
+            # The name of the stage is only written in the abundance panel
+            fig.add_vrect(row=1, annotation_text=str(stages[start]), annotation_position="top left", **shading)
+            for row in range(2, 2 + len(physics)):
+                fig.add_vrect(row=row, **shading)
+
+    fig.update_xaxes(type="log")
+    fig.update_xaxes(title_text="Time (yr)", row=1 + len(physics), col=1)
+    fig.update_layout(title=title, template="seaborn", height=900, font=dict(size=14), legend_title="Species")
+    return fig
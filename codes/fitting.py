@@ -0,0 +1,200 @@
+# File: CMZ_data_explorer/fitting.py
+# -*- coding: utf-8 -*-
+"""
+This module contains the observation-fitting engine used by the visualization apps (Shocks.py and Protostellar_objects.py).
+Observed abundances and abundance ratios (with uncertainties, or upper limits) are compared with every
+(run, timestep) of a model table, and the best matching models are returned together with their parameters.
+
+The comparison is done in log10 space, since abundances span many orders of magnitude:
+
+    chi2 = sum_i ((log10 X_model,i - log10 X_obs,i) / sigma_i)^2
+
+where sigma_i is the uncertainty in dex. Upper limits only contribute when the model exceeds them.
+The score is evaluated in chunks of rows with NumPy, optionally spread over several processes.
+"""
+# Import necessary libraries
+import re
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from config import (
+                FIT_CHUNK_SIZE,
+                FIT_N_PROCESSES,
+                FIT_TOP_K,
+                FIT_DEFAULT_ERROR_DEX,
+                FIT_ABUNDANCE_FLOOR
+               )
+
+# One observation per line: "NAME VALUE [ERROR]" or "NAME < VALUE [ERROR]", where NAME is a species or a ratio
+_observation_pattern = re.compile(r"^\s*(?P<name>[^\s<=]+)\s*(?P<relation>[<=]?)\s*(?P<value>\S+)\s*(?P<error>\S+)?\s*$")
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+def parse_observations(text, available_species):
+    """
+    Parse observations written one per line, e.g.:
+
+        CH3OH   1e-8   0.3     (abundance of 1e-8 with a 0.3 dex uncertainty)
+        HNC/HCN 0.5    0.2     (abundance ratio)
+        SIO   < 1e-10          (upper limit)
+
+    Empty lines and lines starting with '#' are ignored. When no uncertainty is given,
+    FIT_DEFAULT_ERROR_DEX is used.
+
+    Args:
+        text (str): The observations.
+        available_species (list): Species present in the model table.
+
+    Returns:
+        list: List of dictionaries with keys 'name', 'numerator', 'denominator', 'value', 'error', 'upper_limit'.
+
+    Raises:
+        ValueError: If a line cannot be understood or refers to an unknown species.
+    """
+    observations = []
+    for line in (text or "").splitlines():
+        if not line.strip() or line.strip().startswith("#"):
+            continue
+        match = _observation_pattern.match(line)
+        if match is None:
+            raise ValueError(f"Cannot read the observation '{line.strip()}'.")
+
+        name = match["name"]
+        numerator, _, denominator = name.partition("/")
+        for species in (numerator, denominator):
+            if species and species not in available_species:
+                raise ValueError(f"Unknown species '{species}' in '{line.strip()}'.")
+        try:
+            value = float(match["value"])
+            error = float(match["error"]) if match["error"] else FIT_DEFAULT_ERROR_DEX
+        except ValueError:
+            raise ValueError(f"Cannot read the numbers in '{line.strip()}'.") from None
+        if value <= 0 or error <= 0:
+            raise ValueError(f"Values and uncertainties must be positive in '{line.strip()}'.")
+
+        observations.append({
+            'name': name,
+            'numerator': numerator,
+            'denominator': denominator or None,
+            'value': value,
+            'error': error,
+            'upper_limit': match["relation"] == "<",
+        })
+    return observations
+
+def _score_chunk(numerators, denominators, log_observed, errors, upper_limits):
+    """
+    Chi-square of every row of a chunk of model values.
+
+    Args:
+        numerators (np.ndarray): Rows x observations array of modelled abundances (ratio numerators).
+        denominators (np.ndarray): Rows x observations array of ratio denominators (ones for abundances).
+        log_observed (np.ndarray): log10 of the observed values.
+        errors (np.ndarray): Uncertainties in dex.
+        upper_limits (np.ndarray): True where the observation is an upper limit.
+
+    Returns:
+        np.ndarray: Chi-square of each row.
+    """
+    log_model = (np.log10(np.maximum(numerators, FIT_ABUNDANCE_FLOOR))
+                 - np.log10(np.maximum(denominators, FIT_ABUNDANCE_FLOOR)))
+    residuals = (log_model - log_observed) / errors
+    # Upper limits only penalize models that are above them
+    residuals = np.where(upper_limits & (residuals < 0), 0., residuals)
+    return np.sum(residuals ** 2, axis=1)
+
+def _chunks(n_rows, chunk_size):
+    """Slices covering n_rows rows in steps of chunk_size."""
+    return [slice(start, min(start + chunk_size, n_rows)) for start in range(0, n_rows, chunk_size)]
+
+def score_models(df, observations, n_processes=FIT_N_PROCESSES, chunk_size=FIT_CHUNK_SIZE):
+    """
+    Chi-square of every row (run, timestep) of a model table with respect to the observations.
+
+    Args:
+        df (pd.DataFrame): Model table containing the observed species.
+        observations (list): Output of parse_observations.
+        n_processes (int): Number of worker processes. With 1 (or less) everything runs in this process.
+        chunk_size (int): Number of rows evaluated at once.
+
+    Returns:
+        np.ndarray: Chi-square of each row of df.
+    """
+    numerators   = df[[obs['numerator'] for obs in observations]].to_numpy(dtype=float)
+    denominators = np.ones_like(numerators)
+    for i, obs in enumerate(observations):
+        if obs['denominator']:
+            denominators[:, i] = df[obs['denominator']].to_numpy(dtype=float)
+
+    log_observed = np.log10([obs['value'] for obs in observations])
+    errors       = np.array([obs['error'] for obs in observations])
+    upper_limits = np.array([obs['upper_limit'] for obs in observations])
+
+    chunks = _chunks(len(df), chunk_size)
+    chi2   = np.empty(len(df))
+    if n_processes > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=n_processes) as executor:
+            results = executor.map(
+                _score_chunk,
+                [numerators[chunk] for chunk in chunks],
+                [denominators[chunk] for chunk in chunks],
+                [log_observed] * len(chunks),
+                [errors] * len(chunks),
+                [upper_limits] * len(chunks),
+            )
+            for chunk, result in zip(chunks, results):
+                chi2[chunk] = result
+    else:
+        for chunk in chunks:
+            chi2[chunk] = _score_chunk(numerators[chunk], denominators[chunk], log_observed, errors, upper_limits)
+    return chi2
+
+def fit_models(df, observations, parameter_columns, top_k=FIT_TOP_K, one_per_run=False,
+               n_processes=FIT_N_PROCESSES, chunk_size=FIT_CHUNK_SIZE):
+    """
+    Rank the models of a table against the observations and return the best ones.
+
+    Args:
+        df (pd.DataFrame): Model table ('run_id', 'age', 'stage', the parameter and species columns).
+        observations (list): Output of parse_observations.
+        parameter_columns (list): Parameters of the models reported for each match (e.g. list(ranges_cshock)).
+        top_k (int): Number of best models to return (at least one).
+        one_per_run (bool): If True, only the best timestep of each run is kept.
+        n_processes (int): Number of worker processes (see score_models).
+        chunk_size (int): Number of rows evaluated at once.
+
+    Returns:
+        pd.DataFrame: The top_k models sorted from best to worst, with their rank, chi-square,
+                      reduced chi-square, run, age, stage, parameters and modelled values.
+    """
+    if df.empty or not observations:
+        return pd.DataFrame()
+
+    chi2 = score_models(df, observations, n_processes=n_processes, chunk_size=chunk_size)
+
+    if one_per_run:
+        # Position of the best timestep of each run
+        order      = np.lexsort((chi2, df['run_id'].to_numpy()))
+        run_ids    = df['run_id'].to_numpy()[order]
+        first      = np.r_[True, run_ids[1:] != run_ids[:-1]]
+        candidates = order[first]
+    else:
+        candidates = np.arange(len(df))
+
+    top_k = min(max(1, int(top_k)), len(candidates))
+    best  = candidates[np.argpartition(chi2[candidates], top_k - 1)[:top_k]]
+    best  = best[np.argsort(chi2[best], kind="stable")]
+
+    result = df.iloc[best][['run_id', 'age', 'stage'] + list(parameter_columns)].reset_index(drop=True)
+    result.insert(0, 'rank', np.arange(1, top_k + 1))
+    result.insert(1, 'chi2', chi2[best])
+    result.insert(2, 'reduced_chi2', chi2[best] / len(observations))
+    for obs in observations:
+        modelled = df[obs['numerator']].to_numpy(dtype=float)[best]
+        if obs['denominator']:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                modelled = modelled / df[obs['denominator']].to_numpy(dtype=float)[best]
+        result[f"model {obs['name']}"] = modelled
+    return result
@@ -52,6 +52,11 @@ ranges_cshock = {
                     'initialTemp': [15., 20., 25., 30., 35.]
 }
 
+# Parameters spanning the grid - the axes of the parameter cubes (see parameter_cube.py)
+# For hotcore models, the FUV field of the natal cloud varies independently of the object's FUV field
+cube_axes_cshock  = list(ranges_cshock)
+cube_axes_hotcore = list(ranges_hotcore) + ['index', 'cloud_radfield']
+
 # --------------------
 # FUNCTION DEFINITIONS
 # --------------------
@@ -98,6 +103,23 @@ def custom_round(value):
     else:
         return np.round(value, -3)  # Round to nearest 1000 for values >= 1000 
     
+def make_selection_key(stage, **filters):
+    """
+    Create a hashable description of a selection, independent of the order in which values were picked.
+    It is used as the key for caching the results computed for a selection.
+
+    Args:
+        stage (str): Selected stage (e.g. 'shock', 'hotcore').
+        **filters: Selected values for each parameter, e.g. zeta=[10., 100.].
+
+    Returns:
+        tuple: The selection key.
+    """
+    return (stage,) + tuple(
+        (parameter, tuple(sorted(values or [])))
+        for parameter, values in sorted(filters.items())
+    )
+
 def find_age_for_post_shock(df, initialTemp):
     """
     Find the age when the model enters the post-shock stage.
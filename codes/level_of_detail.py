@@ -0,0 +1,108 @@
+# File: CMZ_data_explorer/level_of_detail.py
+# -*- coding: utf-8 -*-
+"""
+This module contains the multi-resolution time pyramid used by the visualization apps (Shocks.py and
+Protostellar_objects.py) to plot large selections coarsely at first and in more detail when zooming in.
+
+Every row of a model table gets a level: the time span of each run is divided into LOD_BASE_BINS
+logarithmic bins at level 0, twice as many at level 1, and so on, and a row belongs to the first level
+at which it is the first timestep of its bin (the last timestep of a run is always at level 0).
+Rows that are not kept at any of the LOD_N_LEVELS levels only appear at full resolution (level LOD_N_LEVELS).
+Plotting the rows with level <= L therefore shows every run with about LOD_BASE_BINS * 2^L timesteps.
+"""
+# Import necessary libraries
+import numpy as np
+import pandas as pd
+from config import LOD_BASE_BINS, LOD_N_LEVELS
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+def lod_levels(df, n_levels=LOD_N_LEVELS, base_bins=LOD_BASE_BINS):
+    """
+    Level of detail of every row of a model table.
+
+    Args:
+        df (pd.DataFrame): Model table with 'run_id' and 'age' columns, timesteps of a run in time order.
+        n_levels (int): Number of levels of the pyramid.
+        base_bins (int): Number of logarithmic time bins per run at level 0.
+
+    Returns:
+        np.ndarray: Level of each row, from 0 (coarsest) to n_levels (full resolution only).
+    """
+    run_code = pd.factorize(df['run_id'])[0]
+    age      = df['age'].to_numpy(dtype=float)
+    log_age  = pd.Series(np.log10(np.where(age > 0, age, np.nan)))
+
+    # Position of every row within the (logarithmic) time span of its run, from 0 to 1
+    grouped  = log_age.groupby(run_code)
+    first    = grouped.transform('min').to_numpy()
+    span     = grouped.transform('max').to_numpy() - first
+    position = np.divide(log_age.to_numpy() - first, span, out=np.zeros(len(df)), where=span > 0)
+    position = np.nan_to_num(position)
+
+    levels = np.full(len(df), n_levels, dtype=np.int8)
+    levels[~pd.Series(run_code).duplicated(keep='last').to_numpy()] = 0
+    for level in range(n_levels):
+        n_bins = base_bins * 2 ** level
+        time_bin = np.minimum((position * n_bins).astype(np.int64), n_bins - 1)
+        first_in_bin = ~pd.Series(run_code * n_bins + time_bin).duplicated().to_numpy()
+        levels[first_in_bin & (levels > level)] = level
+    # Timesteps that cannot be placed on a logarithmic axis are few - keep them at the coarsest level
+    levels[np.isnan(log_age.to_numpy())] = 0
+    return levels
+
+def choose_level(levels, n_species, max_points):
+    """
+    Finest level at which a selection fits within a number of plotted points.
+
+    Args:
+        levels (np.ndarray): Levels of the selected rows (output of lod_levels).
+        n_species (int): Number of plotted species (points per row).
+        max_points (int): Maximum number of plotted points.
+
+    Returns:
+        int: The level (at least 0, even if the coarsest level does not fit).
+    """
+    points = np.cumsum(np.bincount(levels, minlength=LOD_N_LEVELS + 1)) * n_species
+    return max(int(np.searchsorted(points, max_points, side="right")) - 1, 0)
+
+def zoomed_ranges(relayout_data):
+    """
+    Axis ranges of a zoom event of the abundance plot.
+
+    Args:
+        relayout_data (dict): relayoutData of the dcc.Graph.
+
+    Returns:
+        tuple or None: (x_range, y_range) in axis units (log10 for logarithmic axes), each None when
+                       the axis is autoscaled; None if the event does not change the x-axis range.
+    """
+    if not relayout_data:
+        return None
+
+    def axis_range(axis):
+        if f"{axis}.range[0]" in relayout_data:
+            return [relayout_data[f"{axis}.range[0]"], relayout_data[f"{axis}.range[1]"]]
+        return relayout_data.get(f"{axis}.range")
+
+    x_range = axis_range("xaxis")
+    if x_range is None and not relayout_data.get("xaxis.autorange"):
+        return None
+    return x_range, axis_range("yaxis")
+
+def lod_message(n_shown, n_rows):
+    """
+    Notice shown below the abundance plot when only part of the timesteps are drawn.
+
+    Args:
+        n_shown (int): Number of plotted rows.
+        n_rows (int): Number of rows of the selection (within the zoomed age range).
+
+    Returns:
+        str: The notice ('' when every row is plotted).
+    """
+    if n_shown == n_rows:
+        return ""
+    return f"ℹ️ Showing {n_shown:,} of the {n_rows:,} timesteps of this selection - zoom in for more detail."
@@ -0,0 +1,547 @@
+# File: CMZ_data_explorer/load_test.py
+# -*- coding: utf-8 -*-
+"""
+Local load test of the apps (Shocks.py or Protostellar_objects.py): several concurrent simulated users
+change the selection step by step - a random walk over the model parameters (ranges_cshock or
+ranges_hotcore), the species lists and the stage - and every step sends the requests a browser would
+send: the preview of the abundance plot (update_preview, see preview.py), its full update (update_output)
+and, for the selection it saves, the update of the ratio plot (update_ratio_plot).
+For every number of users, the throughput and latency percentiles of each callback and the memory
+(RSS, with worker processes) of the server over time are reported.
+
+The requests use the Dash protocol (/_dash-update-component), with the layout and the callbacks served
+by the app, so the test drives the real callbacks. Background callbacks (BACKGROUND_CALLBACKS = True in
+config.py) are polled until their result is ready, as the browser does; the latency then includes the
+job queue. The server can be
+
+    --url URL           an app that is already running, e.g. python Shocks.py in another terminal,
+    --start APP         an app started (and stopped) by the test, as set by SERVER_MODE in config.py,
+    --in-process APP    the app imported into the test and called through the Flask test client
+                        (no network, handy to profile the callbacks themselves).
+
+The walks are seeded, so the same sequences of selections are replayed by every run (e.g. before and
+after a deployment). Examples:
+
+    python load_test.py --start Shocks --concurrency 1 4 8 --duration 30
+    python load_test.py --app Protostellar_objects --url http://127.0.0.1:8050 --csv before_release
+"""
+# Import necessary libraries
+import argparse
+import importlib
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import requests
+from functionality import ranges_cshock, ranges_hotcore, mol_all_gas, mol_all_surface, mol_all_bulk
+
+# Controls walked over in each app: parameter dropdowns (with the grid of the parameter, or None to use
+# all the options offered by the app), species dropdowns and the stage dropdown
+WALK_CONTROLS = {
+    'Shocks': {
+        'parameters': {
+            'df-dropdown-shockvel':    ranges_cshock['shock_vel'],
+            'df-dropdown-dens':        ranges_cshock['initialDens'],
+            'df-dropdown-zeta':        ranges_cshock['zeta'],
+            'df-dropdown-rad':         ranges_cshock['radfield'],
+            'df-dropdown-initialtemp': ranges_cshock['initialTemp'],
+        },
+    },
+    'Protostellar_objects': {
+        'parameters': {
+            'df-dropdown-finaltemp':   ranges_hotcore['final_temp'],
+            'df-dropdown-dens':        ranges_hotcore['initialDens'],
+            'df-dropdown-zeta':        ranges_hotcore['zeta'],
+            'df-dropdown-rad':         ranges_hotcore['radfield'],
+            'df-dropdown-initialtemp': ranges_hotcore['initialTemp'],
+            'df-dropdown-mass':        None,
+            'df-dropdown-rad-parent':  None,
+        },
+    },
+}
+SPECIES_CONTROLS = {
+    'df-dropdown-gas-species':     mol_all_gas,
+    'df-dropdown-surface-species': mol_all_surface,
+    'df-dropdown-bulk-species':    mol_all_bulk,
+}
+STAGE_CONTROL = 'df-dropdown-type'
+# Outputs of the tested callbacks (update_preview, update_output and update_ratio_plot), in the order they are sent
+TESTED_OUTPUTS = ['preview-store.data', 'df-graph.figure', 'ratio-graph.figure']
+# Number of species selected by the simulated users
+N_SPECIES = (1, 4)
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+class DashClient:
+    """
+    Requests to a Dash app, over HTTP or through the Flask test client of an app imported in this process.
+    One client per thread.
+    """
+
+    def __init__(self, url=None, app=None):
+        self.url     = url
+        self.session = requests.Session() if app is None else None
+        self.test    = app.server.test_client() if app is not None else None
+
+    def get(self, path):
+        """Body of a GET request, as text."""
+        if self.test is not None:
+            return self.test.get(path).get_data(as_text=True)
+        response = self.session.get(f"{self.url}{path}", timeout=60)
+        response.raise_for_status()
+        return response.text
+
+    def post(self, path, body, params=None):
+        """Status code and JSON body (None if empty) of a POST request."""
+        if self.test is not None:
+            response = self.test.post(path, json=body, query_string=params or {})
+            status, text = response.status_code, response.get_data(as_text=True)
+        else:
+            response = self.session.post(f"{self.url}{path}", json=body, params=params or {}, timeout=600)
+            status, text = response.status_code, response.text
+        if status >= 400:
+            raise RuntimeError(f"{path} returned {status}: {text[:300]}")
+        return status, (json.loads(text) if text else None)
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+
+def component_values(layout):
+    """
+    Values of the properties of every component of a serialized layout.
+
+    Args:
+        layout (dict): Layout as returned by /_dash-layout.
+
+    Returns:
+        dict: {(component id, property): value}.
+    """
+    values = {}
+    stack  = [layout]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif isinstance(node, dict) and "props" in node:
+            props = node["props"]
+            if "id" in props:
+                values.update({(props["id"], name): value for name, value in props.items()})
+            stack.extend(value for value in props.values() if isinstance(value, (dict, list)))
+    return values
+
+def end_id(index_page):
+    """Signed page token of Dash >= 3 that background callbacks must echo (None for older versions)."""
+    match = re.search(r'<script id="_dash-config" type="application/json">(.*?)</script>', index_page, re.S)
+    return json.loads(match.group(1)).get("end_id") if match else None
+
+def find_callback(dependencies, output):
+    """
+    Callback with an output.
+
+    Args:
+        dependencies (list): Callbacks as returned by /_dash-dependencies.
+        output (str): One of the outputs of the callback, e.g. 'df-graph.figure'.
+
+    Returns:
+        dict: The callback.
+
+    Raises:
+        KeyError: If no callback has the output.
+    """
+    # Outputs shared by several callbacks end with @<hash>: the callback of the output without it comes first
+    for shared in (False, True):
+        for callback in dependencies:
+            names = callback["output"].strip(".").split("...")
+            if output in [name.split("@")[0] if shared else name for name in names]:
+                return callback
+    raise KeyError(f"No callback has the output '{output}'.")
+
+def callback_request(callback, values, changed):
+    """
+    Body of the request of a callback.
+
+    Args:
+        callback (dict): Output of find_callback.
+        values (dict): {(component id, property): value} of the inputs and states.
+        changed (list): (component id, property) that triggered the callback.
+
+    Returns:
+        dict: JSON body of a /_dash-update-component request.
+    """
+    def with_value(dependency):
+        return {**dependency, "value": values.get((dependency["id"], dependency["property"]))}
+
+    outputs = [dict(zip(("id", "property"), name.rsplit(".", 1)))
+               for name in callback["output"].strip(".").split("...")]
+    return {
+        "output": callback["output"],
+        "outputs": outputs if len(outputs) > 1 else outputs[0],
+        "inputs": [with_value(dependency) for dependency in callback["inputs"]],
+        "state": [with_value(dependency) for dependency in callback["state"]],
+        "changedPropIds": [f"{component}.{prop}" for component, prop in changed],
+    }
+
+def send(client, body, token=None, poll_interval=0.1, timeout=120.):
+    """
+    Send one callback request, polling a background callback until its result is ready.
+
+    Args:
+        client (DashClient): Client of the thread.
+        body (dict): Output of callback_request.
+        token (str): Output of end_id.
+        poll_interval (float): Time between two polls of a background callback [s].
+        timeout (float): Longest wait for the result of a background callback [s].
+
+    Returns:
+        tuple: (latency [s], {(component id, property): value} of the updated outputs).
+
+    Raises:
+        RuntimeError: If the server returns an error.
+        TimeoutError: If a background callback does not finish in time.
+    """
+    start  = time.perf_counter()
+    params = {"endId": token} if token else {}
+    status, result = client.post("/_dash-update-component", body, params)
+    while status == 200 and "cacheKey" in result:
+        # Background job: ask for its result with the handles returned by the server (as the browser does)
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError(f"No result of the background callback after {timeout} s.")
+        time.sleep(poll_interval)
+        poll = {**params, "cacheKey": result["cacheKey"], "job": result["job"]}
+        status, result = client.post("/_dash-update-component", body, poll)
+        if status != 200 or "response" in result:
+            break
+    latency = time.perf_counter() - start
+    response = (result or {}).get("response", {}) if status == 200 else {}
+    return latency, {(component, prop): value for component, props in response.items() for prop, value in props.items()}
+
+def _options(values, component, grid=None):
+    """Values offered by a dropdown, restricted to a grid of values."""
+    options = [option["value"] if isinstance(option, dict) else option
+               for option in values.get((component, "options")) or []]
+    return [value for value in options if grid is None or value in grid] or list(grid or [])
+
+def random_walk(values, app_name, rng):
+    """
+    Endless random walk of a user over the selection: each step changes one parameter, species or the stage,
+    and updates the ratio selection to the first two species.
+
+    Args:
+        values (dict): Initial {(component id, property): value}, e.g. from component_values.
+        app_name (str): Key of WALK_CONTROLS.
+        rng (np.random.Generator): Random numbers of the user.
+
+    Yields:
+        tuple: (values, changed) - the new values and the (component id, property) that changed.
+    """
+    values  = dict(values)
+    choices = {component: _options(values, component, grid)
+               for component, grid in {**WALK_CONTROLS[app_name]['parameters'], **SPECIES_CONTROLS}.items()}
+    stages  = _options(values, STAGE_CONTROL)
+    values[("enable-ratio-plot", "value")] = ["enabled"]
+
+    while True:
+        action = rng.choice(['parameter', 'species', 'stage'], p=[0.6, 0.3, 0.1])
+        if action == 'stage' and len(stages) > 1:
+            component = STAGE_CONTROL
+            values[(component, "value")] = rng.choice([s for s in stages if s != values.get((component, "value"))])
+        else:
+            # Species: keep N_SPECIES[0] to N_SPECIES[1] of them in total over the three dropdowns
+            selected  = sum(len(values.get((c, "value")) or []) for c in SPECIES_CONTROLS)
+            pool      = list(SPECIES_CONTROLS) if action == 'species' else list(WALK_CONTROLS[app_name]['parameters'])
+            component = pool[rng.integers(len(pool))]
+            current   = list(values.get((component, "value")) or [])
+            absent    = [value for value in choices[component] if value not in current]
+            if action == 'species':
+                remove = current and (selected >= N_SPECIES[1] or (selected > N_SPECIES[0] and rng.random() < 0.5))
+            else:
+                remove = len(current) > 1 and (not absent or rng.random() < 0.5)
+            if remove:
+                current.pop(rng.integers(len(current)))
+            elif absent:
+                current.append(absent[rng.integers(len(absent))])
+            values[(component, "value")] = current
+
+        changed = [(component, "value")]
+        if action == 'species':
+            species = [s for c in SPECIES_CONTROLS for s in values.get((c, "value")) or []]
+            values[("ratio-numerator-dropdown", "value")]   = species[:1]
+            values[("ratio-denominator-dropdown", "value")] = species[1:2]
+            changed += [("ratio-numerator-dropdown", "value"), ("ratio-denominator-dropdown", "value")]
+        yield values, changed
+
+def _process_rss(pid):
+    """Resident memory of a process and its children (e.g. background workers) [MB]."""
+    import psutil
+    process = psutil.Process(pid)
+    rss     = process.memory_info().rss
+    for child in process.children(recursive=True):
+        try:
+            rss += child.memory_info().rss
+        except psutil.NoSuchProcess:
+            pass
+    return rss / 2**20
+
+def monitor_rss(pid, stop, interval=1.):
+    """
+    Sample the memory of the server in a thread until an event is set.
+
+    Args:
+        pid (int): Process of the server (None: no samples).
+        stop (threading.Event): Set to stop sampling.
+        interval (float): Time between two samples [s].
+
+    Returns:
+        tuple: (thread, samples) - samples is filled with {'time [s]', 'rss [MB]'} while the thread runs.
+    """
+    samples = []
+    try:
+        import psutil  # noqa: F401
+    except ImportError:
+        warnings.warn("The memory of the server is not reported without psutil (pip install psutil).")
+        pid = None
+
+    def sample():
+        start = time.perf_counter()
+        while pid is not None and not stop.is_set():
+            samples.append({'time [s]': time.perf_counter() - start, 'rss [MB]': _process_rss(pid)})
+            stop.wait(interval)
+
+    thread = threading.Thread(target=sample, daemon=True)
+    thread.start()
+    return thread, samples
+
+def run_load(make_client, callbacks, values, app_name, concurrency, duration, token=None, seed=0, poll_interval=0.1,
+             timeout=120.):
+    """
+    Random walks of several concurrent users for some time.
+
+    Args:
+        make_client (callable): Returns a new DashClient.
+        callbacks (dict): {output: callback} of the tested callbacks (see find_callback).
+        values (dict): Initial values of the controls.
+        app_name (str): Key of WALK_CONTROLS.
+        concurrency (int): Number of concurrent users.
+        duration (float): Duration of the test [s].
+        token (str): Output of end_id.
+        seed (int): Seed of the walks; user i walks with seed + i.
+        poll_interval (float): Time between two polls of a background callback [s].
+        timeout (float): Longest wait for the result of a background callback [s].
+
+    Returns:
+        pd.DataFrame: One row per request, with 'user', 'output', 'sent [s]', 'latency [s]' and 'error'
+                      (None for successful requests; failed requests do not stop the test).
+    """
+    records = []
+    lock    = threading.Lock()
+    start   = time.perf_counter()
+    stop_at = start + duration
+
+    def user(index):
+        client = make_client()
+        walk   = random_walk(values, app_name, np.random.default_rng(seed + index))
+        try:
+            while time.perf_counter() < stop_at:
+                step_values, changed = next(walk)
+                for output, callback in callbacks.items():
+                    inputs = {(dependency["id"], dependency["property"]) for dependency in callback["inputs"]}
+                    if inputs.isdisjoint(changed):
+                        continue
+                    sent  = time.perf_counter() - start
+                    error = None
+                    try:
+                        latency, updated = send(client, callback_request(callback, step_values, changed), token,
+                                                poll_interval, timeout)
+                        # Outputs of a callback are inputs of the next ones, e.g. the selection store of the
+                        # ratio plot (see session_store.py)
+                        step_values.update(updated)
+                        changed = changed + list(updated)
+                    except (RuntimeError, TimeoutError, requests.RequestException) as exception:
+                        latency, error = time.perf_counter() - start - sent, str(exception).splitlines()[0]
+                    with lock:
+                        records.append({'user': index, 'output': output, 'sent [s]': sent, 'latency [s]': latency,
+                                        'error': error})
+        finally:
+            client.close()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for job in [executor.submit(user, index) for index in range(concurrency)]:
+            job.result()
+    records = pd.DataFrame(records, columns=['user', 'output', 'sent [s]', 'latency [s]', 'error'])
+    records.attrs['elapsed'] = time.perf_counter() - start
+    return records
+
+def latency_report(records, concurrency, rss):
+    """
+    Throughput and latency percentiles (of the successful requests) of each callback of one load test.
+
+    Args:
+        records (pd.DataFrame): Output of run_load.
+        concurrency (int): Number of concurrent users.
+        rss (pd.DataFrame): Memory samples of the test (may be empty).
+
+    Returns:
+        pd.DataFrame: One row per callback.
+    """
+    rows = []
+    for output, group in records.groupby('output'):
+        successful = group['error'].isna()
+        latency    = 1e3 * group.loc[successful, 'latency [s]'].to_numpy()
+        percentile = (lambda q: np.percentile(latency, q)) if len(latency) else (lambda q: np.nan)
+        rows.append({
+            'users': concurrency,
+            'callback': output.split(".")[0],
+            'requests': len(group),
+            'errors': int((~successful).sum()),
+            'throughput [1/s]': successful.sum() / records.attrs['elapsed'],
+            'p50 [ms]': percentile(50),
+            'p95 [ms]': percentile(95),
+            'p99 [ms]': percentile(99),
+            'max RSS [MB]': rss['rss [MB]'].max() if len(rss) else np.nan,
+        })
+    return pd.DataFrame(rows)
+
+def start_server(app_name, url, timeout=300):
+    """
+    Start an app in a new process and wait until it answers.
+
+    Args:
+        app_name (str): Module of the app, e.g. 'Shocks'.
+        url (str): Address the app listens on (SERVER_HOST and SERVER_PORT in config.py).
+        timeout (float): Longest wait for the app to load its data [s].
+
+    Returns:
+        subprocess.Popen: The server process.
+    """
+    process = subprocess.Popen([sys.executable, f"{app_name}.py"], cwd=Path(__file__).resolve().parent)
+    waited  = time.perf_counter() + timeout
+    while time.perf_counter() < waited:
+        if process.poll() is not None:
+            raise RuntimeError(f"{app_name}.py stopped with code {process.returncode}.")
+        try:
+            requests.get(f"{url}/_dash-layout", timeout=5).raise_for_status()
+            return process
+        except requests.RequestException:
+            time.sleep(1)
+    stop_server(process)
+    raise TimeoutError(f"{app_name}.py did not answer at {url} within {timeout} s.")
+
+def stop_server(process):
+    """Stop a server started by start_server, with the processes it started (reloader, workers)."""
+    import psutil
+    try:
+        children = psutil.Process(process.pid).children(recursive=True)
+    except psutil.NoSuchProcess:
+        children = []
+    for child in children:
+        child.terminate()
+    process.terminate()
+    process.wait(timeout=30)
+    psutil.wait_procs(children, timeout=30)
+
+def main(argv=None):
+    """
+    Run the load tests described on the command line and print the results.
+
+    Args:
+        argv (list): Command-line arguments (sys.argv[1:] if None).
+
+    Returns:
+        tuple: (report, rss) - one row per number of users and callback, and the memory samples.
+    """
+    parser = argparse.ArgumentParser(description="Load test of an app with simulated users.")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--start", choices=list(WALK_CONTROLS), help="Start this app for the test.")
+    target.add_argument("--in-process", choices=list(WALK_CONTROLS), help="Import this app and use its test client.")
+    parser.add_argument("--app", choices=list(WALK_CONTROLS), default="Shocks", help="App running at --url.")
+    parser.add_argument("--url", default=None, help="Address of the app (default from config.py).")
+    parser.add_argument("--pid", type=int, default=None, help="Process of a running app, to report its memory.")
+    parser.add_argument("--outputs", nargs="+", default=TESTED_OUTPUTS, help="Outputs of the tested callbacks.")
+    parser.add_argument("--set", nargs="*", default=[], metavar="ID.PROPERTY=JSON",
+                        help="Initial values of controls, e.g. 'df-dropdown-zeta.value=[10, 100]'.")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 8], help="Numbers of concurrent users.")
+    parser.add_argument("--duration", type=float, default=20, help="Duration of each test [s].")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random walks.")
+    parser.add_argument("--poll-interval", type=float, default=0.1, help="Polling of background callbacks [s].")
+    parser.add_argument("--timeout", type=float, default=120., help="Longest wait for a background callback [s].")
+    parser.add_argument("--rss-interval", type=float, default=1., help="Time between two memory samples [s].")
+    parser.add_argument("--csv", default=None, metavar="PREFIX",
+                        help="Write PREFIX_latency.csv (every request) and PREFIX_rss.csv (memory over time).")
+    args = parser.parse_args(argv)
+
+    from config import SERVER_HOST, SERVER_PORT
+    url      = args.url or f"http://{SERVER_HOST}:{SERVER_PORT}"
+    app_name = args.start or args.in_process or args.app
+    server, pid, app = None, args.pid, None
+    if args.in_process:
+        # The callbacks run in the test process, which is then the "server"
+        import config
+        config.BACKGROUND_CALLBACKS = False
+        app = importlib.import_module(args.in_process).app
+        pid = os.getpid()
+    elif args.start:
+        server = start_server(args.start, url)
+        pid    = server.pid
+
+    def make_client():
+        return DashClient(url=url, app=app)
+
+    stop = threading.Event()
+    try:
+        client = make_client()
+        values = component_values(json.loads(client.get("/_dash-layout")))
+        for assignment in args.set:
+            name, _, value = assignment.partition("=")
+            component, prop = name.rsplit(".", 1)
+            values[(component, prop)] = json.loads(value)
+        dependencies = json.loads(client.get("/_dash-dependencies"))
+        callbacks    = {output: find_callback(dependencies, output) for output in args.outputs}
+        token        = end_id(client.get("/"))
+        client.close()
+
+        # A short walk first, so the server is warm
+        run_load(make_client, callbacks, values, app_name, 1, 0.1, token, args.seed, args.poll_interval, args.timeout)
+
+        _, samples = monitor_rss(pid, stop, args.rss_interval)
+        reports, all_records = [], []
+        for concurrency in args.concurrency:
+            first   = len(samples)
+            records = run_load(make_client, callbacks, values, app_name, concurrency, args.duration,
+                               token, args.seed, args.poll_interval, args.timeout)
+            reports.append(latency_report(records, concurrency, pd.DataFrame(samples[first:], columns=['rss [MB]'])))
+            all_records.append(records.assign(users=concurrency))
+    finally:
+        stop.set()
+        if server is not None:
+            stop_server(server)
+
+    report = pd.concat(reports, ignore_index=True)
+    rss    = pd.DataFrame(samples, columns=['time [s]', 'rss [MB]'])
+    print(report.to_string(index=False, float_format="{:.1f}".format))
+    records = pd.concat(all_records, ignore_index=True)
+    if records['error'].notna().any():
+        print("\nFailed requests:")
+        print(records['error'].value_counts().to_string())
+    if len(rss):
+        print("\nServer memory over time:")
+        step = int(np.ceil(len(rss) / 20))
+        print(rss.iloc[::step].to_string(index=False, float_format="{:.1f}".format))
+    if args.csv:
+        records.to_csv(f"{args.csv}_latency.csv", index=False)
+        rss.to_csv(f"{args.csv}_rss.csv", index=False)
+    return report, rss
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# File: CMZ_data_explorer/mapped_store.py
+# -*- coding: utf-8 -*-
+"""
+This module contains the memory-mapped store of the low-memory mode of the visualization apps
+(LOW_MEMORY_MODE in config.py), for computers that cannot load the pickle files.
+
+The store is a folder next to the pickle file (e.g. cshock_store/) with one sub-folder per table: the
+full model table ('all') and each stage table. Every column is one .npy file; text columns (run_id,
+stage, ...) are stored as integer codes, with their distinct values in the metadata file of the table.
+The apps open the numeric columns as read-only memory maps wrapped in DataFrames, without reading them:
+the operating system reads the parts of the files a query needs, and drops them again when memory is
+short, as for any file cache. Only the text columns, the indices built when the data is loaded (run
+index, levels of detail, row counts, run summary) and the cached results stay in the memory of the
+app; the cached results are limited to MEMORY_BUDGET_MB (see selection_cache.py).
+
+The store includes the species of the species column files (see species_catalog.py). It is built from
+the pickle files on a computer that can load them, and copied with them:
+
+    python mapped_store.py
+"""
+# Import necessary libraries
+import json
+import os
+import pickle
+import shutil
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from species_catalog import load_catalog, catalog_species, SpeciesColumns
+from config import (
+                cshock_pkl,
+                hotcore_pkl,
+                cshock_store_dir,
+                hotcore_store_dir,
+                cshock_catalog_json,
+                hotcore_catalog_json,
+                cshock_species_dir,
+                hotcore_species_dir
+               )
+
+# Metadata file of a table of the store
+METADATA_FILE = "metadata.json"
+# Stage tables of each model: {name of the table in the apps: value of the 'stage' column}
+STAGE_TABLES = {
+    "cshock":  {"shock": "shock", "postshock": "post-shock"},
+    "hotcore": {"warmup": "warmup", "hotcore": "hotcore"},
+}
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+def write_mapped_table(df, directory):
+    """
+    Write a table as one .npy file per column.
+
+    Args:
+        df (pd.DataFrame): The table.
+        directory (str or Path): Folder of the table (created).
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    columns = []
+    for position, name in enumerate(df.columns):
+        values = df[name]
+        if not pd.api.types.is_numeric_dtype(values.dtype):
+            # Text columns are stored as codes of their distinct values, as in a categorical column
+            categorical = pd.Categorical(values)
+            array = categorical.codes
+            columns.append({'name': name, 'dtype': str(values.dtype), 'categories': categorical.categories.tolist()})
+        else:
+            array = values.to_numpy()
+            columns.append({'name': name})
+        np.save(directory / f"{position}.npy", np.ascontiguousarray(array))
+    with open(directory / METADATA_FILE, 'w') as file:
+        json.dump({'n_rows': len(df), 'columns': columns}, file)
+
+def read_mapped_table(directory):
+    """
+    Open a table written by write_mapped_table, without reading its columns.
+
+    Args:
+        directory (str or Path): Folder of the table.
+
+    Returns:
+        pd.DataFrame: The table; its numeric columns are read-only memory maps. Text columns are read into
+                      memory with their type in the pickle file, as references to one copy of each distinct
+                      value (8 bytes per row).
+    """
+    directory = Path(directory)
+    with open(directory / METADATA_FILE) as file:
+        metadata = json.load(file)
+    data = {}
+    for position, column in enumerate(metadata['columns']):
+        array = np.load(directory / f"{position}.npy", mmap_mode='r')
+        if 'categories' in column:
+            # Missing values have the code -1, i.e. the last value
+            values = np.array(column['categories'] + [None], dtype=object)
+            array = pd.array(values[array], dtype=column['dtype'])
+        data[column['name']] = array
+    # copy=False keeps every numeric column as its own memory map
+    return pd.DataFrame(data, copy=False)
+
+def build_mapped_store(model_df, stages, directory, species_columns=None, species=()):
+    """
+    Write the store of a model, replacing the old one once the new one is complete.
+
+    Args:
+        model_df (pd.DataFrame): Long model table read from the pickle file.
+        stages (dict): Stage tables, e.g. STAGE_TABLES['cshock'].
+        directory (str or Path): Folder of the store.
+        species_columns (SpeciesColumns): Column files of the species that are not in the pickle file.
+        species (list): Species to add from the column files (those without a file are skipped).
+    """
+    directory = Path(directory)
+    temporary = directory.with_name(f"{directory.name}.{os.getpid()}.tmp")
+    shutil.rmtree(temporary, ignore_errors=True)
+
+    model_df = model_df.copy()
+    # The column added by the apps when they load the pickle file (computed as they do, so the values are identical)
+    if 'zeta_scaled' not in model_df.columns:
+        model_df.insert(model_df.columns.get_loc('zeta') + 1, 'zeta_scaled', 1.310 * 1e-17 * model_df['zeta'])
+    if species_columns is not None:
+        model_df = species_columns.append_to(model_df, species)
+
+    write_mapped_table(model_df, temporary / "all")
+    for table, stage in stages.items():
+        write_mapped_table(model_df[model_df['stage'] == stage].reset_index(drop=True), temporary / table)
+
+    # Readers of the old store keep their open files
+    previous = directory.with_name(f"{directory.name}.{os.getpid()}.old")
+    if directory.exists():
+        os.replace(directory, previous)
+    os.replace(temporary, directory)
+    shutil.rmtree(previous, ignore_errors=True)
+
+def load_mapped_store(directory, stages):
+    """
+    Open the tables of the store of a model.
+
+    Args:
+        directory (str or Path): Folder of the store.
+        stages (dict): Stage tables, e.g. STAGE_TABLES['cshock'].
+
+    Returns:
+        dict: {'all': full table, stage table name: stage table}, as returned by read_mapped_table.
+    """
+    directory = Path(directory)
+    if not (directory / "all" / METADATA_FILE).exists():
+        raise FileNotFoundError(f"No memory-mapped store at {directory}; build it with 'python mapped_store.py' "
+                                f"or set LOW_MEMORY_MODE = False in config.py.")
+    return {table: read_mapped_table(directory / table) for table in ["all"] + list(stages)}
+
+def store_version_file(directory):
+    """File that changes whenever the store of a model is rebuilt - watched by the apps (see data_reload.py)."""
+    return str(Path(directory) / "all" / METADATA_FILE)
+
+
+# Build the stores from the existing pickle files
+if __name__ == "__main__":
+    for model, pkl, store_dir, catalog_json, species_dir in [
+        ("cshock", cshock_pkl, cshock_store_dir, cshock_catalog_json, cshock_species_dir),
+        ("hotcore", hotcore_pkl, hotcore_store_dir, hotcore_catalog_json, hotcore_species_dir),
+    ]:
+        with open(pkl, 'rb') as file:
+            model_df = pickle.load(file)
+        build_mapped_store(model_df, STAGE_TABLES[model], store_dir, SpeciesColumns(species_dir),
+                           catalog_species(load_catalog(catalog_json)))
+        print(f"Wrote {store_dir}")
@@ -0,0 +1,1681 @@
+# File: CMZ_data_explorer/model_page.py
+# -*- coding: utf-8 -*-
+"""
+This module contains the explorer page of a model grid: its layout and its callbacks, drawn from the data
+engine of the model (see data_engine.py). What differs between the hot-core and the C-shock pages (texts,
+filters, hover settings, ratio columns) is set in PAGES; everything else is shared.
+
+A page is added to a Dash app with
+
+    page = ModelPage(app, engine, background_manager, prefix="cshock-")
+    app.layout = page.layout
+
+The ids of its components start with the prefix, so that several pages can be served by one app (see
+CMZ_explorer.py); the standalone apps (Shocks.py, Protostellar_objects.py) use no prefix, and keep the ids
+they always had.
+"""
+# Import necessary libraries
+import dash
+from dash import dcc
+from dash import html
+from dash import dash_table
+import plotly.express as px
+import numpy as np
+from functionality import format_molecule_HTML, ranges_cshock, ranges_hotcore
+from ratios import cached_ratios_long_table, ratios_long_table, ratio_figure
+from fitting import parse_observations, fit_models
+from background_jobs import heavy_callback, JobResults
+from aggregation import estimate_rows, binned_percentiles, envelope_band, aggregated_figure
+from level_of_detail import choose_level, zoomed_ranges, lod_message
+from preview import preview_figure, preview_message
+from figures import abundance_figure, style_figure, point_details, point_row, run_figure
+from sweep import REFERENCES as SWEEP_REFERENCES, cached_run_values, sweep_figure
+from timescales import TIMESCALES, TRANSITIONS, is_ice, cached_run_timescales, timescale_figure
+from run_summary import OVERVIEW_COLUMNS, select_summary, summary_y_range
+from selection_cache import log_selection, top_selections, prewarm, layout_values
+from session_store import new_session_id, table_page
+from config import *
+
+# Presentation of each model grid
+PAGES = {
+    "cshock": dict(
+        title="Shock Data Explorer 🔎",
+        welcome="Welcome to the interactive shock data explorer! This tool provides access to the shock grid tailored to environments similar to the Galactic Center. " \
+                "The models utilized the UCLCHEM gas-grain chemical code and are thoroughly described in Dutkowska et al. 2025.",
+        features=[
+            "🔍 Explore shock and post-shock data interactively through visualizations and tables",
+            "📊 Create custom plots to analyze chemical evolution over time",
+            "🔽 Download filtered datasets as CSV files for your own analysis",
+            "⚙️ Filter by shock velocity, density, medium's temperature, cosmic ray rates, and FUV fields",
+            "💾 Save plots and visualizations for presentations or publications",
+        ],
+        # Width of each column of the selection (chemistry and filters)
+        column_width="48%",
+        # Filter dropdowns with their parameter, in the order of the callback arguments
+        filters=[
+            ("df-dropdown-zeta", "zeta"),
+            ("df-dropdown-shockvel", "shock_vel"),
+            ("df-dropdown-dens", "initialDens"),
+            ("df-dropdown-rad", "radfield"),
+            ("df-dropdown-initialtemp", "initialTemp"),
+        ],
+        # Stages of the fitted timesteps, by value of the 'stage' column
+        fit_stages=[
+            {"label": "Shock", "value": "shock"},
+            {"label": "Post-shock", "value": "post-shock"},
+        ],
+        # Parameters of the models with their labels - for the envelope groups and the parameter sweep
+        parameter_options=[
+            {"label": "Shock velocity", "value": "shock_vel"},
+            {"label": "Density", "value": "initialDens"},
+            {"label": "Initial temperature", "value": "initialTemp"},
+            {"label": "CRIR", "value": "zeta"},
+            {"label": "FUV field", "value": "radfield"},
+        ],
+        sweep_parameter="shock_vel",
+        # Hover information of the abundance plot
+        abundance_hover_data={
+            'age': True,
+            'locDens': True,
+            'initialDens': True,
+            'locTemp': True,
+            'initialTemp': True,
+            'shock_vel': True,
+            'zeta_scaled': True,
+            'radfield': True
+        },
+        abundance_labels={
+            'variable': 'Species',
+            'value': 'X(species)',
+            'age': 'Time',
+            'locDens': 'n<sub>H</sub>',
+            'initialDens': 'n<sub>H, initial</sub>',
+            'locTemp': 'T',
+            'initialTemp': 'T<sub>init</sub>',
+            'shock_vel': 'v<sub>s</sub>',
+            'zeta': 'CRIR',
+            'zeta_scaled': 'CRIR',
+            'radfield': 'FUV'
+        },
+        abundance_hovertemplate=(
+            'Abundance: %{y:.2e}<br>' +
+            'Time: %{x:.2e} yr<br>' +
+            'n<sub>H</sub>: %{customdata[0]:.2e}<br>' +
+            'n<sub>H, initial</sub>: %{customdata[1]:.0e}<br>' +
+            'T: %{customdata[2]:.2f}<br>' +
+            'T<sub>init</sub>: %{customdata[3]}<br>' +
+            'v<sub>s</sub>: %{customdata[4]}<br>' +
+            'CRIR: %{customdata[5]:.2e}<br>' +
+            'FUV: %{customdata[6]:.0e}<br>'
+        ),
+        # Columns and hover information of the ratio plot
+        ratio_columns=["age", "run_id", "locDens", "initialDens", "locTemp", "initialTemp", "shock_vel", "zeta_scaled", "radfield"],
+        ratio_hover_data={
+            'age': True,
+            'locDens': True,
+            'initialDens': True,
+            'locTemp': True,
+            'initialTemp': True,
+            'shock_vel': True,
+            'zeta_scaled': True,
+            'radfield': True,
+            'X_numerator': True,
+            'X_denominator': True,
+            'numerator': True,
+            'denominator': True,
+            'ratio_name': False,
+        },
+        ratio_labels={
+            'age': 'Time (yr)',
+            'ratio': 'Ratio',
+            'locDens': 'n<sub>local</sub>',
+            'initialDens': 'n<sub>initial</sub>',
+            'locTemp': 'T<sub>local</sub>',
+            'initialTemp': 'T<sub>init</sub>',
+            'shock_vel': 'v<sub>s</sub>',
+            'zeta': 'CRIR',
+            'radfield': 'FUV',
+        },
+        ratio_hovertemplate=(
+            'Ratio: %{y:.2e}<br>' +
+            'Time: %{x:.2e} yr<br>' +
+            '%{customdata[9]}: %{customdata[7]:.2e}<br>' +
+            '%{customdata[10]}: %{customdata[8]:.2e}<br>' +
+            'n<sub>local</sub>: %{customdata[0]:.2e}<br>' +
+            'n<sub>initial</sub>: %{customdata[1]:.0e}<br>' +
+            'T<sub>local</sub>: %{customdata[2]:.2f}<br>' +
+            'T<sub>init</sub>: %{customdata[3]}<br>' +
+            'v<sub>s</sub>: %{customdata[4]}<br>' +
+            'CRIR: %{customdata[5]:.2e}<br>' +
+            'FUV: %{customdata[6]:.0e}<br>'
+        ),
+    ),
+    "hotcore": dict(
+        title="Protostellar Object Data Explorer 🔎",
+        welcome="Welcome to the interactive protostellar object data explorer! This tool provides access to the protostellar object grid tailored to environments similar to the Galactic Center. " \
+                "The models utilized the UCLCHEM gas-grain chemical code and are thoroughly described in Dutkowska et al. 2025.",
+        features=[
+            "🔍 Explore warm-up and fully-warmed-up data interactively through visualizations and tables",
+            "📊 Create custom plots to analyze chemical evolution over time",
+            "🔽 Download filtered datasets as CSV files for your own analysis",
+            "⚙️ Filter by object's temperature and density, medium's temperature, cosmic ray rates, and FUV fields",
+            "💾 Save plots and visualizations for presentations or publications",
+        ],
+        column_width="29%",
+        filters=[
+            ("df-dropdown-zeta", "zeta"),
+            ("df-dropdown-finaltemp", "final_temp"),
+            ("df-dropdown-dens", "initialDens"),
+            ("df-dropdown-rad", "radfield"),
+            ("df-dropdown-initialtemp", "initialTemp"),
+            ("df-dropdown-mass", "index"),
+            ("df-dropdown-rad-parent", "cloud_radfield"),
+        ],
+        fit_stages=[
+            {"label": "Warm-up", "value": "warmup"},
+            {"label": "Fully-warmed-up protostellar object", "value": "hotcore"},
+        ],
+        parameter_options=[
+            {"label": "Mass", "value": "index"},
+            {"label": "Temperature", "value": "final_temp"},
+            {"label": "Density", "value": "initialDens"},
+            {"label": "Initial temperature", "value": "initialTemp"},
+            {"label": "CRIR", "value": "zeta"},
+            {"label": "FUV field", "value": "radfield"},
+            {"label": "FUV field of the natal cloud", "value": "cloud_radfield"},
+        ],
+        sweep_parameter="final_temp",
+        abundance_hover_data={
+            'age': True,
+            'locDens': True,
+            'locTemp': True,
+            'initialTemp': True,
+            'index': True,
+            'zeta_scaled': True,
+            'radfield': True,
+            'cloud_radfield': True,
+        },
+        abundance_labels={
+            'variable': 'Species',
+            'value': 'X(species)',
+            'age': 'Time',
+            'locDens': 'n<sub>H</sub>',
+            'locTemp': 'T',
+            'initialTemp': 'T<sub>init</sub>',
+            'index' : 'Mass index',
+            'zeta': 'CRIR',
+            'zeta_scaled': 'CRIR',
+            'radfield': 'FUV',
+            'cloud_radfield': 'FUV<sub>parent cloud</sub>',
+        },
+        abundance_hovertemplate=(
+            'Abundance: %{y:.2e}<br>' +
+            'Time: %{x:.2e} yr<br>' +
+            'n<sub>H</sub>: %{customdata[0]:.2e}<br>' +
+            'T %{customdata[1]:.2f}<br>' +
+            'T<sub>init</sub>: %{customdata[2]}<br>' +
+            'Mass index: %{customdata[3]:.0f}<br>' +
+            'CRIR: %{customdata[4]:.2e}<br>' +
+            'FUV: %{customdata[5]:.0e}<br>' +
+            'FUV<sub>parent cloud</sub>: %{customdata[6]:.0e}<br>'
+        ),
+        ratio_columns=["age", "run_id", "locDens", "locTemp", "initialTemp", "index", "zeta_scaled", "radfield", "cloud_radfield"],
+        ratio_hover_data={
+            'age': True,
+            'locDens': True,
+            'locTemp': True,
+            'initialTemp': True,
+            'index': True,
+            'zeta_scaled': True,
+            'radfield': True,
+            'cloud_radfield': True,
+            'X_numerator': True,
+            'X_denominator': True,
+            'numerator': True,
+            'denominator': True,
+            'ratio_name': False,
+        },
+        ratio_labels={
+            'age': 'Time (yr)',
+            'ratio': 'Ratio',
+            'locDens': 'n<sub>H</sub>',
+            'locTemp': 'T',
+            'initialTemp': 'T<sub>init</sub>',
+            'index' : 'Mass index',
+            'zeta': 'CRIR',
+            'radfield': 'FUV',
+            'cloud_radfield': 'FUV<sub>parent cloud</sub>',
+        },
+        ratio_hovertemplate=(
+            'Ratio: %{y:.2e}<br>' +
+            'Time: %{x:.2e} yr<br>' +
+            '%{customdata[9]}: %{customdata[7]:.2e}<br>' +
+            '%{customdata[10]}: %{customdata[8]:.2e}<br>' +
+            'n<sub>H</sub>: %{customdata[0]:.2e}<br>' +
+            'T %{customdata[1]:.2f}<br>' +
+            'T<sub>init</sub>: %{customdata[2]}<br>' +
+            'Mass index: %{customdata[3]:.0f}<br>' +
+            'CRIR: %{customdata[4]:.2e}<br>' +
+            'FUV: %{customdata[5]:.0e}<br>' +
+            'FUV<sub>parent cloud</sub>: %{customdata[6]:.0e}<br>'
+        ),
+    ),
+}
+
+# Display settings of the abundance plot, in the order of the arguments of render_output
+DISPLAY_CONTROLS = ["y-axis-scale", "marker-size-slider", "show-grid", "raw-points-override", "plot-mode",
+                    "envelope-percentiles", "envelope-groups"]
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+class ModelPage:
+    """
+    Explorer page of one model grid: its layout (the `layout` attribute) and its callbacks, registered on
+    the app when the page is created.
+    """
+
+    def __init__(self, app, engine, background_manager, prefix=""):
+        """
+        Args:
+            app (dash.Dash): The app serving the page.
+            engine (DataEngine): Data of the model (see data_engine.py).
+            background_manager (SerializedDiskcacheManager or None): Manager of the background jobs of the app
+                                                                     (see background_jobs.py).
+            prefix (str): Start of the ids of the components of the page, e.g. 'cshock-'.
+        """
+        self.app                = app
+        self.engine             = engine
+        self.background_manager = background_manager
+        self.prefix             = prefix
+        self.model              = engine.model
+        vars(self).update(PAGES[self.model])
+        self.parameter_labels   = {option["value"]: option["label"] for option in self.parameter_options}
+        if background_manager is not None:
+            # The selections and plots computed in background jobs are kept in the job store (see background_jobs.py)
+            engine.selection_cache.shared = JobResults(background_manager, f"{self.model} selections")
+            engine.figure_cache.shared    = JobResults(background_manager, f"{self.model} figures")
+
+        self.layout = self.make_layout()
+        self.register_callbacks()
+        # The caches are prewarmed again after every reload of the data
+        engine.reload_hooks.append(self.prewarm_caches)
+
+    def id(self, name):
+        """Id of a component of the page, e.g. 'cshock-df-graph' for 'df-graph'."""
+        return self.prefix + name
+
+    def filter_inputs(self):
+        """Inputs of the filter dropdowns, in the order of the callback arguments."""
+        return [dash.Input(self.id(control), "value") for control, _ in self.filters]
+
+    def selection(self, values):
+        """Selected values of each parameter, from the values of the filter dropdowns."""
+        return {parameter: value for (_, parameter), value in zip(self.filters, values)}
+
+    # ------
+    # Layout
+    # ------
+
+    def _column_style(self):
+        return {
+            "width": self.column_width,
+            "display": "inline-block",
+            "vertical-align": "top",
+        }
+
+    def _cshock_filter_columns(self):
+        """Filter columns of the C-shock page."""
+        zeta_available        = ranges_cshock["zeta"]
+        vel_available         = ranges_cshock["shock_vel"]
+        dens_available        = ranges_cshock["initialDens"]
+        rad_available         = ranges_cshock["radfield"]
+        initialTemp_available = ranges_cshock["initialTemp"]
+        return [
+            html.Div(
+                [
+                    html.H2("Shock-data of interest"),
+                    html.H3("Shock stage"),
+                    dcc.Dropdown(
+                        id=self.id("df-dropdown-type"),
+                        options=[
+                            {"label": "Shock", "value": "shock"},
+                            {"label": "Post-shock", "value": "postshock"},
+                        ],
+                        value="shock",
+                    ),
+                    html.H3("Shock velocity [km s⁻¹] "),
+                    dcc.Dropdown(
+                        id=self.id("df-dropdown-shockvel"),
+                        options=[
+                            {"label": f"{shock_vel}", "value": shock_vel}
+                            for shock_vel in vel_available
+                        ],
+                        value=[vel_available[0]],
+                        multi=True,
+                    ),
+                    html.H2("Medium properties"),
+                    html.H3("Density [cm⁻³]"),
+                    dcc.Dropdown(
+                        id=self.id("df-dropdown-dens"),
+                        options=[
+                            {"label": f"{dens:.0e}", "value": dens}
+                            for dens in dens_available
+                        ],
+                        value=[dens_available[0]],
+                        multi=True,
+                    ),
+                    html.H3("Initial temperature [K]"),
+                    dcc.Dropdown(
+                        id=self.id("df-dropdown-initialtemp"),
+                        options=[
+                            {"label": f"{temp:.0f}", "value": temp}
+                            for temp in initialTemp_available
+                        ],
+                        value=[initialTemp_available[0]],
+                        multi=True
+                    ),
+                    html.H3("Cosmic Ray Ionization Rate [s⁻¹]"),
+                    dcc.Dropdown(
+                        id=self.id("df-dropdown-zeta"),
+                        options=[
+                            {"label": f"{1.310 * 1e-17 * zeta:.2e}", "value": zeta}
+                            for zeta in zeta_available
+                        ],
+                        value=[zeta_available[0]],
+                        multi=True,
+                    ),
+                    html.H3("FUV field [Habing]"),
+                    dcc.Dropdown(
+                        id=self.id("df-dropdown-rad"),
+                        options=[
+                            {"label": f"{rad:.0e}", "value": rad}
+                            for rad in rad_available
+                        ],
+                        value=[rad_available[0]],
+                        multi=True,
+                    ),
+                ],
+                style=self._column_style(),
+            ),
+        ]
+
+    def _hotcore_filter_columns(self):
+        """Filter columns of the hot-core page."""
+        zeta_available        = ranges_hotcore["zeta"]
+        final_temp_available  = ranges_hotcore["final_temp"]
+        dens_available        = ranges_hotcore["initialDens"]
+        rad_available         = ranges_hotcore["radfield"]
+        initialTemp_available = ranges_hotcore["initialTemp"]
+        rad_parent_available  = self.engine.model_df["cloud_radfield"].unique()
+        return [
+            html.Div(
+                [
+                    html.H2("Object properties"),
+                    html.H3("Stage"),
+                    dcc.Dropdown(
+                        id=self.id("df-dropdown-type"),
+                        options=[
+                            {"label": "Warm-up (T < T_final)", "value": "warmup"},
+                            {"label": "Fully-warmed-up protostellar object (T = T_final)", "value": "hotcore"},
+                        ],
+                        value="hotcore",
+                    ),
+                    html.H3(["Mass [M", html.Sub("⊙"), "]"]),
+                    dcc.Dropdown(
+                        id=self.id("df-dropdown-mass"),
+                        options=[
+                            {"label": "10", "value": 3},
+                            {"label": "25", "value": 5}
+                        ],
+                        value=[3],
+                        multi=True,
+                    ),
+                    html.H3("Temperature [K] "),
+                    dcc.Dropdown(
+                        id=self.id("df-dropdown-finaltemp"),
+                        options=[
+                            {"label": f"{final_temp}", "value": final_temp}
+                            for final_temp in final_temp_available
+                        ],
+                        value=[final_temp_available[0]],
+                        multi=True,
+                    ),
+                    html.H3(["Density [cm", html.Sup("-3"), "]"]),
+                    dcc.Dropdown(
+                        id=self.id("df-dropdown-dens"),
+                        options=[
+                            {"label": f"{dens:.0e}", "value": dens}
+                            for dens in dens_available
+                        ],
+                        value=[dens_available[1]],
+                        multi=True,
+                    ),
+                ],
+                style=self._column_style(),
+            ),
+            html.Div(
+                [
+                    html.H2("Medium properties"),
+                    html.H3("Initial temperature [K]"),
+                    dcc.Dropdown(
+                        id=self.id("df-dropdown-initialtemp"),
+                        options=[
+                            {"label": f"{temp:.0f}", "value": temp}
+                            for temp in initialTemp_available
+                        ],
+                        value=[initialTemp_available[0]],
+                        multi=True
+                    ),
+                    html.H3(["Cosmic Ray Ionization Rate [s", html.Sup("-1"), "]"]),
+                    dcc.Dropdown(
+                        id=self.id("df-dropdown-zeta"),
+                        options=[
+                            {"label": f"{1.310 * 1e-17 * zeta:.2e}", "value": zeta}
+                            for zeta in zeta_available
+                        ],
+                        value=[zeta_available[0]],
+                        multi=True,
+                    ),
+                    html.H3("FUV field [Habing]"),
+                    dcc.Dropdown(
+                        id=self.id("df-dropdown-rad"),
+                        options=[
+                            {"label": f"{rad:.0e}", "value": rad}
+                            for rad in rad_available
+                        ],
+                        value=[rad_available[0]],
+                        multi=True,
+                    ),
+                    html.H3("FUV field of the natal cloud [Habing]"),
+                    dcc.Dropdown(
+                        id=self.id("df-dropdown-rad-parent"),
+                        options=[
+                            {"label": f"{rad_parent:.0e}", "value": rad_parent}
+                            for rad_parent in rad_parent_available
+                        ],
+                        value=[rad_parent_available[0]],
+                        multi=True,
+                    ),
+                ],
+                style=self._column_style(),
+            ),
+        ]
+
+    def make_layout(self):
+        """
+        Layout of the page.
+
+        Returns:
+            dash.html.Div: The layout.
+        """
+        species_catalog = self.engine.species_catalog
+        filter_columns  = self._cshock_filter_columns() if self.model == "cshock" else self._hotcore_filter_columns()
+        return html.Div(
+            [
+                html.H1(self.title),
+                html.P(self.welcome),
+                html.Div([
+                    html.H3("What you can do with this tool:", style={"margin-top": "20px", "margin-bottom": "10px"}),
+                    html.Ul([html.Li(feature) for feature in self.features], style={"margin-bottom": "15px"})
+                ]),
+                html.P("This tool makes complex chemical models accessible and explorable. No prior experience with the UCLCHEM models is required!"),
+                html.Hr(style={"margin": "20px 0"}),
+
+                html.Div(
+                    [  # Start of the column layout
+                        # Left Column
+                        html.Div(
+                            [
+                                html.H2("Chemistry"),
+                                html.H3("Species Selection"),
+                                html.Div([
+                                    html.H4("Gas Phase Species"),
+                                    dcc.Dropdown(
+                                        id=self.id("df-dropdown-gas-species"),
+                                        options=[
+                                            {"label": species, "value": species}
+                                            for species in species_catalog["gas"]
+                                        ],
+                                        value=[],  # Start with empty selection
+                                        multi=True,
+                                        placeholder="Select gas phase species..."
+                                    ),
+                                ], style={"margin-bottom": "10px"}),
+
+                                html.Div([
+                                    html.H4("Surface Species"),
+                                    dcc.Dropdown(
+                                        id=self.id("df-dropdown-surface-species"),
+                                        options=[
+                                            {"label": species, "value": species}
+                                            for species in species_catalog["surface"]
+                                        ],
+                                        value=[],  # Start with empty selection
+                                        multi=True,
+                                        placeholder="Select surface species..."
+                                    ),
+                                ], style={"margin-bottom": "10px"}),
+
+                                html.Div([
+                                    html.H4("Bulk Species"),
+                                    dcc.Dropdown(
+                                        id=self.id("df-dropdown-bulk-species"),
+                                        options=[
+                                            {"label": species, "value": species}
+                                            for species in species_catalog["bulk"]
+                                        ],
+                                        value=[],  # Start with empty selection
+                                        multi=True,
+                                        placeholder="Select bulk species..."
+                                    ),
+                                ], style={"margin-bottom": "15px"}),
+
+                                html.Hr(style={"margin": "20px 0"}),  # Separator line
+
+                                html.Div([
+                                    html.H3("Ratio Plot (Optional)"),
+                                    dcc.Checklist(
+                                        id=self.id("enable-ratio-plot"),
+                                        options=[{"label": " Enable ratio plotting", "value": "enabled"}],
+                                        value=[],  # Start unchecked
+                                        style={"margin-bottom": "10px"}
+                                    ),
+
+                                    # This div will show/hide based on the checkbox
+                                    html.Div(
+                                        id=self.id("ratio-controls"),
+                                        children=[
+                                            html.Div([
+                                                html.Label("Numerator Species:", style={"font-weight": "bold"}),
+                                                dcc.Dropdown(
+                                                    id=self.id("ratio-numerator-dropdown"),
+                                                    options=[],  # Will be populated dynamically
+                                                    value=[],
+                                                    multi=True,  # Every numerator is paired with every denominator
+                                                    placeholder="Select numerator species...",
+                                                    style={"margin-bottom": "10px"}
+                                                ),
+                                            ]),
+                                            html.Div([
+                                                html.Label("Denominator Species:", style={"font-weight": "bold"}),
+                                                dcc.Dropdown(
+                                                    id=self.id("ratio-denominator-dropdown"),
+                                                    options=[],  # Will be populated dynamically
+                                                    value=[],
+                                                    multi=True,  # Every denominator is paired with every numerator
+                                                    placeholder="Select denominator species...",
+                                                    style={"margin-bottom": "10px"}
+                                                ),
+                                            ]),
+                                            html.Div(id=self.id("ratio-validation-message"), style={"color": "red", "margin-bottom": "10px"}),
+                                        ],
+                                        style={"display": "none"}  # Hidden by default
+                                    )
+                                ]),
+
+                                # Add validation message div
+                                html.Div(id=self.id("species-validation-message"), style={"color": "red", "margin-bottom": "10px"}),
+                            ],
+                            style=self._column_style(),
+                        ),
+                        # Right Column(s)
+                        *filter_columns,
+                    ],
+                    style={"display": "flex", "justify-content": "space-between"},
+                ),  # End of the column layout
+
+                # Add plot controls section
+                html.Div([
+                    html.H3("Plot Display Options", style={"margin-bottom": "10px"}),
+                    html.Div([
+                        html.Div([
+                            html.Label("Y-axis scale:", style={"font-weight": "bold", "margin-right": "10px"}),
+                            dcc.RadioItems(
+                                id=self.id("y-axis-scale"),
+                                options=[
+                                    {"label": "Logarithmic", "value": "log"},
+                                    {"label": "Linear", "value": "linear"}
+                                ],
+                                value="log",
+                                inline=True,
+                                style={"margin-right": "20px"}
+                            )
+                        ], style={"display": "inline-block", "margin-right": "30px"}),
+
+                        html.Div([
+                            html.Label("Marker size:", style={"font-weight": "bold", "margin-right": "10px"}),
+                            dcc.Slider(
+                                id=self.id("marker-size-slider"),
+                                min=4,
+                                max=20,
+                                step=2,
+                                value=DEFAULT_MARKER_SIZE,
+                                marks={i: str(i) for i in range(4, 21, 4)},
+                                tooltip={"placement": "bottom", "always_visible": True}
+                            )
+                        ], style={"display": "inline-block", "width": "200px", "margin-right": "30px"}),
+
+                        html.Div([
+                            html.Label("Show grid:", style={"font-weight": "bold", "margin-right": "10px"}),
+                            dcc.Checklist(
+                                id=self.id("show-grid"),
+                                options=[{"label": "Grid lines", "value": "grid"}],
+                                value=["grid"],
+                                inline=True
+                            )
+                        ], style={"display": "inline-block", "margin-right": "30px"}),
+
+                        html.Div([
+                            html.Label("Large selections:", style={"font-weight": "bold", "margin-right": "10px"}),
+                            dcc.Checklist(
+                                id=self.id("raw-points-override"),
+                                options=[{"label": "Always plot every point", "value": "raw"}],
+                                value=[],
+                                inline=True
+                            )
+                        ], style={"display": "inline-block"}),
+                    ]
+                    ),
+                    html.Div([
+                        html.Div([
+                            html.Label("Plot mode:", style={"font-weight": "bold", "margin-right": "10px"}),
+                            dcc.RadioItems(
+                                id=self.id("plot-mode"),
+                                options=[
+                                    {"label": "Points", "value": "points"},
+                                    {"label": "Percentile envelope", "value": "envelope"}
+                                ],
+                                value="points",
+                                inline=True
+                            )
+                        ], style={"display": "inline-block", "margin-right": "30px"}),
+
+                        html.Div([
+                            html.Label("Envelope percentiles:", style={"font-weight": "bold", "margin-right": "10px"}),
+                            dcc.RangeSlider(
+                                id=self.id("envelope-percentiles"),
+                                min=0,
+                                max=100,
+                                step=1,
+                                value=[AGGREGATE_PERCENTILES[0], AGGREGATE_PERCENTILES[-1]],
+                                marks={i: str(i) for i in range(0, 101, 25)},
+                                tooltip={"placement": "bottom", "always_visible": True}
+                            )
+                        ], style={"display": "inline-block", "width": "250px", "margin-right": "30px"}),
+
+                        html.Div([
+                            html.Label("Envelope per:", style={"font-weight": "bold", "margin-right": "10px"}),
+                            dcc.Dropdown(
+                                id=self.id("envelope-groups"),
+                                options=self.parameter_options,
+                                value=[],
+                                multi=True,
+                                placeholder="All selected models together",
+                            )
+                        ], style={"display": "inline-block", "width": "350px", "vertical-align": "middle"}),
+                    ], style={"margin-top": "10px"}
+                    ),
+                    html.Div(id=self.id("aggregation-notice"), style={"color": "#b35900", "margin-top": "10px"}),
+                    html.Div(id=self.id("lod-notice"), style={"color": "#555555", "margin-top": "10px"}),
+                ]),
+                html.Img(
+                    src="/assets/uclchem_transparent.png",
+                    style={
+                        "position": "absolute",
+                        "top": "10px",
+                        "right": "10px",
+                        "width": "50px",
+                    },
+                ),
+                html.Div(
+                    id=self.id("output-job-status"),
+                    children=[
+                        html.Span("Computing the selection... ", style={"margin-right": "10px"}),
+                        html.Progress(id=self.id("output-progress"), value="0", max="4", style={"margin-right": "10px"}),
+                        html.Button("Cancel", id=self.id("btn_cancel_output")),
+                    ],
+                    style={"display": "none"},
+                ),
+                dcc.Graph(id=self.id("df-graph")),
+                html.Div(id=self.id("point-details"), style={"min-height": "1.5em", "margin": "0 10px"}),
+                html.Div(id=self.id("run-container"), style={"display": "none"}, children=[
+                    html.Hr(style={"margin": "20px 0"}),
+                    html.H3("Full evolution of the clicked run"),
+                    html.Button("Close", id=self.id("btn_close_run")),
+                    dcc.Graph(id=self.id("run-graph")),
+                ]),
+                html.Div(id=self.id("ratio-graph-container"), style={"display": "none"}, children=[
+                    html.Hr(style={"margin": "20px 0"}),
+                    html.Div(
+                        id=self.id("ratio-job-status"),
+                        children=[html.Span("Computing the ratios... ", style={"margin-right": "10px"})],
+                        style={"display": "none"},
+                    ),
+                    dcc.Graph(id=self.id("ratio-graph")),
+                    html.Button("Download ratios CSV", id=self.id("btn_ratio_csv")),
+                    dcc.Download(id=self.id("download-ratio-csv")),
+                ]),
+                html.Div(id=self.id("df-summary")),
+                html.Button("Download CSV", id=self.id("btn_csv")),
+                dcc.Download(id=self.id("download-dataframe-csv")),
+                dcc.Store(id=self.id("selection-store")),
+                # Set by the preview of the abundance plot, so that the full plot is computed after it
+                dcc.Store(id=self.id("preview-store")),
+                html.Div(id=self.id("output-div")),
+                html.Hr(style={"margin": "20px 0"}),
+                html.Div([
+                    html.H2("Fit observations"),
+                    html.P("Rank every model (run and timestep) of the grid against observed abundances or abundance ratios. " \
+                           "Write one observation per line as 'SPECIES VALUE ERROR' with the error in dex, use 'A/B' for ratios " \
+                           "and 'SPECIES < VALUE' for upper limits."),
+                    dcc.Textarea(
+                        id=self.id("fit-observations"),
+                        placeholder="CH3OH 1e-8 0.3\nHNC/HCN 0.5 0.2\nSIO < 1e-10",
+                        style={"width": "100%", "height": "120px", "margin-bottom": "10px"},
+                    ),
+                    html.Div([
+                        html.Div([
+                            html.Label("Timesteps:", style={"font-weight": "bold", "margin-right": "10px"}),
+                            dcc.Dropdown(
+                                id=self.id("fit-stage"),
+                                options=[{"label": "All timesteps", "value": "all"}] + self.fit_stages,
+                                value="all",
+                                clearable=False,
+                            ),
+                        ], style={"display": "inline-block", "width": "300px", "margin-right": "30px", "vertical-align": "middle"}),
+                        html.Div([
+                            html.Label("Number of models:", style={"font-weight": "bold", "margin-right": "10px"}),
+                            dcc.Input(id=self.id("fit-top-k"), type="number", min=1, max=1000, step=1, value=FIT_TOP_K),
+                        ], style={"display": "inline-block", "margin-right": "30px", "vertical-align": "middle"}),
+                        dcc.Checklist(
+                            id=self.id("fit-one-per-run"),
+                            options=[{"label": " Best timestep of each model only", "value": "one-per-run"}],
+                            value=["one-per-run"],
+                            inline=True,
+                            style={"display": "inline-block", "vertical-align": "middle"},
+                        ),
+                    ], style={"margin-bottom": "10px"}),
+                    html.Button("Rank models", id=self.id("btn_fit")),
+                    html.Div(id=self.id("fit-validation-message"), style={"color": "red", "margin": "10px 0"}),
+                    html.Div(
+                        id=self.id("fit-job-status"),
+                        children=[
+                            html.Span("Ranking the models... ", style={"margin-right": "10px"}),
+                            html.Progress(id=self.id("fit-progress"), value="0", max="2"),
+                        ],
+                        style={"display": "none"},
+                    ),
+                    html.Div(id=self.id("fit-results")),
+                ]),
+                html.Hr(style={"margin": "20px 0"}),
+                html.Div([
+                    html.H2("Parameter sweep"),
+                    html.P("Abundance of a species at a reference point of every run of the selected stage, versus one parameter. " \
+                           "All values of the swept, color and panel parameters are shown; the other parameters are restricted " \
+                           "to the values selected above."),
+                    html.Div([
+                        html.Div([
+                            html.Label("Species:", style={"font-weight": "bold", "margin-right": "10px"}),
+                            dcc.Dropdown(
+                                id=self.id("sweep-species"),
+                                options=[{"label": species, "value": species} for species in self.engine.all_species],
+                                placeholder="Select a species...",
+                            ),
+                        ], style={"display": "inline-block", "width": "250px", "margin-right": "30px", "vertical-align": "middle"}),
+                        html.Div([
+                            html.Label("Reference point:", style={"font-weight": "bold", "margin-right": "10px"}),
+                            dcc.Dropdown(
+                                id=self.id("sweep-reference"),
+                                options=[{"label": text, "value": reference} for reference, text in SWEEP_REFERENCES.items()],
+                                value="end",
+                                clearable=False,
+                            ),
+                        ], style={"display": "inline-block", "width": "250px", "margin-right": "30px", "vertical-align": "middle"}),
+                        html.Div([
+                            html.Label("Age [yr] (fixed-age reference):", style={"font-weight": "bold", "margin-right": "10px"}),
+                            dcc.Input(id=self.id("sweep-age"), type="number", min=0, value=1e5),
+                        ], style={"display": "inline-block", "vertical-align": "middle"}),
+                    ], style={"margin-bottom": "10px"}),
+                    html.Div([
+                        html.Div([
+                            html.Label("Versus:", style={"font-weight": "bold", "margin-right": "10px"}),
+                            dcc.Dropdown(id=self.id("sweep-parameter"), options=self.parameter_options, value=self.sweep_parameter, clearable=False),
+                        ], style={"display": "inline-block", "width": "250px", "margin-right": "30px", "vertical-align": "middle"}),
+                        html.Div([
+                            html.Label("Color:", style={"font-weight": "bold", "margin-right": "10px"}),
+                            dcc.Dropdown(id=self.id("sweep-color"), options=self.parameter_options, value="zeta"),
+                        ], style={"display": "inline-block", "width": "250px", "margin-right": "30px", "vertical-align": "middle"}),
+                        html.Div([
+                            html.Label("Panels:", style={"font-weight": "bold", "margin-right": "10px"}),
+                            dcc.Dropdown(id=self.id("sweep-facet"), options=self.parameter_options, value=None),
+                        ], style={"display": "inline-block", "width": "250px", "vertical-align": "middle"}),
+                    ]),
+                    html.Div(id=self.id("sweep-validation-message"), style={"color": "red", "margin": "10px 0"}),
+                    dcc.Graph(id=self.id("sweep-graph")),
+                ]),
+                html.Hr(style={"margin": "20px 0"}),
+                html.Div([
+                    html.H2("Characteristic timescales"),
+                    html.P("Age at which every run of the selected stage first exceeds a threshold abundance, at which its ice " \
+                           f"species drop below {TIMESCALE_DESORPTION_FRACTION:g} of their peak, or at which the run enters its " \
+                           f"second stage ({TRANSITIONS[self.model]['label'].lower()}), for the parameters selected above."),
+                    html.Div([
+                        html.Div([
+                            html.Label("Timescale:", style={"font-weight": "bold", "margin-right": "10px"}),
+                            dcc.Dropdown(
+                                id=self.id("timescale-kind"),
+                                options=[{"label": text, "value": kind} for kind, text in TIMESCALES.items()],
+                                value="threshold",
+                                clearable=False,
+                            ),
+                        ], style={"display": "inline-block", "width": "300px", "margin-right": "30px", "vertical-align": "middle"}),
+                        html.Div([
+                            html.Label("Species:", style={"font-weight": "bold", "margin-right": "10px"}),
+                            dcc.Dropdown(
+                                id=self.id("timescale-species"),
+                                options=[{"label": species, "value": species} for species in self.engine.all_species],
+                                multi=True,
+                                placeholder="Select species...",
+                            ),
+                        ], style={"display": "inline-block", "width": "350px", "margin-right": "30px", "vertical-align": "middle"}),
+                        html.Div([
+                            html.Label("Threshold abundance:", style={"font-weight": "bold", "margin-right": "10px"}),
+                            dcc.Input(id=self.id("timescale-threshold"), type="number", min=0, value=TIMESCALE_THRESHOLD),
+                        ], style={"display": "inline-block", "vertical-align": "middle"}),
+                    ], style={"margin-bottom": "10px"}),
+                    html.Div(id=self.id("timescale-validation-message"), style={"color": "red", "margin": "10px 0"}),
+                    dcc.Graph(id=self.id("timescale-graph")),
+                    html.Div(id=self.id("timescale-table")),
+                ]),
+            ]
+        )
+
+    # -------------------
+    # Plots of a selection
+    # -------------------
+
+    def render_output(self, set_progress, selected_df, selected_species, selection, y_scale, marker_size, show_grid,
+                      raw_override, plot_mode, envelope_percentiles, envelope_groups):
+        """Tables, abundance plot and notices of a selection."""
+        engine = self.engine
+        # Estimate the size of the selection before filtering - large selections are shown aggregated
+        n_rows   = estimate_rows(engine.row_counts[selected_df], selection)
+        n_points = n_rows * len(selected_species)
+        too_many_points = n_points > MAX_RAW_POINTS and "raw" not in raw_override
+        aggregate_plot  = plot_mode == "envelope" or too_many_points
+        aggregate_table = n_rows > MAX_TABLE_ROWS and "raw" not in raw_override
+        # The band surrounds the median, whatever the ends of the slider
+        percentiles     = envelope_band(envelope_percentiles)
+        lower, _, upper = percentiles
+        if too_many_points or aggregate_table:
+            aggregation_notice = f"ℹ️ This selection has {n_rows:,} rows ({n_points:,} points), too many to display quickly. " \
+                                 f"It is shown as the median and the {lower}-{upper}th percentile band of the runs per age bin. " \
+                                 "Tick 'Always plot every point' to override."
+        else:
+            aggregation_notice = ""
+        lod_notice = ""
+
+        # Per-run summary of the selection - read from the summary table instead of the rows
+        selected_summary = select_summary(engine.run_summary, engine.stages[selected_df], selected_species, selection)
+
+        # Selected rows, with only the species that are shown (see query_backend.py) - only filtered when the points or
+        # the rows are shown, so oversized selections are never built
+        if aggregate_plot and aggregate_table:
+            df = None
+        else:
+            df = engine.selected_rows(selected_df, selection, selected_species)
+
+        if aggregate_plot or aggregate_table:
+            binned = engine.query.binned_percentiles(selected_df, selection, selected_species, percentiles=percentiles,
+                                                     group_columns=envelope_groups or [])
+
+        if aggregate_table:
+            summary = html.Div(
+                [
+                    html.H3(" Aggregated view of the chosen data"),
+                    dash_table.DataTable(
+                        id=self.id("datatable-aggregated"),
+                        columns=[{"name": i, "id": i} for i in binned.columns],
+                        data=binned.to_dict("records"),
+                        style_table={"overflowX": "auto"},
+                        style_header={"backgroundColor": "rgb(30, 30, 30)", "color": "white"},
+                        sort_action="native",
+                        page_action="native",
+                        page_current=0,
+                        page_size=10,
+                    ),
+                ]
+            )
+        else:
+            summary = html.Div(
+                [
+                    html.H3(" Head of the chosen data"),
+                    dcc.Input(
+                        id=self.id("datatable-filter"),
+                        type="text",
+                        placeholder="Filter table...",
+                        style={"margin-bottom": "10px"},
+                    ),
+                    dash_table.DataTable(
+                        id=self.id("datatable"),
+                        columns=[{"name": i, "id": i} for i in engine.table_columns + selected_species],
+                        # Only the first page is sent; the other pages are read from the session store (see update_table_page)
+                        data=df[engine.table_columns + selected_species].head(10).to_dict("records"),
+                        style_table={"overflowX": "auto"},
+                        style_header={"backgroundColor": "rgb(30, 30, 30)", "color": "white"},
+                        filter_action="custom",
+                        sort_action="custom",
+                        sort_mode="multi",
+                        page_action="custom",
+                        page_current=0,
+                        page_size=10,
+                        page_count=max(1, -(-len(df) // 10)),
+                    ),
+                ]
+            )
+        summary.children += [
+            html.H3(" Per-run summary of the chosen data"),
+            html.P(f"Abundances at the start and end of the stage, smallest and peak abundance (with its age), "
+                   f"time average, and {SUMMARY_OFFSET_AGE:.0e} yr after the start of the stage (at_offset)."),
+            dash_table.DataTable(
+                id=self.id("run-summary-table"),
+                columns=[{"name": i, "id": i} for i in ["run_id"] + engine.parameters + OVERVIEW_COLUMNS],
+                data=selected_summary[["run_id"] + engine.parameters + OVERVIEW_COLUMNS].head(MAX_TABLE_ROWS).to_dict("records"),
+                style_table={"overflowX": "auto"},
+                style_header={"backgroundColor": "rgb(30, 30, 30)", "color": "white"},
+                filter_action="native",
+                sort_action="native",
+                page_action="native",
+                page_current=0,
+                page_size=10,
+            ),
+        ]
+        set_progress(("2", "4"))
+
+        if aggregate_plot:
+            fig = aggregated_figure(
+                binned,
+                title=f"{selected_df.capitalize()} (median and {lower}-{upper}th percentiles)",
+                y_scale=y_scale,
+                marker_size=marker_size,
+                group_columns=envelope_groups or [],
+            )
+        else:
+            plot_df = df
+            if "raw" not in raw_override:
+                # Plot the finest level of detail that fits within LOD_MAX_POINTS - zooming in refines it (see update_zoom)
+                levels  = engine.lod_by_stage[selected_df][df.index.to_numpy()]
+                level   = choose_level(levels, len(selected_species), LOD_MAX_POINTS)
+                plot_df = df[levels <= level]
+                lod_notice = lod_message(len(plot_df), len(df))
+            fig = abundance_figure(
+                plot_df,
+                selected_species,
+                title=f"{selected_df.capitalize()}",
+                y_scale=y_scale,
+                marker_size=marker_size,
+                hover_data=self.abundance_hover_data,
+                labels=self.abundance_labels,
+                hovertemplate=self.abundance_hovertemplate,
+            )
+
+        set_progress(("3", "4"))
+
+        if df is None:
+            # The band of every species sets the range of the y-axis
+            style_figure(fig, binned, ["lower", "upper"], show_grid, y_range=summary_y_range(selected_summary))
+        else:
+            style_figure(fig, df, selected_species, show_grid, y_range=summary_y_range(selected_summary))
+
+        return summary, fig, aggregation_notice, lod_notice
+
+    def output_key(self, selected_df, selected_species, selection, y_scale, marker_size, show_grid, raw_override,
+                   plot_mode, envelope_percentiles, envelope_groups):
+        """Key of the output of render_output in the figure cache."""
+        display = (y_scale, marker_size, tuple(show_grid or []), tuple(raw_override or []), plot_mode,
+                   tuple(envelope_percentiles), tuple(envelope_groups or []))
+        return (*self.engine.selection_key(selected_df, selection), tuple(selected_species), display)
+
+    def cached_output(self, set_progress, selected_df, selected_species, selection, y_scale, marker_size, show_grid,
+                      raw_override, plot_mode, envelope_percentiles, envelope_groups):
+        """Output of render_output, computed only if it is not cached."""
+        self.engine.ensure_species(selected_species)
+        key = self.output_key(selected_df, selected_species, selection, y_scale, marker_size, show_grid, raw_override,
+                              plot_mode, envelope_percentiles, envelope_groups)
+        return self.engine.figure_cache.get_or_compute(
+            key,
+            lambda: self.render_output(set_progress, selected_df, selected_species, selection, y_scale, marker_size,
+                                       show_grid, raw_override, plot_mode, envelope_percentiles, envelope_groups),
+        )
+
+    def render_preview(self, selected_df, selected_species, selection, n_rows, y_scale, marker_size, show_grid,
+                       raw_override, plot_mode, envelope_percentiles, envelope_groups):
+        """
+        Quick preview of the abundance plot of a selection, drawn from the sample of its stage table (see preview.py).
+
+        Args:
+            selected_df (str): Selected stage.
+            selected_species (list): Selected species.
+            selection (dict): Selected values of each parameter.
+            n_rows (int): Estimated number of rows of the selection.
+            y_scale, marker_size, show_grid, raw_override, plot_mode, envelope_percentiles, envelope_groups:
+                Display settings, as for render_output.
+
+        Returns:
+            tuple: (figure, number of plotted rows), or None if the sample has no row of the selection.
+        """
+        frame     = self.engine.stage_tables[selected_df]
+        positions = self.engine.preview_by_stage[selected_df].select(selection)
+        if len(positions) == 0:
+            return None
+        columns = self.engine.metadata_columns + selected_species
+        df = frame.iloc[positions, [frame.columns.get_loc(column) for column in columns]]
+
+        # The plot the full update will draw: the envelope, or the points
+        if plot_mode == "envelope" or (n_rows * len(selected_species) > MAX_RAW_POINTS and "raw" not in raw_override):
+            percentiles     = envelope_band(envelope_percentiles)
+            lower, _, upper = percentiles
+            binned = binned_percentiles(df, selected_species, percentiles=percentiles,
+                                        group_columns=envelope_groups or [])
+            fig = aggregated_figure(
+                binned,
+                title=f"{selected_df.capitalize()} (median and {lower}-{upper}th percentiles)",
+                y_scale=y_scale,
+                marker_size=marker_size,
+                group_columns=envelope_groups or [],
+            )
+        else:
+            fig = abundance_figure(
+                df,
+                selected_species,
+                title=f"{selected_df.capitalize()}",
+                y_scale=y_scale,
+                marker_size=marker_size,
+                hover_data=self.abundance_hover_data,
+                labels=self.abundance_labels,
+                hovertemplate=self.abundance_hovertemplate,
+            )
+        style_figure(fig, df, selected_species, show_grid)
+        return preview_figure(fig), len(df)
+
+    # ---------
+    # Callbacks
+    # ---------
+
+    def register_callbacks(self):
+        """Register the callbacks of the page on the app."""
+        app, manager = self.app, self.background_manager
+        species_inputs = [
+            dash.Input(self.id("df-dropdown-type"), "value"),
+            dash.Input(self.id("df-dropdown-gas-species"), "value"),
+            dash.Input(self.id("df-dropdown-surface-species"), "value"),
+            dash.Input(self.id("df-dropdown-bulk-species"), "value"),
+        ]
+        display_inputs = [dash.Input(self.id(control), "value") for control in DISPLAY_CONTROLS]
+
+        # Quick preview of the abundance plot of large selections - sent within a bounded time, before update_output
+        # replaces it with the full plot (see preview.py)
+        app.callback(
+            [
+                dash.Output(self.id("df-graph"), "figure", allow_duplicate=True),
+                dash.Output(self.id("lod-notice"), "children", allow_duplicate=True),
+                dash.Output(self.id("preview-store"), "data"),
+            ],
+            species_inputs + self.filter_inputs() + display_inputs,
+            prevent_initial_call=True,
+        )(self.update_preview)
+
+        heavy_callback(
+            app,
+            manager,
+            [
+                dash.Output(self.id("df-summary"), "children"),
+                dash.Output(self.id("df-graph"), "figure"),
+                dash.Output(self.id("species-validation-message"), "children"),
+                dash.Output(self.id("aggregation-notice"), "children"),
+                dash.Output(self.id("lod-notice"), "children"),
+                dash.Output(self.id("selection-store"), "data")
+            ],
+            species_inputs + self.filter_inputs() + display_inputs + [dash.Input(self.id("preview-store"), "data")],
+            [dash.State(self.id("selection-store"), "data")],
+            progress=[dash.Output(self.id("output-progress"), "value"), dash.Output(self.id("output-progress"), "max")],
+            running=[(dash.Output(self.id("output-job-status"), "style"), {"display": "block", "margin": "10px 0"}, {"display": "none"})],
+            cancel=[dash.Input(self.id("btn_cancel_output"), "n_clicks")],
+        )(self.update_output)
+
+        # Pages of the data table, filtered and sorted on the server from the rows saved in the session store
+        app.callback(
+            [
+                dash.Output(self.id("datatable"), "data"),
+                dash.Output(self.id("datatable"), "page_count"),
+            ],
+            [
+                dash.Input(self.id("datatable"), "page_current"),
+                dash.Input(self.id("datatable"), "page_size"),
+                dash.Input(self.id("datatable"), "sort_by"),
+                dash.Input(self.id("datatable"), "filter_query"),
+            ],
+            dash.State(self.id("selection-store"), "data"),
+            prevent_initial_call=True,
+        )(self.update_table_page)
+
+        # CSV file of the selected rows, read from the session store
+        app.callback(
+            dash.Output(self.id("download-dataframe-csv"), "data"),
+            dash.Input(self.id("btn_csv"), "n_clicks"),
+            dash.State(self.id("selection-store"), "data"),
+            prevent_initial_call=True,
+        )(self.download_selection)
+
+        # Refetch the zoomed age range of the abundance plot at a finer level of detail
+        app.callback(
+            [
+                dash.Output(self.id("df-graph"), "figure", allow_duplicate=True),
+                dash.Output(self.id("lod-notice"), "children", allow_duplicate=True),
+            ],
+            dash.Input(self.id("df-graph"), "relayoutData"),
+            [
+                dash.State(self.id("selection-store"), "data"),
+                dash.State(self.id("y-axis-scale"), "value"),
+                dash.State(self.id("marker-size-slider"), "value"),
+                dash.State(self.id("show-grid"), "value"),
+                dash.State(self.id("raw-points-override"), "value"),
+                dash.State(self.id("plot-mode"), "value"),
+            ],
+            prevent_initial_call=True,
+        )(self.update_zoom)
+
+        # Details of the hovered (or clicked) point of the abundance plot, looked up from its row in the stage table
+        app.callback(
+            dash.Output(self.id("point-details"), "children"),
+            [dash.Input(self.id("df-graph"), "hoverData"), dash.Input(self.id("df-graph"), "clickData")],
+            dash.State(self.id("selection-store"), "data"),
+            prevent_initial_call=True,
+        )(self.update_point_details)
+
+        # Full evolution (all stages) of the run of a clicked point of the abundance plot, from the run index
+        app.callback(
+            [
+                dash.Output(self.id("run-graph"), "figure"),
+                dash.Output(self.id("run-container"), "style"),
+            ],
+            [
+                dash.Input(self.id("df-graph"), "clickData"),
+                dash.Input(self.id("btn_close_run"), "n_clicks"),
+            ],
+            [
+                dash.State(self.id("selection-store"), "data"),
+                dash.State(self.id("y-axis-scale"), "value"),
+            ],
+            prevent_initial_call=True,
+        )(self.update_run_drilldown)
+
+        # Show/hide ratio controls based on checkbox
+        app.callback(
+            [
+                dash.Output(self.id("ratio-controls"), "style"),
+                dash.Output(self.id("ratio-graph-container"), "style")
+            ],
+            [dash.Input(self.id("enable-ratio-plot"), "value")]
+        )(self.toggle_ratio_controls)
+
+        # Update dropdown options based on selected species
+        app.callback(
+            [
+                dash.Output(self.id("ratio-numerator-dropdown"), "options"),
+                dash.Output(self.id("ratio-denominator-dropdown"), "options")
+            ],
+            dash.Input(self.id("selection-store"), "data")
+        )(self.update_ratio_dropdown_options)
+
+        # Create ratio plot - runs in the request, so that the ratio tables stay cached in this process (see ratios.py)
+        app.callback(
+            [
+                dash.Output(self.id("ratio-graph"), "figure"),
+                dash.Output(self.id("ratio-validation-message"), "children"),
+                dash.Output(self.id("download-ratio-csv"), "data")
+            ],
+            [
+                dash.Input(self.id("selection-store"), "data"),
+                dash.Input(self.id("ratio-numerator-dropdown"), "value"),
+                dash.Input(self.id("ratio-denominator-dropdown"), "value"),
+                dash.Input(self.id("enable-ratio-plot"), "value"),
+                dash.Input(self.id("y-axis-scale"), "value"),
+                dash.Input(self.id("marker-size-slider"), "value"),
+                dash.Input(self.id("show-grid"), "value"),
+                dash.Input(self.id("btn_ratio_csv"), "n_clicks"),
+            ],
+            running=[(dash.Output(self.id("ratio-job-status"), "style"), {"display": "block", "margin": "10px 0"}, {"display": "none"})],
+        )(self.update_ratio_plot)
+
+        # Rank the models against the observations
+        heavy_callback(
+            app,
+            manager,
+            [
+                dash.Output(self.id("fit-results"), "children"),
+                dash.Output(self.id("fit-validation-message"), "children")
+            ],
+            [dash.Input(self.id("btn_fit"), "n_clicks")],
+            [
+                dash.State(self.id("fit-observations"), "value"),
+                dash.State(self.id("fit-stage"), "value"),
+                dash.State(self.id("fit-top-k"), "value"),
+                dash.State(self.id("fit-one-per-run"), "value"),
+            ],
+            progress=[dash.Output(self.id("fit-progress"), "value"), dash.Output(self.id("fit-progress"), "max")],
+            running=[(dash.Output(self.id("fit-job-status"), "style"), {"display": "block", "margin": "10px 0"}, {"display": "none"})],
+            prevent_initial_call=True
+        )(self.update_fit)
+
+        # Parameter sweep - runs in the request, so that the per-run values stay cached in this process
+        app.callback(
+            [
+                dash.Output(self.id("sweep-graph"), "figure"),
+                dash.Output(self.id("sweep-validation-message"), "children")
+            ],
+            [
+                dash.Input(self.id("sweep-species"), "value"),
+                dash.Input(self.id("sweep-reference"), "value"),
+                dash.Input(self.id("sweep-age"), "value"),
+                dash.Input(self.id("sweep-parameter"), "value"),
+                dash.Input(self.id("sweep-color"), "value"),
+                dash.Input(self.id("sweep-facet"), "value"),
+                dash.Input(self.id("df-dropdown-type"), "value"),
+                *self.filter_inputs(),
+                dash.Input(self.id("y-axis-scale"), "value"),
+                dash.Input(self.id("marker-size-slider"), "value"),
+            ],
+        )(self.update_sweep)
+
+        # Characteristic timescales - runs in the request, so that the per-run timescales stay cached in this process
+        app.callback(
+            [
+                dash.Output(self.id("timescale-graph"), "figure"),
+                dash.Output(self.id("timescale-table"), "children"),
+                dash.Output(self.id("timescale-validation-message"), "children")
+            ],
+            [
+                dash.Input(self.id("timescale-kind"), "value"),
+                dash.Input(self.id("timescale-species"), "value"),
+                dash.Input(self.id("timescale-threshold"), "value"),
+                dash.Input(self.id("df-dropdown-type"), "value"),
+                *self.filter_inputs(),
+            ],
+        )(self.update_timescales)
+
+    def update_preview(self, selected_df, selected_gas_species, selected_surface_species, selected_bulk_species, *values):
+        n_filters = len(self.filters)
+        selection = self.selection(values[:n_filters])
+        y_scale, marker_size, show_grid, raw_override, plot_mode, envelope_percentiles, envelope_groups = values[n_filters:]
+        selected_species = (selected_gas_species or []) + (selected_surface_species or []) + (selected_bulk_species or [])
+        if not selected_species:
+            raise dash.exceptions.PreventUpdate
+        # The species are added in the request: update_output waits for this callback (it uses the preview store),
+        # so its background job is forked with them instead of reading them again in every job
+        self.engine.ensure_species(selected_species)
+        n_rows = estimate_rows(self.engine.row_counts[selected_df], selection)
+        # Small selections and cached plots are shown directly by update_output
+        if (n_rows * len(selected_species) < PREVIEW_MIN_POINTS
+                or self.output_key(selected_df, selected_species, selection, y_scale, marker_size, show_grid,
+                                   raw_override, plot_mode, envelope_percentiles, envelope_groups) in self.engine.figure_cache):
+            raise dash.exceptions.PreventUpdate
+
+        preview = self.render_preview(selected_df, selected_species, selection, n_rows, y_scale, marker_size, show_grid,
+                                      raw_override, plot_mode, envelope_percentiles, envelope_groups)
+        if preview is None:
+            raise dash.exceptions.PreventUpdate
+        fig, n_shown = preview
+        preview_data = {"stage": selected_df, "selection": selection, "species": selected_species}
+        return fig, preview_message(n_shown, n_rows), preview_data
+
+    def update_output(self, set_progress, selected_df, selected_gas_species, selected_surface_species,
+                      selected_bulk_species, *values):
+        n_filters = len(self.filters)
+        selection = self.selection(values[:n_filters])
+        display   = values[n_filters:n_filters + len(DISPLAY_CONTROLS)]
+        preview, session = values[n_filters + len(DISPLAY_CONTROLS):]
+
+        # Combine all selected species
+        selected_species = []
+        if selected_gas_species:
+            selected_species.extend(selected_gas_species)
+        if selected_surface_species:
+            selected_species.extend(selected_surface_species)
+        if selected_bulk_species:
+            selected_species.extend(selected_bulk_species)
+
+        # Validation: Check if at least one species is selected
+        if not selected_species:
+            validation_message = "⚠️ Please select at least one species from any category."
+            empty_fig = px.scatter(title="No species selected")
+            empty_summary = html.Div("Please select species to view data.")
+            return empty_summary, empty_fig, validation_message, "", "", {**session, "species": []} if session else dash.no_update
+
+        # Clear validation message if species are selected
+        validation_message = ""
+        set_progress(("1", "4"))
+
+        # Recorded for prewarming the caches when the app restarts (see selection_cache.py)
+        log_selection(self.model, selected_df, selection, selected_species)
+
+        summary, fig, aggregation_notice, lod_notice = self.cached_output(
+            set_progress, selected_df, selected_species, selection, *display
+        )
+
+        set_progress(("4", "4"))
+
+        # The selected rows are saved once for the callbacks that depend on the selection (see session_store.py)
+        positions    = self.engine.selected_positions(selected_df, selection)
+        session_data = self.engine.save_session(session, selected_df, selection, selected_species, positions,
+                                                new_session_id)
+        return (summary, fig, validation_message, aggregation_notice, lod_notice,
+                dash.no_update if session_data is None else session_data)
+
+    def update_table_page(self, page_current, page_size, sort_by, filter_query, session):
+        if not session or not session["species"]:
+            raise dash.exceptions.PreventUpdate
+        return table_page(self.engine.export_rows(session), page_current or 0, page_size, sort_by, filter_query)
+
+    def download_selection(self, n_clicks, session):
+        if not n_clicks or not session or not session["species"]:
+            raise dash.exceptions.PreventUpdate
+        df_filtered = self.engine.export_rows(session)
+        return dcc.send_data_frame(df_filtered.to_csv, self.engine.export_name("model"))
+
+    def update_zoom(self, relayout_data, session, y_scale, marker_size, show_grid, raw_override, plot_mode):
+        engine = self.engine
+        ranges = zoomed_ranges(relayout_data)
+        # Aggregated plots and plots of every point have nothing to refine
+        if ranges is None or not session or not session["species"] or plot_mode == "envelope" or "raw" in raw_override:
+            raise dash.exceptions.PreventUpdate
+        # The plotted selection, saved in the session store
+        selected_df, selection, selected_species = session["stage"], session["selection"], session["species"]
+        n_rows = estimate_rows(engine.row_counts[selected_df], selection)
+        if n_rows * len(selected_species) > MAX_RAW_POINTS:
+            raise dash.exceptions.PreventUpdate
+
+        x_range, y_range = ranges
+        age_range = (10 ** x_range[0], 10 ** x_range[1]) if x_range is not None else None
+        engine.ensure_species(selected_species)
+        df = engine.session_rows(session, engine.metadata_columns + selected_species, age_range=age_range)
+        if df.empty:
+            raise dash.exceptions.PreventUpdate
+
+        levels  = engine.lod_by_stage[selected_df][df.index.to_numpy()]
+        level   = choose_level(levels, len(selected_species), LOD_MAX_POINTS)
+        plot_df = df[levels <= level]
+        fig = abundance_figure(
+            plot_df,
+            selected_species,
+            title=f"{selected_df.capitalize()}",
+            y_scale=y_scale,
+            marker_size=marker_size,
+            hover_data=self.abundance_hover_data,
+            labels=self.abundance_labels,
+            hovertemplate=self.abundance_hovertemplate,
+        )
+        style_figure(fig, df, selected_species, show_grid)
+        if x_range is not None:
+            fig.update_xaxes(range=x_range)
+        if y_range is not None:
+            fig.update_yaxes(range=y_range)
+        return fig, lod_message(len(plot_df), len(df))
+
+    def update_point_details(self, hover_data, click_data, session):
+        if not session:
+            raise dash.exceptions.PreventUpdate
+        frame   = self.engine.stage_tables[session["stage"]]
+        details = point_details(dash.ctx.triggered[0]["value"], frame, self.abundance_hover_data, self.abundance_labels)
+        if details is None:
+            raise dash.exceptions.PreventUpdate
+        return details
+
+    def update_run_drilldown(self, click_data, n_close, session, y_scale):
+        if dash.ctx.triggered_id == self.id("btn_close_run"):
+            return dash.no_update, {"display": "none"}
+        if not session:
+            raise dash.exceptions.PreventUpdate
+        # The point belongs to the plotted selection, saved in the session store
+        engine   = self.engine
+        frame    = engine.stage_tables[session["stage"]]
+        selected_species = session["species"]
+        position = point_row(click_data, frame["age"].to_numpy())
+        if position is None or not selected_species:
+            raise dash.exceptions.PreventUpdate
+
+        engine.ensure_species(selected_species)
+        parameters = engine.parameters
+        run_id = frame["run_id"].iat[position]
+        run_df = engine.run_index.rows(run_id, ["age", "stage", "locTemp", "locDens", "Av"] + parameters + selected_species)
+        title  = f"Run {run_id}: " + ", ".join(f"{parameter}={run_df[parameter].iat[0]:g}" for parameter in parameters)
+        return run_figure(run_df, selected_species, title=title, y_scale=y_scale), {"display": "block"}
+
+    def toggle_ratio_controls(self, enabled):
+        if "enabled" in enabled:
+            return {"display": "block"}, {"display": "block"}
+        else:
+            return {"display": "none"}, {"display": "none"}
+
+    def update_ratio_dropdown_options(self, session):
+        # Species of the plotted selection
+        selected_species = session["species"] if session else []
+
+        # Create options for both dropdowns
+        options = [{"label": species, "value": species} for species in selected_species]
+
+        return options, options
+
+    def update_ratio_plot(self, session, numerators, denominators, ratio_enabled, y_scale, marker_size,
+                          show_grid, n_clicks):
+        engine = self.engine
+
+        # If ratio plotting is not enabled, return empty figure
+        if "enabled" not in ratio_enabled:
+            return px.scatter(title="Ratio plotting disabled"), "", dash.no_update
+
+        # Validation
+        if not session or not numerators or not denominators:
+            validation_msg = "⚠️ Please select both numerator and denominator species for ratio plot."
+            return px.scatter(title="Select species for ratio"), validation_msg, dash.no_update
+
+        # Every numerator is paired with every denominator, skipping species divided by themselves
+        pairs = [(numerator, denominator) for numerator in numerators for denominator in denominators if numerator != denominator]
+        if not pairs:
+            validation_msg = "⚠️ Numerator and denominator cannot be the same species."
+            return px.scatter(title="Invalid ratio selection"), validation_msg, dash.no_update
+
+        # Clear validation message
+        validation_msg = ""
+
+        # The plotted selection, saved in the session store
+        selected_df, selection = session["stage"], session["selection"]
+
+        engine.ensure_species([species for pair in pairs for species in pair])
+        selection_key = engine.selection_key(selected_df, selection)
+        ratio_columns = self.ratio_columns
+        ratio_species = list(dict.fromkeys(species for pair in pairs for species in pair))
+        # Computed from the rows saved in the session store only if the ratios of this selection are not cached
+        ratio_table = cached_ratios_long_table(
+            selection_key,
+            lambda: ratios_long_table(engine.session_rows(session, ratio_columns + ratio_species), pairs, ratio_columns),
+            pairs,
+            ratio_columns,
+        )
+
+        if ratio_table.empty:
+            validation_msg = "⚠️ The selected runs have no data for these ratios."
+            return px.scatter(title="No data"), validation_msg, dash.no_update
+
+        # Create ratio plot - one panel per ratio
+        fig = ratio_figure(
+            ratio_table,
+            title=f"Ratios ({selected_df.capitalize()})",
+            y_scale=y_scale,
+            marker_size=marker_size,
+            hover_data=self.ratio_hover_data,
+            labels=self.ratio_labels,
+            hovertemplate=self.ratio_hovertemplate,
+        )
+
+        # Enhanced axis styling
+        grid_style = {
+            "showgrid": "grid" in show_grid,
+            "gridcolor": "rgba(128, 128, 128, 0.3)",
+            "gridwidth": 1,
+            "showline": True,
+            "linecolor": "Black",
+            "linewidth": 2,
+            "ticks": "outside",
+            "ticklen": 8,
+            "tickwidth": 1,
+            "tickcolor": "black",
+            "mirror": True,
+            "exponentformat": "e",
+            "showexponent": "all",
+            "minor": dict(ticklen=4, tickwidth=1)
+        }
+
+        fig.update_xaxes(**grid_style)
+        fig.update_yaxes(**grid_style)
+
+        fig.update_layout(
+            template="seaborn",
+            font=dict(size=16)
+        )
+
+        # The CSV file is only sent when its button was clicked, not on every later change of the plot
+        download_data = (dcc.send_data_frame(ratio_table.to_csv, engine.export_name("ratios"), index=False)
+                         if dash.ctx.triggered_id == self.id("btn_ratio_csv") else dash.no_update)
+        return fig, validation_msg, download_data
+
+    def update_fit(self, set_progress, n_clicks, observations_text, fit_stage, top_k, one_per_run):
+        engine = self.engine
+        try:
+            observations = parse_observations(observations_text, engine.all_species)
+        except ValueError as error:
+            return dash.no_update, f"⚠️ {error}"
+        if not observations:
+            return dash.no_update, "⚠️ Please enter at least one observation."
+
+        set_progress(("1", "2"))
+        observed_species = [observation[key] for observation in observations for key in ('numerator', 'denominator')]
+        engine.ensure_species([species for species in observed_species if species])
+        best_models = fit_models(
+            engine.fit_tables[fit_stage],
+            observations,
+            engine.parameters,
+            top_k=int(top_k or FIT_TOP_K),
+            one_per_run="one-per-run" in one_per_run,
+        )
+        results = html.Div(
+            [
+                html.H3("Best matching models"),
+                dash_table.DataTable(
+                    id=self.id("fit-table"),
+                    columns=[{"name": i, "id": i} for i in best_models.columns],
+                    data=best_models.to_dict("records"),
+                    style_table={"overflowX": "auto"},
+                    style_header={"backgroundColor": "rgb(30, 30, 30)", "color": "white"},
+                    sort_action="native",
+                    page_action="native",
+                    page_size=10,
+                ),
+            ]
+        )
+        return results, ""
+
+    def update_sweep(self, species, reference, age, sweep_parameter, color, facet, selected_df, *values):
+        engine    = self.engine
+        n_filters = len(self.filters)
+        selection = self.selection(values[:n_filters])
+        y_scale, marker_size = values[n_filters:]
+        if not species:
+            return px.scatter(title="No species selected"), ""
+        if reference == "age" and not (age and age > 0):
+            return dash.no_update, "⚠️ Please enter a positive age."
+
+        engine.ensure_species([species])
+        table = cached_run_values((engine.data_version, selected_df), engine.stage_runs[selected_df], species, reference,
+                                  age, engine.parameters)
+        # The parameters that are neither swept nor shown as colors or panels keep the values selected above
+        mask = np.ones(len(table), dtype=bool)
+        for parameter, selected in selection.items():
+            if parameter not in (sweep_parameter, color, facet):
+                mask &= table[parameter].isin(selected or []).to_numpy()
+        table = table[mask]
+        if table['value'].isna().all():
+            return px.scatter(title="No data"), "⚠️ No run of the selection reaches this reference point."
+
+        fig = sweep_figure(
+            table, species, sweep_parameter, engine.parameters, color=color, facet=facet, y_scale=y_scale,
+            marker_size=marker_size, labels=self.parameter_labels,
+            title=f"{format_molecule_HTML(species)} ({SWEEP_REFERENCES[reference].lower()}"
+                  + (f" {age:.2e} yr" if reference == "age" else "") + f", {selected_df}) versus {self.parameter_labels[sweep_parameter]}",
+        )
+        return fig, ""
+
+    def update_timescales(self, kind, species, threshold, selected_df, *values):
+        engine    = self.engine
+        selection = self.selection(values)
+        if kind == "transition":
+            # Over all the stages of every run
+            runs, species = engine.run_index, []
+        else:
+            runs    = engine.stage_runs[selected_df]
+            species = [name for name in species or [] if kind != "desorption" or is_ice(name)]
+            if not species:
+                message = "⚠️ Please select ice species ('#' or '@')." if kind == "desorption" else ""
+                return px.scatter(title="No species selected"), None, message
+            if kind == "threshold" and not (threshold and threshold > 0):
+                return dash.no_update, dash.no_update, "⚠️ Please enter a positive threshold abundance."
+
+        engine.ensure_species(species)
+        table = cached_run_timescales((engine.data_version, "all" if kind == "transition" else selected_df), runs, kind,
+                                      species, threshold, model=self.model, parameters=engine.parameters)
+        # Runs of the parameters selected above
+        mask = np.ones(len(table), dtype=bool)
+        for parameter, selected in selection.items():
+            mask &= table[parameter].isin(selected or []).to_numpy()
+        table = table[mask]
+        if table.empty:
+            return px.scatter(title="No data"), None, "⚠️ No run matches the selected parameters."
+        reached = table['age'].notna()
+        if not reached.any():
+            return px.scatter(title="No data"), None, "⚠️ No run of the selection reaches this timescale."
+
+        if kind == "threshold":
+            name = f"first above {threshold:.0e}"
+        elif kind == "desorption":
+            name = f"below {TIMESCALE_DESORPTION_FRACTION:g} of the peak"
+        else:
+            name = f"of the {TRANSITIONS[self.model]['label'].lower()} transition"
+        where = "all stages" if kind == "transition" else selected_df
+        counted = "runs" if kind == "transition" else "(run, species) pairs"
+        fig = timescale_figure(table, title=f"Age {name} ({where}): {reached.sum()} of {len(table)} {counted}")
+        results = dash_table.DataTable(
+            id=self.id("timescale-datatable"),
+            columns=[{"name": i, "id": i} for i in table.columns],
+            data=table[reached].head(MAX_TABLE_ROWS).to_dict("records"),
+            style_table={"overflowX": "auto"},
+            style_header={"backgroundColor": "rgb(30, 30, 30)", "color": "white"},
+            filter_action="native",
+            sort_action="native",
+            page_action="native",
+            page_current=0,
+            page_size=10,
+        )
+        return fig, results, ""
+
+    # Prewarm the caches with the most frequent logged selections when the app starts (see selection_cache.py)
+    def prewarm_caches(self):
+        """Compute the most frequent logged selections, with the default display settings, in a background thread."""
+        defaults = layout_values(self.layout, [self.id(control) for control in DISPLAY_CONTROLS])
+        prewarm(
+            lambda logged: self.cached_output(lambda *progress: None, logged["stage"], logged["species"], logged["filters"],
+                                              *[defaults[self.id(control)] for control in DISPLAY_CONTROLS]),
+            top_selections(self.model),
+            name=f"{self.model} cache prewarming",
+        )
@@ -0,0 +1,273 @@
+# File: CMZ_data_explorer/parameter_cube.py
+# -*- coding: utf-8 -*-
+"""
+This module contains the dense "parameter cube" representation of the model grid.
+
+The grid is a regular product of discrete parameters (e.g. shock_vel x initialDens x zeta x radfield x initialTemp
+for the cshock models), but the extracted data is a long table that has to be scanned for every query.
+Here every run is resampled onto a common logarithmic age axis and stored in a memory-mapped N-D array of shape
+
+    (parameter_1, ..., parameter_N, age, species)
+
+together with a mask of the grid cells that have a (successful) run, the stage at each resampled age, and a small
+JSON file describing the axes. ParameterCube serves slices of the stored cube, reading only the requested elements.
+
+The cube is an optional output of data_extraction.py (see BUILD_PARAMETER_CUBE in config.py). It can also be
+built from existing pickle files by running this module directly:
+
+    python parameter_cube.py
+"""
+# Import necessary libraries
+import json
+import pickle
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from functionality import mol_all, cube_axes_cshock, cube_axes_hotcore
+from config import (
+                CUBE_N_AGES,
+                CUBE_ABUNDANCE_FLOOR,
+                cshock_pkl,
+                hotcore_pkl,
+                cshock_cube_dir,
+                hotcore_cube_dir
+               )
+
+# Names of the files making up a cube
+CUBE_FILE     = "cube.npy"
+MASK_FILE     = "mask.npy"
+STAGE_FILE    = "stage.npy"
+METADATA_FILE = "metadata.json"
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+def common_age_axis(df, n_ages=CUBE_N_AGES):
+    """
+    Logarithmic age axis spanning all (positive) ages of the models.
+
+    Args:
+        df (pd.DataFrame): Long model table with an 'age' column.
+        n_ages (int): Number of ages.
+
+    Returns:
+        np.ndarray: The ages [yr].
+    """
+    ages = df['age'].to_numpy(dtype=float)
+    ages = ages[ages > 0]
+    return np.logspace(np.log10(ages.min()), np.log10(ages.max()), n_ages)
+
+def resample_run(run_ages, run_values, ages):
+    """
+    Linearly interpolate log10 of the values of one run in log10(age), for all species at once.
+    Ages outside the time span of the run give NaN.
+
+    Args:
+        run_ages (np.ndarray): Sorted ages of the run (length n_steps).
+        run_values (np.ndarray): n_steps x n_species array of abundances.
+        ages (np.ndarray): Common age axis (length n_ages).
+
+    Returns:
+        np.ndarray: n_ages x n_species array of resampled abundances.
+    """
+    positive   = run_ages > 0
+    log_age    = np.log10(run_ages[positive])
+    log_values = np.log10(np.maximum(run_values[positive], CUBE_ABUNDANCE_FLOOR))
+    log_target = np.log10(ages)
+
+    upper  = np.clip(np.searchsorted(log_age, log_target), 1, len(log_age) - 1)
+    lower  = upper - 1
+    span   = log_age[upper] - log_age[lower]
+    weight = np.divide(log_target - log_age[lower], span, out=np.zeros_like(span), where=span > 0)
+
+    resampled = log_values[lower] + weight[:, None] * (log_values[upper] - log_values[lower])
+    # Ages of a timestep take its values, even next to a missing value
+    resampled = np.where((weight == 1)[:, None], log_values[upper], resampled)
+    resampled = np.where((weight == 0)[:, None], log_values[lower], resampled)
+    resampled[(log_target < log_age[0]) | (log_target > log_age[-1])] = np.nan
+    return 10 ** resampled
+
+def build_parameter_cube(df, axes, output_dir, species=mol_all, n_ages=CUBE_N_AGES):
+    """
+    Build the memory-mapped parameter cube of a long model table and write it to output_dir.
+
+    Args:
+        df (pd.DataFrame): Long model table (one row per run and timestep), as written by data_extraction.py.
+        axes (list): Parameter columns spanning the grid, e.g. cube_axes_cshock.
+        output_dir (str): Directory where the cube is written (created if needed).
+        species (list): Species stored in the cube.
+        n_ages (int): Number of ages of the common age axis.
+
+    Returns:
+        ParameterCube: Accessor of the new cube.
+
+    Raises:
+        ValueError: If two runs have the same parameters, i.e. the axes do not identify the runs.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    df          = df.sort_values(['run_id', 'age'], kind="stable")
+    axis_values = {axis: np.sort(df[axis].unique()) for axis in axes}
+    stage_names = sorted(df['stage'].unique())
+    ages        = common_age_axis(df, n_ages)
+
+    # Position of every run in the grid
+    runs = df.drop_duplicates('run_id')
+    cell = tuple(np.searchsorted(axis_values[axis], runs[axis].to_numpy()) for axis in axes)
+    if len(set(zip(*cell))) != len(runs):
+        raise ValueError(f"The axes {axes} do not identify the runs uniquely - add the missing parameter to the axes.")
+
+    grid_shape = tuple(len(axis_values[axis]) for axis in axes)
+    cube  = np.lib.format.open_memmap(output_dir / CUBE_FILE, mode="w+", dtype=np.float32,
+                                      shape=grid_shape + (n_ages, len(species)))
+    stage = np.lib.format.open_memmap(output_dir / STAGE_FILE, mode="w+", dtype=np.int8,
+                                      shape=grid_shape + (n_ages,))
+    mask  = np.zeros(grid_shape, dtype=bool)
+    cube[...]  = np.nan
+    stage[...] = -1
+
+    # Row range of every run in the sorted table
+    run_ids = df['run_id'].to_numpy()
+    starts  = np.flatnonzero(np.r_[True, run_ids[1:] != run_ids[:-1]])
+    stops   = np.r_[starts[1:], len(df)]
+    values  = df[species].to_numpy(dtype=float)
+    age     = df['age'].to_numpy(dtype=float)
+    codes   = pd.Categorical(df['stage'], categories=stage_names).codes.astype(np.int8)
+
+    for i, (start, stop) in enumerate(zip(starts, stops)):
+        position = tuple(index[i] for index in cell)
+        cube[position]  = resample_run(age[start:stop], values[start:stop], ages)
+        # Stage of the last model timestep at or before each resampled age
+        previous        = np.clip(np.searchsorted(age[start:stop], ages, side="right") - 1, 0, stop - start - 1)
+        stage[position] = codes[start:stop][previous]
+        mask[position]  = True
+
+    cube.flush()
+    stage.flush()
+    np.save(output_dir / MASK_FILE, mask)
+    with open(output_dir / METADATA_FILE, "w") as file:
+        json.dump({
+            'axes': {axis: axis_values[axis].tolist() for axis in axes},
+            'ages': ages.tolist(),
+            'species': list(species),
+            'stages': stage_names,
+        }, file, indent=1)
+    return ParameterCube(output_dir)
+
+
+class ParameterCube:
+    """
+    Read-only accessor of a parameter cube written by build_parameter_cube.
+
+    The arrays are memory-mapped, so opening a cube is instantaneous and a slice only reads the requested elements.
+
+    Example:
+        cube = ParameterCube(cshock_cube_dir)
+        # CH3OH versus age for every zeta, at fixed shock velocity, density, FUV field and temperature
+        values, coords = cube.slice(species="CH3OH", shock_vel=20., initialDens=1e5, radfield=100., initialTemp=15.)
+    """
+
+    def __init__(self, directory):
+        directory = Path(directory)
+        with open(directory / METADATA_FILE) as file:
+            metadata = json.load(file)
+        self.axes    = {axis: np.array(values) for axis, values in metadata['axes'].items()}
+        self.ages    = np.array(metadata['ages'])
+        self.species = metadata['species']
+        self.stages  = metadata['stages']
+        self.cube    = np.load(directory / CUBE_FILE, mmap_mode="r")
+        self.stage   = np.load(directory / STAGE_FILE, mmap_mode="r")
+        self.mask    = np.load(directory / MASK_FILE)
+
+    def _positions(self, axis_values, selection, name):
+        """Positions of the selected values along one axis; None selects all of them."""
+        if selection is None:
+            return np.arange(len(axis_values)), True
+        scalar   = np.ndim(selection) == 0
+        wanted   = np.atleast_1d(np.asarray(selection, dtype=float))
+        position = np.searchsorted(axis_values, wanted)
+        position = np.clip(position, 0, len(axis_values) - 1)
+        if not np.allclose(axis_values[position], wanted):
+            raise ValueError(f"Value(s) {selection} not on the '{name}' axis {axis_values.tolist()}.")
+        return position, not scalar
+
+    def _age_positions(self, age):
+        """Positions on the age axis: None for all ages, a number for the nearest age, a (min, max) tuple for a range."""
+        if age is None:
+            return np.arange(len(self.ages)), True
+        if isinstance(age, tuple):
+            return np.flatnonzero((self.ages >= age[0]) & (self.ages <= age[1])), True
+        return np.array([np.argmin(np.abs(np.log10(self.ages) - np.log10(age)))]), False
+
+    def _select(self, age, parameters):
+        """Positions along the parameter and age axes, which dimensions are kept, and their coordinates."""
+        unknown = set(parameters) - set(self.axes)
+        if unknown:
+            raise ValueError(f"Unknown parameter(s) {sorted(unknown)}; the axes are {list(self.axes)}.")
+
+        positions, keep, coords = [], [], {}
+        for axis, axis_values in self.axes.items():
+            position, kept = self._positions(axis_values, parameters.get(axis), axis)
+            positions.append(position)
+            keep.append(kept)
+            if kept:
+                coords[axis] = axis_values[position]
+
+        position, kept = self._age_positions(age)
+        positions.append(position)
+        keep.append(kept)
+        if kept:
+            coords['age'] = self.ages[position]
+        return positions, keep, coords
+
+    def slice(self, species=None, age=None, **parameters):
+        """
+        Read a slice of the cube.
+
+        Args:
+            species (str or list): Species to read (all if None). A single name drops the species dimension.
+            age (float or tuple): Nearest age to a value, or all ages within a (min, max) range (all if None).
+                                  A single value drops the age dimension.
+            **parameters: Value, or list of values, of each grid parameter (all values if omitted).
+                          A single value drops that dimension.
+
+        Returns:
+            tuple: (values, coords) - the array of abundances (NaN where no model exists) and a dictionary
+                   with the coordinates of every remaining dimension, in order.
+        """
+        positions, keep, coords = self._select(age, parameters)
+
+        names = self.species if species is None else np.atleast_1d(species).tolist()
+        positions.append(np.array([self.species.index(name) for name in names]))
+        keep.append(species is None or np.ndim(species) > 0)
+        if keep[-1]:
+            coords['species'] = names
+
+        # A single gather reads exactly the requested elements from the memory-mapped file
+        values = np.asarray(self.cube[np.ix_(*positions)])
+        values = values.reshape([len(p) for p, k in zip(positions, keep) if k])
+        return values, coords
+
+    def stage_slice(self, age=None, **parameters):
+        """
+        Stage names at the selected grid cells and ages, with the same selection rules as slice().
+
+        Returns:
+            tuple: (stages, coords) - an array of stage names ('' where no model exists) and the coordinates.
+        """
+        positions, keep, coords = self._select(age, parameters)
+        codes  = np.asarray(self.stage[np.ix_(*positions)])
+        codes  = codes.reshape([len(p) for p, k in zip(positions, keep) if k])
+        stages = np.array(self.stages + [''], dtype=object)[codes]
+        return stages, coords
+
+
+# Build the cubes from the existing pickle files
+if __name__ == "__main__":
+    for pkl, axes, cube_dir in [(cshock_pkl, cube_axes_cshock, cshock_cube_dir),
+                                (hotcore_pkl, cube_axes_hotcore, hotcore_cube_dir)]:
+        with open(pkl, 'rb') as file:
+            model_df = pickle.load(file)
+        build_parameter_cube(model_df, axes, cube_dir)
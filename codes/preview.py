@@ -0,0 +1,96 @@
+# File: CMZ_data_explorer/preview.py
+# -*- coding: utf-8 -*-
+"""
+This module contains the progressive rendering of the abundance plot of the visualization apps
+(Shocks.py and Protostellar_objects.py): a quick preview is drawn first, and replaced by the full plot
+when it is ready.
+
+When the data is loaded, a fixed-size sample of every stage table is kept: the rows of the coarsest level
+of detail (see level_of_detail.py), i.e. about LOD_BASE_BINS timesteps of every run, thinned evenly to at
+most PREVIEW_MAX_ROWS rows. The preview of a selection filters this sample instead of the stage table and
+plots its rows (or, for aggregated plots, their coarse envelope), so the time it takes is bounded by
+PREVIEW_MAX_ROWS, whatever the size of the selection. The preview callback of the apps runs in the
+request and returns first; the full update of the abundance plot (possibly a background job) only starts
+once the preview has been sent, and replaces it.
+
+Selections of fewer than PREVIEW_MIN_POINTS points (rows x species), and selections whose full plot is
+cached, are plotted directly, without a preview.
+"""
+# Import necessary libraries
+import numpy as np
+from config import PREVIEW_MAX_ROWS
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+class PreviewSample:
+    """
+    Fixed-size sample of a stage table for the preview of a selection.
+
+    Example:
+        sample = PreviewSample(shock_df, lod_by_stage["shock"], model_parameters)
+        positions = sample.select(selection)   # positions in shock_df of the sampled rows of the selection
+    """
+
+    def __init__(self, df, levels, parameters, max_rows=PREVIEW_MAX_ROWS):
+        """
+        Args:
+            df (pd.DataFrame): Stage table.
+            levels (np.ndarray): Level of detail of its rows (output of lod_levels).
+            parameters (list): Parameter columns filtered by the selections.
+            max_rows (int): Maximum number of rows of the sample.
+        """
+        positions = np.flatnonzero(levels == 0)
+        if len(positions) > max_rows:
+            # The rows are in run and time order: keep every n-th one, so that all the runs keep some timesteps
+            positions = positions[np.linspace(0, len(positions) - 1, max_rows).astype(np.int64)]
+        self.positions  = positions
+        self.parameters = {parameter: df[parameter].to_numpy()[positions] for parameter in parameters}
+
+    def __len__(self):
+        return len(self.positions)
+
+    def select(self, selection):
+        """
+        Sampled rows of a selection.
+
+        Args:
+            selection (dict): Selected values of each filtered parameter, e.g. {'zeta': [10., 100.], ...}.
+
+        Returns:
+            np.ndarray: Positions of the rows in the stage table, in table order.
+        """
+        mask = np.ones(len(self.positions), dtype=bool)
+        for parameter, values in selection.items():
+            mask &= np.isin(self.parameters[parameter], list(values or []))
+        return self.positions[mask]
+
+def preview_figure(fig):
+    """
+    Mark a figure as a preview: its title says so, and it can neither be zoomed nor hovered until it is
+    replaced by the full plot (the callbacks of zooming and hovering read the previous selection until then).
+
+    Args:
+        fig (plotly.graph_objects.Figure): Figure drawn from the sampled rows.
+
+    Returns:
+        plotly.graph_objects.Figure: The same figure.
+    """
+    fig.update_layout(title_text=f"{fig.layout.title.text or ''} (preview)", dragmode=False, hovermode=False)
+    fig.update_xaxes(fixedrange=True)
+    fig.update_yaxes(fixedrange=True)
+    return fig
+
+def preview_message(n_shown, n_rows):
+    """
+    Notice shown below the abundance plot while the full plot is computed.
+
+    Args:
+        n_shown (int): Number of plotted rows of the preview.
+        n_rows (int): Estimated number of rows of the selection.
+
+    Returns:
+        str: The notice.
+    """
+    return f"⏳ Preview of {n_shown:,} of the {n_rows:,} timesteps of this selection - the full plot is on its way."
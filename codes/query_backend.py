@@ -0,0 +1,531 @@
+# File: CMZ_data_explorer/query_backend.py
+# -*- coding: utf-8 -*-
+"""
+This module contains the query backends of the visualization apps (Shocks.py and Protostellar_objects.py):
+filtering a stage table by the selected parameter values, projecting the needed columns, computing
+abundance ratios and the binned percentiles of the envelope plot mode.
+
+The backend is selected with QUERY_BACKEND in config.py:
+
+    "pandas"    boolean masks over the in-memory stage tables (the reference implementation),
+    "numpy"     NumPy comparisons over read-only copies of the columns that release the GIL, for the
+                threaded serving mode (see column_store.py and serving.py),
+    "duckdb"    SQL queries run by DuckDB - vectorized, multithreaded scans of a columnar database file;
+                needs: pip install duckdb
+    "sqlite"    SQL queries run by SQLite (part of Python) - single-threaded, no extra dependency.
+
+The SQL backends read a database file written next to the pickle file (e.g. cshock.duckdb) the first
+time the app starts, and again whenever the pickle file is newer. Every process and thread opens its own
+read-only connection, so they can be used from background jobs and threaded servers.
+
+Every backend returns the same tables as the pandas one; this is checked with:
+
+    python query_backend.py
+"""
+# Import necessary libraries
+import abc
+import copy
+import importlib.util
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from aggregation import binned_percentiles
+from column_store import ColumnStore
+from ratios import normalize_pairs, ratio_name, ratios_long_table
+from config import QUERY_BACKEND, QUERY_THREADS, AGGREGATE_N_BINS, AGGREGATE_PERCENTILES
+
+# Extension of the database file of each SQL backend
+DATABASE_SUFFIXES = {"duckdb": ".duckdb", "sqlite": ".sqlite"}
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+def _quote(name):
+    """SQL identifier, e.g. '#CH3OH' -> '"#CH3OH"'."""
+    return '"' + str(name).replace('"', '""') + '"'
+
+def _literal(text):
+    """SQL string literal, e.g. "A/B" -> "'A/B'"."""
+    return "'" + str(text).replace("'", "''") + "'"
+
+def _python_value(value):
+    """Plain Python value of a (possibly NumPy) scalar, for binding to an SQL query."""
+    return value.item() if hasattr(value, "item") else value
+
+def query_database_path(data_path, backend):
+    """
+    Database file of a SQL backend, next to the data file, e.g. cshock.pkl -> cshock.duckdb.
+
+    Args:
+        data_path (str): Pickle file of the app.
+        backend (str): 'duckdb' or 'sqlite'.
+
+    Returns:
+        str: Path of the database file.
+    """
+    return os.path.splitext(data_path)[0] + DATABASE_SUFFIXES[backend]
+
+def write_database(tables, path, backend):
+    """
+    Write the stage tables to a database file, replacing it atomically.
+
+    Args:
+        tables (dict): Stage tables by name, e.g. {'shock': shock_df, 'postshock': postshock_df}.
+        path (str): Path of the database file.
+        backend (str): 'duckdb' or 'sqlite'.
+    """
+    temporary = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(temporary):
+        os.remove(temporary)
+    if backend == "duckdb":
+        import duckdb
+        connection = duckdb.connect(temporary)
+        for name, df in tables.items():
+            # The rows keep their order, so rowid is the position of a row in the stage table
+            connection.register("stage_table", df)
+            connection.execute(f"CREATE TABLE {_quote(name)} AS SELECT * FROM stage_table")
+            connection.unregister("stage_table")
+    else:
+        connection = sqlite3.connect(temporary)
+        for name, df in tables.items():
+            df.to_sql(name, connection, index=False, chunksize=10000)
+        connection.commit()
+    connection.close()
+    os.replace(temporary, path)
+
+
+class QueryBackend:
+    """
+    Queries of the stage tables of an app with pandas boolean masks. The SQL backends derive from it.
+
+    A selection is a dict of the selected values of some parameters, e.g. {'zeta': [10., 100.], ...};
+    a parameter that is not in the selection is not filtered.
+
+    Example:
+        query = make_query_backend({"shock": shock_df, "postshock": postshock_df}, cshock_pkl)
+        df = query.select("shock", selection, ["age", "run_id", "CH3OH"])
+    """
+    name = "pandas"
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.dtypes = {name: df.dtypes for name, df in tables.items()}
+
+    def with_columns(self, tables, columns):
+        """
+        Backend of the stage tables extended with new columns, e.g. species read from their column files.
+
+        Args:
+            tables (dict): Stage tables by name, row for row the same as self.tables, with the new columns.
+            columns (list): The new columns.
+
+        Returns:
+            QueryBackend: A new backend of the same type; this one is not changed, so the queries running on it
+                          are not affected.
+        """
+        query        = copy.copy(self)
+        query.tables = tables
+        query.dtypes = {name: df.dtypes for name, df in tables.items()}
+        return query
+
+    def _mask(self, table, selection, age_range=None):
+        """Rows of a stage table within the selection (and the age range)."""
+        df   = self.tables[table]
+        mask = np.ones(len(df), dtype=bool)
+        for parameter, values in selection.items():
+            mask &= df[parameter].isin(values or []).to_numpy()
+        if age_range is not None:
+            mask &= df["age"].between(*age_range).to_numpy()
+        return mask
+
+    def select(self, table, selection, columns=None, age_range=None):
+        """
+        Rows of a stage table within a selection.
+
+        Args:
+            table (str): Stage table, e.g. 'postshock'.
+            selection (dict): Selected values of each filtered parameter.
+            columns (list): Columns to return, in this order (all if None).
+            age_range (tuple): (min, max) age [yr] of the rows (optional).
+
+        Returns:
+            pd.DataFrame: The rows in table order; the index is the position of a row in the stage table.
+        """
+        df = self.tables[table]
+        df = df[self._mask(table, selection, age_range)]
+        return df if columns is None else df[list(columns)]
+
+    def ratios_long_table(self, table, selection, pairs, id_columns):
+        """
+        Long table of abundance ratios of a selection (see ratios.ratios_long_table).
+
+        Args:
+            table (str): Stage table.
+            selection (dict): Selected values of each filtered parameter.
+            pairs (iterable): Iterable of (numerator, denominator) tuples.
+            id_columns (list): Columns copied to every ratio.
+
+        Returns:
+            pd.DataFrame: Long table of ratios.
+        """
+        species = list(dict.fromkeys(name for pair in normalize_pairs(pairs) for name in pair))
+        columns = list(dict.fromkeys(list(id_columns) + species))
+        return ratios_long_table(self.select(table, selection, columns), pairs, id_columns)
+
+    def binned_percentiles(self, table, selection, species, n_bins=AGGREGATE_N_BINS,
+                           percentiles=AGGREGATE_PERCENTILES, group_columns=()):
+        """
+        Binned percentiles of a selection (see aggregation.binned_percentiles).
+
+        Args:
+            table (str): Stage table.
+            selection (dict): Selected values of each filtered parameter.
+            species, n_bins, percentiles, group_columns: As for aggregation.binned_percentiles.
+
+        Returns:
+            pd.DataFrame: Long table of percentiles per age bin.
+        """
+        columns = list(dict.fromkeys(["age", "run_id"] + list(group_columns) + list(species)))
+        return binned_percentiles(self.select(table, selection, columns), species, n_bins, percentiles, group_columns)
+
+
+class ArrayBackend(QueryBackend):
+    """Queries of read-only column stores of the stage tables (see column_store.py)."""
+    name = "numpy"
+
+    def __init__(self, tables):
+        super().__init__(tables)
+        self.stores = {name: ColumnStore(df) for name, df in tables.items()}
+
+    def with_columns(self, tables, columns):
+        query = super().with_columns(tables, columns)
+        # Only the new columns are stored; the others are shared with this backend
+        query.stores = {name: store.with_columns(tables[name], columns) for name, store in self.stores.items()}
+        return query
+
+    def select(self, table, selection, columns=None, age_range=None):
+        store     = self.stores[table]
+        positions = np.flatnonzero(store.mask(selection, age_range))
+        return store.take(positions, list(self.tables[table].columns if columns is None else columns))
+
+
+class SQLBackend(QueryBackend, abc.ABC):
+    """
+    Queries of the stage tables as SQL over a database file (see write_database).
+
+    Columns added while the app runs (see with_columns) are not written to the database, which other processes
+    may be reading: the queries that need them are run with pandas on the stage tables, until the database is
+    written again with the next version of the data.
+    """
+
+    def __init__(self, tables, path):
+        super().__init__(tables)
+        self.path   = path
+        self._local = threading.local()
+        # Columns of the stage tables that are not in the database file
+        self.memory_columns = frozenset()
+
+    @abc.abstractmethod
+    def _connect(self):
+        """Open a new read-only connection to the database file."""
+
+    def with_columns(self, tables, columns):
+        query = super().with_columns(tables, columns)
+        query.memory_columns = self.memory_columns | set(columns)
+        return query
+
+    def _in_database(self, columns):
+        """Whether all the columns are in the database file."""
+        return self.memory_columns.isdisjoint(columns)
+
+    def matches_tables(self):
+        """
+        Whether the database file has the columns and the number of rows of every stage table.
+
+        Returns:
+            bool: False if the file has to be rewritten.
+        """
+        connection = self._connect()
+        try:
+            for name, df in self.tables.items():
+                cursor = connection.execute(f"SELECT * FROM {_quote(name)} LIMIT 0")
+                if [description[0] for description in cursor.description] != list(df.columns):
+                    return False
+                if connection.execute(f"SELECT count(*) FROM {_quote(name)}").fetchone()[0] != len(df):
+                    return False
+            return True
+        except Exception:
+            return False
+        finally:
+            connection.close()
+
+    def _connection(self):
+        """Connection of the current thread and process, opened on first use."""
+        if getattr(self._local, "pid", None) != os.getpid():
+            self._local.connection = self._connect()
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def _query(self, sql, parameters=()):
+        """Run a query and return the result as a DataFrame."""
+        cursor  = self._connection().execute(sql, list(parameters))
+        columns = [description[0] for description in cursor.description]
+        return pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+
+    def _row_position(self):
+        """SQL expression of the position of a row in its stage table."""
+        return "rowid"
+
+    def _where(self, selection, age_range=None):
+        """WHERE clause of a selection, with its parameters."""
+        conditions, parameters = [], []
+        for parameter, values in selection.items():
+            values = list(values or [])
+            if not values:
+                conditions.append("1 = 0")
+                continue
+            conditions.append(f"{_quote(parameter)} IN ({', '.join('?' * len(values))})")
+            parameters.extend(_python_value(value) for value in values)
+        if age_range is not None:
+            conditions.append('"age" BETWEEN ? AND ?')
+            parameters.extend(float(value) for value in age_range)
+        return " AND ".join(conditions) or "1 = 1", parameters
+
+    def _restore_types(self, table, df, columns):
+        """Give the columns of a query result the types of the stage table."""
+        return df.astype({column: self.dtypes[table][column] for column in columns})
+
+    def select(self, table, selection, columns=None, age_range=None):
+        columns = list(self.tables[table].columns if columns is None else columns)
+        if not self._in_database(columns):
+            return super().select(table, selection, columns, age_range)
+        where, parameters = self._where(selection, age_range)
+        df = self._query(
+            f"SELECT {self._row_position()} AS _row, {', '.join(map(_quote, columns))} "
+            f"FROM {_quote(table)} WHERE {where} ORDER BY _row",
+            parameters,
+        )
+        df = self._restore_types(table, df.set_index("_row"), columns)
+        df.index.name = None
+        return df
+
+    def ratios_long_table(self, table, selection, pairs, id_columns):
+        pairs   = normalize_pairs(pairs)
+        species = list(dict.fromkeys(name for pair in pairs for name in pair))
+        columns = list(dict.fromkeys(list(id_columns) + species))
+        if not self._in_database(columns):
+            return super().ratios_long_table(table, selection, pairs, id_columns)
+        where, parameters = self._where(selection)
+
+        # One SELECT per ratio over the selected rows; zero (or negative) denominators give NULL (NaN)
+        ids   = ", ".join(map(_quote, id_columns))
+        parts = []
+        for k, (numerator, denominator) in enumerate(pairs):
+            x_numerator, x_denominator = (f"CAST({_quote(name)} AS DOUBLE)" for name in (numerator, denominator))
+            parts.append(
+                f"SELECT {k} AS _pair, _row, {ids + ', ' if ids else ''}"
+                f"{_literal(ratio_name(numerator, denominator))} AS ratio_name, {_literal(numerator)} AS numerator, "
+                f"{_literal(denominator)} AS denominator, {x_numerator} AS X_numerator, {x_denominator} AS X_denominator, "
+                f"CASE WHEN {x_denominator} > 0 THEN {x_numerator} / {x_denominator} END AS ratio FROM selected"
+            )
+        df = self._query(
+            f"WITH selected AS (SELECT {self._row_position()} AS _row, {', '.join(map(_quote, columns))} "
+            f"FROM {_quote(table)} WHERE {where}) "
+            + " UNION ALL ".join(parts) + " ORDER BY _pair, _row",
+            parameters,
+        )
+        df = df.drop(columns=["_pair", "_row"]).astype({"X_numerator": float, "X_denominator": float, "ratio": float})
+        return self._restore_types(table, df, id_columns).reset_index(drop=True)
+
+
+class SQLiteBackend(SQLBackend):
+    """SQL backend run by SQLite. SQLite has no percentiles, so the envelope is computed with pandas."""
+    name = "sqlite"
+
+    def _connect(self):
+        return sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+
+    def _row_position(self):
+        # SQLite counts rows from 1
+        return "(rowid - 1)"
+
+
+class DuckDBBackend(SQLBackend):
+    """SQL backend run by DuckDB, which also computes the binned percentiles of the envelope."""
+    name = "duckdb"
+
+    def _connect(self):
+        import duckdb
+        return duckdb.connect(self.path, read_only=True, config={"threads": QUERY_THREADS} if QUERY_THREADS else {})
+
+    def _query(self, sql, parameters=()):
+        return self._connection().execute(sql, list(parameters)).df()
+
+    def binned_percentiles(self, table, selection, species, n_bins=AGGREGATE_N_BINS,
+                           percentiles=AGGREGATE_PERCENTILES, group_columns=()):
+        group_columns = list(group_columns)
+        if not self._in_database(group_columns + list(species)):
+            return super().binned_percentiles(table, selection, species, n_bins, percentiles, group_columns)
+        where, parameters = self._where(selection)
+        where += ' AND "age" > 0' + "".join(f" AND {_quote(column)} IS NOT NULL" for column in group_columns)
+
+        low, high = self._connection().execute(
+            f'SELECT min(log10("age")), max(log10("age")) FROM {_quote(table)} WHERE {where}', parameters
+        ).fetchone()
+        if low is None:
+            return pd.DataFrame(columns=group_columns + ['age', 'species', 'lower', 'median', 'upper', 'runs'])
+        edges   = np.linspace(low, high + 1e-9, n_bins + 1)
+        centers = 10 ** (0.5 * (edges[:-1] + edges[1:]))
+
+        # Same bins as np.searchsorted(edges, log_age, side="right") - 1; NaN abundances are ignored, as by pandas.
+        # Every run is reduced to its median in each bin, then the percentiles are taken across the runs
+        groups    = "".join(_quote(column) + ", " for column in group_columns)
+        fractions = ", ".join(str(p / 100) for p in percentiles)
+        values    = ", ".join(f"CASE WHEN isnan({_quote(name)}) THEN NULL ELSE {_quote(name)} END AS {_quote(name)}"
+                              for name in species)
+        df = self._query(
+            f"WITH selected AS (SELECT {groups}\"run_id\", log10(\"age\") AS log_age, {values} "
+            f"FROM {_quote(table)} WHERE {where}), "
+            f"bins AS (SELECT unnest(?::INTEGER[]) AS age_bin, unnest(?::DOUBLE[]) AS low, unnest(?::DOUBLE[]) AS high), "
+            f"per_run AS (SELECT {groups}age_bin, "
+            + ", ".join(f"median({_quote(name)}) AS {_quote(name)}" for name in species)
+            + " FROM selected JOIN bins ON log_age >= low AND log_age < high "
+            f"GROUP BY {groups}\"run_id\", age_bin) "
+            f"SELECT {groups}age_bin, count(*) AS runs, "
+            + ", ".join(f"quantile_cont({_quote(name)}, [{fractions}]) AS {_quote(name)}" for name in species)
+            + f" FROM per_run GROUP BY {groups}age_bin",
+            parameters + [list(range(n_bins)), edges[:-1].tolist(), edges[1:].tolist()],
+        )
+
+        parts = []
+        for name in species:
+            quantiles = np.array([value if value is not None and len(value) else [np.nan] * 3 for value in df[name]],
+                                 dtype=float).reshape(len(df), 3)
+            part = df[group_columns + ['age_bin']].copy()
+            part['species'] = name
+            part[['lower', 'median', 'upper']] = quantiles
+            part['runs'] = df['runs'].astype(np.int64)
+            parts.append(part)
+        table_df = pd.concat(parts, ignore_index=True)
+        table_df = self._restore_types(table, table_df, group_columns)
+        table_df = table_df.sort_values(group_columns + ['age_bin'], kind="stable").sort_values(
+            'species', key=lambda column: column.map({name: i for i, name in enumerate(species)}), kind="stable")
+        table_df.insert(len(group_columns), 'age', centers[table_df.pop('age_bin').to_numpy()])
+        return table_df.reset_index(drop=True)
+
+
+def make_query_backend(tables, data_path, backend=QUERY_BACKEND):
+    """
+    Create the query backend of an app, writing its database file if needed.
+
+    Args:
+        tables (dict): Stage tables by name, e.g. {'shock': shock_df, 'postshock': postshock_df}.
+        data_path (str): Pickle file (or memory-mapped store, see mapped_store.py) of the app; the database is
+                         rewritten when it is newer.
+        backend (str): 'pandas', 'numpy', 'duckdb' or 'sqlite'.
+
+    Returns:
+        QueryBackend: The backend (pandas if the SQL backend is not available).
+    """
+    if backend == "pandas":
+        return QueryBackend(tables)
+    if backend == "numpy":
+        return ArrayBackend(tables)
+    if backend not in DATABASE_SUFFIXES:
+        raise ValueError(f"Unknown query backend '{backend}'; use 'pandas', 'numpy', 'duckdb' or 'sqlite'.")
+    if backend == "duckdb" and importlib.util.find_spec("duckdb") is None:
+        warnings.warn("The duckdb query backend needs DuckDB (pip install duckdb); using pandas instead.")
+        return QueryBackend(tables)
+
+    query = (DuckDBBackend if backend == "duckdb" else SQLiteBackend)(tables, query_database_path(data_path, backend))
+    if os.path.getmtime(data_path) > (os.path.getmtime(query.path) if os.path.exists(query.path) else -1) \
+            or not query.matches_tables():
+        write_database(tables, query.path, backend)
+    return query
+
+def compare_backends(tables, selections, species, pairs, id_columns, group_columns=(),
+                     percentile_sets=(AGGREGATE_PERCENTILES,)):
+    """
+    Check that every available SQL backend returns the same tables as pandas, and time them.
+    The databases are written to a temporary directory.
+
+    Args:
+        tables (dict): Stage tables by name.
+        selections (list): (table, selection) tuples.
+        species (list): Species of the projection and of the binned percentiles.
+        pairs (list): Ratios.
+        id_columns (list): Columns of the projection and of the ratio tables.
+        group_columns (list): Groups of the binned percentiles.
+        percentile_sets (list): (lower, middle, upper) percentiles of the binned percentiles, each checked.
+
+    Returns:
+        pd.DataFrame: Time [ms] of every backend and query, summed over the selections.
+
+    Raises:
+        AssertionError: If a backend returns a different table.
+    """
+    reference = QueryBackend(tables)
+    queries = {
+        "select": lambda backend, table, selection: backend.select(table, selection, id_columns + species),
+        "ratios": lambda backend, table, selection: backend.ratios_long_table(table, selection, pairs, id_columns),
+    }
+    for percentiles in percentile_sets:
+        queries["envelope {}-{}-{}".format(*percentiles)] = (
+            lambda backend, table, selection, percentiles=percentiles: backend.binned_percentiles(
+                table, selection, species, percentiles=percentiles, group_columns=group_columns)
+        )
+    with tempfile.TemporaryDirectory() as directory:
+        data_path = os.path.join(directory, "tables.pkl")
+        open(data_path, "wb").close()
+        backends  = [reference, ArrayBackend(tables)] + [make_query_backend(tables, data_path, name)
+                                                         for name in DATABASE_SUFFIXES]
+        backends  = [backend for i, backend in enumerate(backends) if i == 0 or backend.name != "pandas"]
+
+        timings = []
+        for backend in backends:
+            for query_name, query in queries.items():
+                elapsed = 0.
+                for table, selection in selections:
+                    start    = time.perf_counter()
+                    result   = query(backend, table, selection)
+                    elapsed += time.perf_counter() - start
+                    pd.testing.assert_frame_equal(result, query(reference, table, selection), check_exact=False,
+                                                  check_index_type=False, obj=f"{backend.name} {query_name}")
+                timings.append({'backend': backend.name, 'query': query_name, 'time [ms]': 1e3 * elapsed})
+    return pd.DataFrame(timings).pivot(index='query', columns='backend', values='time [ms]')
+
+
+# Cross-check the SQL backends against pandas on random selections of the shock models
+if __name__ == "__main__":
+    import pickle
+    from functionality import ranges_cshock
+    from config import cshock_pkl
+
+    with open(cshock_pkl, 'rb') as file:
+        cshock_df = pickle.load(file)
+    stage_tables = {
+        "shock": cshock_df[cshock_df['stage'] == 'shock'].reset_index(drop=True),
+        "postshock": cshock_df[cshock_df['stage'] == 'post-shock'].reset_index(drop=True),
+    }
+    rng = np.random.default_rng(0)
+    random_selections = [
+        (table, {parameter: sorted(rng.choice(values, size=rng.integers(1, len(values) + 1), replace=False).tolist())
+                 for parameter, values in ranges_cshock.items()})
+        for table in stage_tables for _ in range(10)
+    ]
+    print(compare_backends(
+        stage_tables, random_selections,
+        species=["CH3OH", "SIO", "HNCO"],
+        pairs=[("CH3OH", "HNCO"), ("SIO", "CH3OH")],
+        id_columns=["age", "run_id", "locDens", "shock_vel", "zeta"],
+        group_columns=["zeta"],
+        # The default band, and the bands of a slider with an end at the median or above it
+        percentile_sets=[AGGREGATE_PERCENTILES, (50, 50, 84), (60, 50, 80)],
+    ).to_string(float_format="{:.1f}".format))
+    print("All backends return the same tables as pandas.")
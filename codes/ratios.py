@@ -0,0 +1,187 @@
+# File: CMZ_data_explorer/ratios.py
+# -*- coding: utf-8 -*-
+"""
+This module contains the ratio engine used by the visualization apps (Shocks.py and Protostellar_objects.py).
+It computes many abundance ratios (e.g. HNC/HCN, CH3OH/H2CO) in a single vectorized pass over only the
+species columns that are needed, caches the result per selection, and returns it either as a long table
+or as a multi-panel figure.
+"""
+# Import necessary libraries
+import numpy as np
+import pandas as pd
+import plotly.express as px
+from functionality import format_molecule_HTML
+from selection_cache import ResultCache, cache_budget
+from config import RATIO_CACHE_SIZE, RATIO_PANEL_COLUMNS, DEFAULT_OPACITY
+
+# Results of recent selections (see selection_cache.py)
+_ratio_cache = ResultCache(RATIO_CACHE_SIZE, cache_budget)
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+def ratio_name(numerator, denominator):
+    """
+    Name of a ratio column, e.g. 'HNC/HCN'.
+
+    Args:
+        numerator (str): Numerator species.
+        denominator (str): Denominator species.
+
+    Returns:
+        str: Name of the ratio.
+    """
+    return f"{numerator}/{denominator}"
+
+def normalize_pairs(pairs):
+    """
+    Clean a list of (numerator, denominator) pairs: drop incomplete pairs, pairs of identical species
+    and duplicates, keeping the order in which the pairs were given.
+
+    Args:
+        pairs (iterable): Iterable of (numerator, denominator) tuples.
+
+    Returns:
+        tuple: Tuple of unique (numerator, denominator) tuples.
+    """
+    cleaned = []
+    for numerator, denominator in pairs:
+        if not numerator or not denominator or numerator == denominator:
+            continue
+        if (numerator, denominator) not in cleaned:
+            cleaned.append((numerator, denominator))
+    return tuple(cleaned)
+
+def compute_ratios(df, pairs):
+    """
+    Compute all requested ratios at once. Only the species taking part in the ratios are read from
+    the DataFrame. Zero (or negative) denominators give NaN instead of infinities.
+
+    Args:
+        df (pd.DataFrame): DataFrame containing the species columns.
+        pairs (iterable): Iterable of (numerator, denominator) tuples.
+
+    Returns:
+        pd.DataFrame: One column per ratio, sharing the index of df.
+    """
+    pairs   = normalize_pairs(pairs)
+    species = list(dict.fromkeys(name for pair in pairs for name in pair))
+    column  = {name: i for i, name in enumerate(species)}
+
+    values      = df[species].to_numpy(dtype=float)
+    numerators  = values[:, [column[numerator] for numerator, _ in pairs]]
+    denominator = values[:, [column[denominator] for _, denominator in pairs]]
+
+    ratios = np.full(numerators.shape, np.nan)
+    np.divide(numerators, denominator, out=ratios, where=denominator > 0)
+    return pd.DataFrame(ratios, index=df.index, columns=[ratio_name(*pair) for pair in pairs])
+
+def ratios_long_table(df, pairs, id_columns):
+    """
+    Compute all requested ratios and return them as a long (tidy) table with one row per
+    (data point, ratio). Besides the id columns, the table holds the ratio name, both species,
+    their abundances and the ratio itself.
+
+    Args:
+        df (pd.DataFrame): DataFrame containing the species and id columns.
+        pairs (iterable): Iterable of (numerator, denominator) tuples.
+        id_columns (list): Columns copied from df to every ratio (e.g. 'age', 'run_id').
+
+    Returns:
+        pd.DataFrame: Long table of ratios.
+    """
+    pairs    = normalize_pairs(pairs)
+    n_rows   = len(df)
+    n_ratios = len(pairs)
+
+    ratios       = compute_ratios(df, pairs).to_numpy()
+    numerators   = [numerator for numerator, _ in pairs]
+    denominators = [denominator for _, denominator in pairs]
+
+    long_table = {column: np.tile(df[column].to_numpy(), n_ratios) for column in id_columns}
+    long_table["ratio_name"]    = np.repeat([ratio_name(*pair) for pair in pairs], n_rows)
+    long_table["numerator"]     = np.repeat(numerators, n_rows)
+    long_table["denominator"]   = np.repeat(denominators, n_rows)
+    long_table["X_numerator"]   = df[numerators].to_numpy(dtype=float).ravel(order="F")
+    long_table["X_denominator"] = df[denominators].to_numpy(dtype=float).ravel(order="F")
+    long_table["ratio"]         = ratios.ravel(order="F")
+    return pd.DataFrame(long_table)
+
+def cached_ratios_long_table(selection_key, compute, pairs, id_columns):
+    """
+    Return the long ratio table of a selection, computing it only if it is not cached yet.
+    The RATIO_CACHE_SIZE most recently used results are kept.
+
+    Args:
+        selection_key (tuple): (version of the data, description of the selection), see DataEngine.selection_key.
+        compute (callable): Function without arguments returning the long ratio table of the selection,
+                            e.g. through a query backend (see query_backend.py). It is only called when
+                            the result is not cached.
+        pairs (iterable): Iterable of (numerator, denominator) tuples.
+        id_columns (list): Columns copied from the selection to every ratio.
+
+    Returns:
+        pd.DataFrame: Long table of ratios (see ratios_long_table). Do not modify it in place.
+    """
+    pairs = normalize_pairs(pairs)
+    key   = (selection_key, pairs, tuple(id_columns))
+    return _ratio_cache.get_or_compute(key, compute)
+
+def clear_ratio_cache(data_version=None):
+    """
+    Remove the cached ratio tables of one version of the data (see DataEngine.reload), or all of them.
+
+    Args:
+        data_version (str): Version of the data, the first item of the cache key of the table (all if None).
+    """
+    if data_version is None:
+        _ratio_cache.clear()
+    else:
+        _ratio_cache.discard(lambda key: key[0][0] == data_version)
+
+def ratio_figure(long_table, title, y_scale, marker_size, hover_data, labels, hovertemplate):
+    """
+    Plot a long ratio table as a multi-panel figure, one panel per ratio.
+
+    Args:
+        long_table (pd.DataFrame): Output of ratios_long_table.
+        title (str): Title of the figure.
+        y_scale (str): 'log' or 'linear'.
+        marker_size (int): Size of the markers.
+        hover_data (dict): Columns to show on hover, passed to px.scatter.
+        labels (dict): Labels of the columns, passed to px.scatter.
+        hovertemplate (str): Hover template of the traces.
+
+    Returns:
+        plotly.graph_objects.Figure: The multi-panel ratio figure.
+    """
+    n_ratios  = long_table["ratio_name"].nunique()
+    n_columns = min(n_ratios, RATIO_PANEL_COLUMNS)
+    n_rows    = int(np.ceil(n_ratios / n_columns))
+
+    fig = px.scatter(
+        long_table,
+        x="age",
+        y="ratio",
+        facet_col="ratio_name",
+        facet_col_wrap=n_columns,
+        facet_row_spacing=min(0.08, 0.5 / n_rows),
+        title=title,
+        log_x=True,
+        log_y=(y_scale == "log"),
+        hover_data=hover_data,
+        labels=labels,
+        height=max(500, 350 * n_rows),
+    )
+    # Ratios differ by orders of magnitude - give each panel its own y-axis
+    fig.update_yaxes(matches=None, showticklabels=True)
+    fig.for_each_annotation(lambda annotation: annotation.update(
+        text=" / ".join(format_molecule_HTML(name) for name in annotation.text.split("=", 1)[-1].split("/"))
+    ))
+    fig.update_traces(
+        marker=dict(size=marker_size, opacity=DEFAULT_OPACITY),
+        hoverlabel=dict(font_size=16),
+        hovertemplate=hovertemplate,
+    )
+    return fig
@@ -0,0 +1,78 @@
+# File: CMZ_data_explorer/run_index.py
+# -*- coding: utf-8 -*-
+"""
+This module contains the run index used by the visualization apps (Shocks.py and Protostellar_objects.py)
+to show the full time evolution of a single run.
+
+The index is built once, when the data is loaded: the rows of the full model table are ordered by run
+(keeping the time order within a run), and the range of positions of every run_id is stored, so fetching
+a run costs O(run length) instead of a scan of the whole table.
+"""
+# Import necessary libraries
+import copy
+import numpy as np
+import pandas as pd
+
+
+class RunIndex:
+    """
+    Index of the rows of every run of a long model table.
+
+    Example:
+        runs = RunIndex(cshock_df_pkl)
+        run_df = runs.rows("some_run_id")   # all stages of the run, in time order
+    """
+
+    def __init__(self, df):
+        codes, run_ids = pd.factorize(df['run_id'])
+        counts = np.bincount(codes, minlength=len(run_ids))
+        stops  = np.cumsum(counts)
+
+        self.df      = df
+        # Positions of the rows of the table, grouped by run (stable, so the time order is kept)
+        self.order   = np.argsort(codes, kind="stable").astype(np.int32 if len(df) < 2 ** 31 else np.int64)
+        # Runs and the range of each one in self.order
+        self.run_ids = np.asarray(run_ids)
+        self.starts  = stops - counts
+        self.stops   = stops
+        self.ranges  = dict(zip(run_ids, zip(self.starts.tolist(), stops.tolist())))
+
+    def with_table(self, df):
+        """
+        Index of a table with the same rows as the indexed one, e.g. with more columns, without ordering it again.
+
+        Args:
+            df (pd.DataFrame): The table, row for row the same as self.df.
+
+        Returns:
+            RunIndex: A new index; this one is not changed.
+        """
+        runs    = copy.copy(self)
+        runs.df = df
+        return runs
+
+    def __contains__(self, run_id):
+        return run_id in self.ranges
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def rows(self, run_id, columns=None):
+        """
+        All rows of a run, in time order.
+
+        Args:
+            run_id: The run.
+            columns (list): Columns to return (all if None).
+
+        Returns:
+            pd.DataFrame: The rows of the run.
+
+        Raises:
+            KeyError: If the run is not in the table.
+        """
+        start, stop = self.ranges[run_id]
+        positions   = self.order[start:stop]
+        if columns is None:
+            return self.df.iloc[positions]
+        return self.df.iloc[positions, [self.df.columns.get_loc(column) for column in columns]]
@@ -0,0 +1,201 @@
+# File: CMZ_data_explorer/run_summary.py
+# -*- coding: utf-8 -*-
+"""
+This module contains the per-run summary table of the models: for every run, stage and species,
+
+    start, end      abundance at the first and the last timestep of the stage,
+    min, peak       smallest positive and largest abundance within the stage,
+    peak_age        age of the (first) peak,
+    mean            time-averaged abundance over the stage,
+    at_offset       abundance SUMMARY_OFFSET_AGE years after the start of the stage (NaN for shorter stages),
+
+together with the run parameters and the first/last age and number of timesteps of the stage.
+
+The table is written by data_extraction.py next to the pickle files, and is small compared to the model
+table, so the apps load it in milliseconds. It can also be built from existing pickle files by running
+this module directly:
+
+    python run_summary.py
+"""
+# Import necessary libraries
+import pickle
+import warnings
+import numpy as np
+import pandas as pd
+from functionality import mol_all, cube_axes_cshock, cube_axes_hotcore
+from config import (
+                SUMMARY_OFFSET_AGE,
+                cshock_pkl,
+                hotcore_pkl,
+                cshock_summary_pkl,
+                hotcore_summary_pkl
+               )
+
+# Statistics of every (run, stage, species)
+SUMMARY_STATISTICS = ['start', 'end', 'min', 'peak', 'peak_age', 'mean', 'at_offset']
+# Columns of the per-run overview table of the apps (after the run parameters)
+OVERVIEW_COLUMNS   = ['species', 'start_age', 'end_age'] + SUMMARY_STATISTICS
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+def _segment_statistics(values, ages, starts, stops, offset_age):
+    """
+    Statistics of every segment (consecutive rows of one run and stage) for a block of species.
+
+    Args:
+        values (np.ndarray): n_rows x n_species abundances, rows ordered by segment and time.
+        ages (np.ndarray): Ages of the rows.
+        starts (np.ndarray): First row of each segment.
+        stops (np.ndarray): Row after the last one of each segment.
+        offset_age (float): Time after the start of a segment of the 'at_offset' statistic [yr].
+
+    Returns:
+        dict: n_segments x n_species array of each statistic.
+    """
+    n_rows  = len(values)
+    lengths = stops - starts
+    start_age, end_age = ages[starts], ages[stops - 1]
+
+    # NaN-ignoring extremes; the minimum only counts values that can be shown on a logarithmic axis
+    peak = np.fmax.reduceat(values, starts, axis=0)
+    low  = np.fmin.reduceat(np.where(values > 0, values, np.nan), starts, axis=0)
+
+    # First row of each segment reaching the peak
+    is_peak  = values == np.repeat(peak, lengths, axis=0)
+    first    = np.minimum.reduceat(np.where(is_peak, np.arange(n_rows)[:, None], n_rows), starts, axis=0)
+    peak_age = np.where(first < n_rows, ages[np.minimum(first, n_rows - 1)], np.nan)
+
+    # Time average with the trapezoidal rule - the last row of a segment does not connect to the next segment
+    contributions = np.zeros_like(values)
+    contributions[:-1] = 0.5 * (values[:-1] + values[1:]) * np.diff(ages)[:, None]
+    contributions[stops - 1] = 0.
+    span = (end_age - start_age)[:, None]
+    mean = np.divide(np.add.reduceat(contributions, starts, axis=0), span,
+                     out=values[starts].copy(), where=span > 0)
+
+    # Last row of each segment at or before start + offset_age
+    target    = start_age + offset_age
+    count     = np.add.reduceat((ages <= np.repeat(target, lengths)).astype(np.int64), starts)
+    at_offset = np.where((end_age >= target)[:, None], values[starts + count - 1], np.nan)
+
+    return {
+        'start': values[starts],
+        'end': values[stops - 1],
+        'min': low,
+        'peak': peak,
+        'peak_age': peak_age,
+        'mean': mean,
+        'at_offset': at_offset,
+    }
+
+def summarize_runs(df, parameters, species=mol_all, offset_age=SUMMARY_OFFSET_AGE, chunk_size=16):
+    """
+    Per-run, per-stage summary of every species of a long model table, computed with vectorized reductions.
+    Stages that occur in several separate intervals of a run are summarized together.
+
+    Args:
+        df (pd.DataFrame): Long model table (one row per run and timestep, in time order within a run).
+        parameters (list): Parameter columns of the runs, e.g. cube_axes_cshock.
+        species (list): Species to summarize.
+        offset_age (float): Time after the start of a stage of the 'at_offset' statistic [yr].
+        chunk_size (int): Number of species processed at once (limits the memory used).
+
+    Returns:
+        pd.DataFrame: One row per (run, stage, species) with the columns 'run_id', 'stage', the parameters,
+                      'start_age', 'end_age', 'n_steps', 'species' and the SUMMARY_STATISTICS.
+    """
+    run_code, _   = pd.factorize(df['run_id'])
+    stage_code, _ = pd.factorize(df['stage'])
+    # Rows grouped by run and stage; the sort is stable, so the time order is kept
+    order  = np.lexsort((stage_code, run_code))
+    keys   = run_code[order].astype(np.int64) * (stage_code.max() + 1) + stage_code[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    stops  = np.r_[starts[1:], len(keys)]
+    ages   = df['age'].to_numpy(dtype=float)[order]
+
+    segments = df.iloc[order[starts]][['run_id', 'stage'] + list(parameters)].reset_index(drop=True)
+    segments['start_age'] = ages[starts]
+    segments['end_age']   = ages[stops - 1]
+    segments['n_steps']   = stops - starts
+
+    blocks = []
+    for first in range(0, len(species), chunk_size):
+        chunk  = list(species[first:first + chunk_size])
+        values = df[chunk].to_numpy(dtype=float)[order]
+        statistics = _segment_statistics(values, ages, starts, stops, offset_age)
+
+        # Long format: all segments of the first species of the chunk, then of the second, ...
+        block = segments.iloc[np.tile(np.arange(len(segments)), len(chunk))].reset_index(drop=True)
+        block['species'] = np.repeat(chunk, len(segments))
+        for name in SUMMARY_STATISTICS:
+            block[name] = statistics[name].T.ravel()
+        blocks.append(block)
+
+    summary = pd.concat(blocks, ignore_index=True)
+    for column in ['run_id', 'stage', 'species']:
+        summary[column] = summary[column].astype('category')
+    return summary
+
+def load_run_summary(path, df, parameters):
+    """
+    Load the summary table written by data_extraction.py, or compute it if the file does not exist.
+
+    Args:
+        path (str): Pickle file of the summary.
+        df (pd.DataFrame): Long model table, used if the file does not exist.
+        parameters (list): Parameter columns of the runs.
+
+    Returns:
+        pd.DataFrame: Output of summarize_runs.
+    """
+    try:
+        with open(path, 'rb') as file:
+            return pickle.load(file)
+    except FileNotFoundError:
+        warnings.warn(f"No run summary at {path}; computing it now (run 'python run_summary.py' to store it).")
+        return summarize_runs(df, parameters)
+
+def select_summary(summary, stage, species, selection):
+    """
+    Summary rows of a selection of runs, for one stage and some species.
+
+    Args:
+        summary (pd.DataFrame): Output of summarize_runs.
+        stage (str): Stage name in the data, e.g. 'post-shock'.
+        species (list): Species.
+        selection (dict): Selected values of each parameter, e.g. {'zeta': [10., 100.], ...}.
+
+    Returns:
+        pd.DataFrame: The matching rows.
+    """
+    mask = (summary['stage'] == stage).to_numpy() & summary['species'].isin(species).to_numpy()
+    for parameter, values in selection.items():
+        mask &= summary[parameter].isin(values or []).to_numpy()
+    return summary[mask]
+
+def summary_y_range(selected_summary):
+    """
+    Range of the (positive) abundances of a selection, without reading its timesteps.
+
+    Args:
+        selected_summary (pd.DataFrame): Output of select_summary.
+
+    Returns:
+        tuple or None: (smallest positive, largest) abundance, or None if there is none.
+    """
+    low, high = selected_summary['min'].min(), selected_summary['peak'].max()
+    if not (np.isfinite(low) and np.isfinite(high)):
+        return None
+    return float(low), float(high)
+
+
+# Build the summary tables from the existing pickle files
+if __name__ == "__main__":
+    for pkl, parameters, summary_pkl in [(cshock_pkl, cube_axes_cshock, cshock_summary_pkl),
+                                         (hotcore_pkl, cube_axes_hotcore, hotcore_summary_pkl)]:
+        with open(pkl, 'rb') as file:
+            model_df = pickle.load(file)
+        with open(summary_pkl, 'wb') as file:
+            pickle.dump(summarize_runs(model_df, parameters), file)
@@ -0,0 +1,331 @@
+# File: CMZ_data_explorer/selection_cache.py
+# -*- coding: utf-8 -*-
+"""
+This module contains the selection log and the result caches of the visualization apps (Shocks.py and
+Protostellar_objects.py), and prewarms the caches when an app starts.
+
+With LOG_SELECTIONS = True in config.py, every selection of the abundance plot (stage, parameter filters
+and species, normalized so that the order in which parameter values were picked does not matter) is
+appended as one JSON line to SELECTION_LOG_FILE. When an app starts, the PREWARM_TOP_N most frequent selections of
+its model among the last PREWARM_LOG_LINES lines are computed in a background thread - the filtered rows
+and the plot with the default display settings - so the first users after a restart find the popular
+selections ready. The app serves requests while the thread runs.
+
+The caches live in the memory of the app's process. Background jobs (see background_jobs.py) are forked
+from it and start with the entries cached so far; the selections and plots they compute are kept in the job
+store (see JobResults), where the app's process finds them after the job has ended. The other caches (ratios,
+parameter sweep, timescales) are only used by callbacks that run in the request.
+
+In the low-memory mode (LOW_MEMORY_MODE in config.py, see mapped_store.py) the caches of an app share a
+budget of MEMORY_BUDGET_MB: besides the number of entries of each cache, the total size of the cached
+results is limited, and the least recently used result of any cache is dropped first.
+"""
+# Import necessary libraries
+import datetime
+import itertools
+import json
+import os
+import sys
+import threading
+import warnings
+from collections import Counter, OrderedDict, deque
+import numpy as np
+import pandas as pd
+from config import LOG_SELECTIONS, SELECTION_LOG_FILE, PREWARM_TOP_N, PREWARM_LOG_LINES, LOW_MEMORY_MODE, MEMORY_BUDGET_MB
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+def result_nbytes(result):
+    """
+    Approximate memory size of a cached result.
+
+    Args:
+        result: A table, array, figure or a container of them.
+
+    Returns:
+        int: Size in bytes.
+    """
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return int(np.sum(result.memory_usage(index=True)))
+    if isinstance(result, np.ndarray):
+        return result.nbytes
+    if isinstance(result, dict):
+        return sum(result_nbytes(value) for value in result.values())
+    if isinstance(result, (list, tuple)):
+        return sum(result_nbytes(value) for value in result)
+    if hasattr(result, 'to_plotly_json'):
+        # Figures and Dash components
+        return result_nbytes(result.to_plotly_json())
+    return sys.getsizeof(result)
+
+class CacheBudget:
+    """
+    Memory budget shared by several ResultCaches: when their results take more than the budget, the least
+    recently used result of any of them is dropped.
+
+    Example:
+        budget = CacheBudget(512)
+        selection_cache, figure_cache = ResultCache(8, budget), ResultCache(8, budget)
+    """
+
+    def __init__(self, megabytes):
+        self.max_bytes = int(megabytes * 2 ** 20)
+        self.n_bytes   = 0
+        self.caches    = []
+        # One lock for all the caches of the budget, so a result can be dropped from any of them
+        self.lock      = threading.Lock()
+        self.clock     = itertools.count()
+        os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self.lock = threading.Lock()
+        for cache in self.caches:
+            cache.lock = self.lock
+
+    def add(self, cache):
+        """Share the budget with a cache."""
+        with self.lock:
+            self.caches.append(cache)
+        return self.lock
+
+    def enforce(self):
+        """Drop the least recently used results until the budget is met (the lock must be held)."""
+        while self.n_bytes > self.max_bytes:
+            oldest = [cache for cache in self.caches if cache.entries]
+            if not oldest:
+                break
+            min(oldest, key=lambda cache: cache.used[next(iter(cache.entries))]).pop_oldest()
+
+# Marks a result that is not in the store of a cache
+_MISSING = object()
+
+# Budget of the caches in the low-memory mode (no budget otherwise: only the number of entries is limited)
+cache_budget = CacheBudget(MEMORY_BUDGET_MB) if LOW_MEMORY_MODE else None
+
+class ResultCache:
+    """
+    Thread-safe cache of the most recently used results.
+
+    Example:
+        cache = ResultCache(8, cache_budget)
+        df = cache.get_or_compute(key, lambda: query.select(stage, selection, columns))
+    """
+
+    def __init__(self, size, budget=None, shared=None):
+        """
+        Args:
+            size (int): Maximum number of results.
+            budget (CacheBudget): Memory budget shared with other caches (None for no limit on the size).
+            shared (JobResults): Store of the results computed in background jobs (see background_jobs.py),
+                                 read when a result is not in memory; None if the callbacks run in the request.
+        """
+        self.size    = size
+        self.budget  = budget
+        self.shared  = shared
+        self.entries = OrderedDict()
+        # Size and last use of every result, for the memory budget
+        self.n_bytes = {}
+        self.used    = {}
+        if budget is None:
+            self.lock = threading.Lock()
+            # A job process may be forked while another thread holds the lock
+            os.register_at_fork(after_in_child=self._reset_lock)
+        else:
+            self.lock = budget.add(self)
+
+    def _reset_lock(self):
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        """Whether the result of a key is cached (without counting as a use)."""
+        with self.lock:
+            if key in self.entries:
+                return True
+        return self.shared is not None and key in self.shared
+
+    def _touch(self, key):
+        self.entries.move_to_end(key)
+        if self.budget is not None:
+            self.used[key] = next(self.budget.clock)
+
+    def pop_oldest(self):
+        """Drop the least recently used result (the lock must be held)."""
+        key, _ = self.entries.popitem(last=False)
+        if self.budget is not None:
+            self.budget.n_bytes -= self.n_bytes.pop(key)
+            del self.used[key]
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached result of a key, computing it only if it is not cached yet.
+
+        Args:
+            key (tuple): Hashable description of the result.
+            compute (callable): Function without arguments returning the result.
+
+        Returns:
+            The result. It is shared by all the requests for the same key, so do not modify it in place.
+        """
+        with self.lock:
+            if key in self.entries:
+                self._touch(key)
+                return self.entries[key]
+
+        result = _MISSING if self.shared is None else self.shared.get(key, _MISSING)
+        if result is _MISSING:
+            result = compute()
+            if self.shared is not None:
+                self.shared.set(key, result)
+        n_bytes = result_nbytes(result) if self.budget is not None else 0
+
+        with self.lock:
+            if key in self.entries:
+                # Computed meanwhile by another thread
+                self.pop_key(key)
+            self.entries[key] = result
+            if self.budget is not None:
+                self.n_bytes[key] = n_bytes
+                self.budget.n_bytes += n_bytes
+            self._touch(key)
+            while len(self.entries) > self.size:
+                self.pop_oldest()
+            if self.budget is not None:
+                # A result larger than the whole budget is returned but not kept
+                self.budget.enforce()
+        return result
+
+    def pop_key(self, key):
+        """Drop the result of a key (the lock must be held)."""
+        self.entries.move_to_end(key, last=False)
+        self.pop_oldest()
+
+    def discard(self, matches):
+        """
+        Remove the cached results whose key matches, e.g. those of one version of the data.
+
+        Args:
+            matches (callable): Takes a key, returns True if its result is removed.
+        """
+        with self.lock:
+            for key in [key for key in self.entries if matches(key)]:
+                self.pop_key(key)
+
+    def clear(self):
+        """Remove all cached results."""
+        with self.lock:
+            while self.entries:
+                self.pop_oldest()
+
+def normalize_selection(stage, selection, species):
+    """
+    Description of a selection that does not depend on the order in which parameter values were picked.
+    The species keep their order, which sets the colors of the plot.
+
+    Args:
+        stage (str): Selected stage, e.g. 'shock'.
+        selection (dict): Selected values of each parameter, e.g. {'zeta': [100., 10.], ...}.
+        species (list): Selected species.
+
+    Returns:
+        dict: {'stage', 'filters', 'species'} with sorted parameter values, ready to be written as JSON.
+    """
+    return {
+        'stage': stage,
+        'filters': {parameter: sorted(values or []) for parameter, values in sorted(selection.items())},
+        'species': list(dict.fromkeys(species)),
+    }
+
+def log_selection(model, stage, selection, species, path=SELECTION_LOG_FILE):
+    """
+    Append a selection to the selection log, if LOG_SELECTIONS is set.
+
+    Args:
+        model (str): Model of the app, 'cshock' or 'hotcore'.
+        stage (str): Selected stage.
+        selection (dict): Selected values of each parameter.
+        species (list): Selected species.
+        path (str): Log file.
+    """
+    if not LOG_SELECTIONS:
+        return
+    record = {'time': datetime.datetime.now().isoformat(timespec='seconds'), 'model': model,
+              **normalize_selection(stage, selection, species)}
+    try:
+        # One write per line, so lines of concurrent threads and processes are not interleaved
+        with open(path, 'a') as file:
+            file.write(json.dumps(record) + "\n")
+    except OSError as error:
+        warnings.warn(f"Could not log the selection to {path}: {error}")
+
+def top_selections(model, n=PREWARM_TOP_N, path=SELECTION_LOG_FILE, n_lines=PREWARM_LOG_LINES):
+    """
+    Most frequent recent selections of a model in the selection log.
+
+    Args:
+        model (str): Model of the app, 'cshock' or 'hotcore'.
+        n (int): Number of selections.
+        path (str): Log file.
+        n_lines (int): Number of most recent lines of the log that are counted.
+
+    Returns:
+        list: Up to n outputs of normalize_selection, most frequent first (empty if there is no log).
+    """
+    if n <= 0 or not os.path.exists(path):
+        return []
+    with open(path) as file:
+        lines = deque(file, maxlen=n_lines)
+
+    counts = Counter()
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            # e.g. a line cut short when the app was stopped
+            continue
+        if record.get('model') == model:
+            counts[json.dumps({key: record[key] for key in ('stage', 'filters', 'species')}, sort_keys=True)] += 1
+    return [json.loads(selection) for selection, _ in counts.most_common(n)]
+
+def prewarm(compute, selections, name="cache prewarming"):
+    """
+    Compute some selections in a background thread, so that their results are cached.
+
+    Args:
+        compute (callable): Called with every output of normalize_selection.
+        selections (list): Selections, e.g. from top_selections.
+        name (str): Name of the thread.
+
+    Returns:
+        threading.Thread or None: The running thread (None if there is nothing to compute).
+    """
+    if not selections:
+        return None
+
+    def run():
+        for selection in selections:
+            try:
+                compute(selection)
+            except Exception as error:
+                # A logged selection may no longer be valid, e.g. after the data changed
+                warnings.warn(f"Could not prewarm the selection {selection}: {error!r}")
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
+
+def layout_values(layout, component_ids):
+    """
+    Initial values of some components of a layout, e.g. the default display settings.
+
+    Args:
+        layout (dash.development.base_component.Component): Layout of an app.
+        component_ids (list): IDs of the components.
+
+    Returns:
+        dict: {component id: initial value}.
+    """
+    return {component.id: getattr(component, 'value', None)
+            for component in layout._traverse()
+            if getattr(component, 'id', None) in component_ids}
@@ -0,0 +1,54 @@
+# File: CMZ_data_explorer/serialization.py
+# -*- coding: utf-8 -*-
+"""
+This module contains the helpers used by the visualization apps (Shocks.py and Protostellar_objects.py)
+to make their responses faster to produce and smaller to send:
+- figures and tables are serialized with orjson, which Plotly supports natively (including NumPy arrays),
+  instead of the standard json module, and
+- responses are compressed by the Flask server (brotli or gzip, whichever the browser accepts).
+
+Both are optional and need extra packages:
+
+    pip install orjson "dash[compress]" brotli
+
+The gain on representative selections is measured with benchmark_payload.py.
+"""
+# Import necessary libraries
+import importlib.util
+import warnings
+import plotly.io as pio
+from config import FAST_JSON, COMPRESS_RESPONSES
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+def configure_json_engine():
+    """
+    Select the JSON engine used by Plotly, and therefore by Dash, to serialize the callback outputs.
+
+    Returns:
+        str: The engine in use, 'orjson' or 'json'.
+    """
+    if FAST_JSON and importlib.util.find_spec("orjson") is not None:
+        pio.json.config.default_engine = "orjson"
+    else:
+        if FAST_JSON:
+            warnings.warn("Fast JSON serialization needs orjson (pip install orjson); using the json module instead.")
+        pio.json.config.default_engine = "json"
+    return pio.json.config.default_engine
+
+def compression_enabled():
+    """
+    Whether the responses of the apps are compressed (the 'compress' argument of dash.Dash).
+
+    Returns:
+        bool: True if COMPRESS_RESPONSES is set and Flask-Compress is installed.
+    """
+    if not COMPRESS_RESPONSES:
+        return False
+    if importlib.util.find_spec("flask_compress") is None:
+        warnings.warn('Response compression needs Flask-Compress (pip install "dash[compress]" brotli); '
+                      'responses are sent uncompressed.')
+        return False
+    return True
@@ -0,0 +1,67 @@
+# File: CMZ_data_explorer/serving.py
+# -*- coding: utf-8 -*-
+"""
+This module starts the server of the visualization apps (Shocks.py and Protostellar_objects.py), as set
+by SERVER_MODE in config.py:
+
+    "development"   the Dash development server, with debugging tools and reloading on code changes,
+    "threaded"      a production WSGI server (waitress) with SERVER_THREADS worker threads, so several
+                    users are served at the same time; needs: pip install waitress
+
+In the threaded mode all threads share the data of the app, which is never modified after loading. Use
+QUERY_BACKEND = "numpy" (or "duckdb") so that selections are filtered in parallel: the pandas filters hold
+Python's global interpreter lock, the NumPy kernels of column_store.py do not. The app can also be served
+by any other WSGI server through its `server` attribute, e.g.
+
+    waitress-serve --threads=8 --listen=127.0.0.1:8050 Shocks:server
+"""
+# Import necessary libraries
+import logging
+import os
+import warnings
+from config import SERVER_MODE, SERVER_HOST, SERVER_PORT, SERVER_THREADS, QUERY_BACKEND
+
+# Messages of the server
+logger = logging.getLogger(__name__)
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+def serve(app, mode=SERVER_MODE, host=SERVER_HOST, port=SERVER_PORT, threads=SERVER_THREADS, on_start=None):
+    """
+    Run the server of an app (blocks until it is stopped).
+
+    Args:
+        app (dash.Dash): The app.
+        mode (str): 'development' or 'threaded'.
+        host (str): Address to listen on.
+        port (int): Port to listen on.
+        threads (int): Worker threads of the threaded server.
+        on_start (callable): Called without arguments just before the server starts, in the process that serves
+                             the requests, e.g. to prewarm the caches; it must return quickly, e.g. by starting
+                             a thread.
+    """
+    if mode == "development":
+        # The development server restarts the app in a child process, which serves the requests
+        if on_start is not None and os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+            on_start()
+        app.run(host=host, port=str(port), debug=True)
+        return
+    if mode != "threaded":
+        raise ValueError(f"Unknown server mode '{mode}'; use 'development' or 'threaded'.")
+    if on_start is not None:
+        on_start()
+
+    if QUERY_BACKEND == "pandas":
+        warnings.warn('With QUERY_BACKEND = "pandas", the filters of concurrent requests hold the GIL and run '
+                      'one at a time; "numpy" or "duckdb" filter them in parallel.')
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        warnings.warn("The threaded server needs waitress (pip install waitress); "
+                      "using the threaded Flask server without debugging tools instead.")
+        app.run(host=host, port=str(port), debug=False, threaded=True)
+        return
+    logger.info("Serving on http://%s:%s with %d threads", host, port, threads)
+    waitress_serve(app.server, host=host, port=port, threads=threads)
@@ -0,0 +1,219 @@
+# File: CMZ_data_explorer/session_store.py
+# -*- coding: utf-8 -*-
+"""
+This module contains the server-side session store of the visualization apps (Shocks.py and
+Protostellar_objects.py) and the server-side paging of their data table.
+
+When the abundance plot is updated, the positions of the selected rows in the stage table are saved once
+in the session store, under the id of the browser tab. The tab only keeps a small description of the
+selection in a dcc.Store (its session id, stage, parameter values and species); the callbacks that
+depend on the selection (ratio plot, table pages, CSV export, point details, run drill-down, zoom) read
+the rows from these positions instead of filtering the stage table again, and nothing is sent back
+to the browser. If the entry has expired (or the data was reloaded), the selection is filtered again
+from its description.
+
+The store is selected with SESSION_STORE in config.py:
+
+    "memory"    a dictionary in the memory of the app's process (the default),
+    "disk"      one file per session in SESSION_STORE_DIR, shared by all the processes of the app, e.g.
+                background jobs (see background_jobs.py) and several server processes.
+
+Entries not used for SESSION_TTL seconds are dropped.
+"""
+# Import necessary libraries
+import os
+import pickle
+import threading
+import time
+import uuid
+import warnings
+from pathlib import Path
+from config import SESSION_STORE, SESSION_STORE_DIR, SESSION_TTL
+
+# Operators of the filter queries of the data table, as written by its filter row, e.g. '{age} > 1e5'
+_FILTER_OPERATORS = [['ge ', '>='], ['le ', '<='], ['lt ', '<'], ['gt ', '>'], ['ne ', '!='], ['eq ', '='],
+                     ['contains ']]
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+def new_session_id():
+    """Id of a new session, e.g. '9f1c0d6a2b7e4e3f8a5b1c2d3e4f5a6b'."""
+    return uuid.uuid4().hex
+
+class MemorySessionStore:
+    """
+    Session entries in the memory of the app's process, dropped when unused for ttl seconds.
+
+    Example:
+        store = MemorySessionStore(1800)
+        store.set(session_id, {'positions': positions})
+        entry = store.get(session_id)   # None once expired
+    """
+
+    def __init__(self, ttl=SESSION_TTL):
+        self.ttl     = ttl
+        self.entries = {}
+        self.lock    = threading.Lock()
+        # A job process may be forked while another thread holds the lock
+        os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self.lock = threading.Lock()
+
+    def set(self, session_id, value):
+        """Save the entry of a session, replacing the previous one."""
+        now = time.monotonic()
+        with self.lock:
+            self.entries[session_id] = (now, value)
+            # Drop the expired entries of other sessions
+            for expired in [key for key, (used, _) in self.entries.items() if now - used > self.ttl]:
+                del self.entries[expired]
+
+    def get(self, session_id):
+        """Entry of a session (None if there is none or it has expired); reading it keeps it alive."""
+        now = time.monotonic()
+        with self.lock:
+            if session_id not in self.entries:
+                return None
+            used, value = self.entries[session_id]
+            if now - used > self.ttl:
+                del self.entries[session_id]
+                return None
+            self.entries[session_id] = (now, value)
+            return value
+
+class DiskSessionStore:
+    """
+    Session entries as files in a local folder, shared by all the processes of the app. Same interface
+    as MemorySessionStore.
+    """
+
+    def __init__(self, directory=SESSION_STORE_DIR, ttl=SESSION_TTL):
+        self.directory = Path(directory)
+        self.ttl       = ttl
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, session_id):
+        # Session ids come from the browser: only their hexadecimal digits are used as a file name
+        return self.directory / (''.join(c for c in str(session_id) if c in '0123456789abcdef') + '.pkl')
+
+    def set(self, session_id, value):
+        """Save the entry of a session, replacing the previous one atomically."""
+        path      = self._path(session_id)
+        temporary = path.with_name(f"{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(temporary, 'wb') as file:
+            pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+        # Drop the expired entries of other sessions
+        now = time.time()
+        for other in self.directory.glob('*.pkl'):
+            try:
+                if now - other.stat().st_mtime > self.ttl:
+                    other.unlink()
+            except FileNotFoundError:
+                pass
+
+    def get(self, session_id):
+        """Entry of a session (None if there is none or it has expired); reading it keeps it alive."""
+        path = self._path(session_id)
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl:
+                path.unlink()
+                return None
+            with open(path, 'rb') as file:
+                value = pickle.load(file)
+            os.utime(path)
+            return value
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+def make_session_store(kind=SESSION_STORE, shared=False):
+    """
+    Create the session store of an app.
+
+    Args:
+        kind (str): 'memory' or 'disk'.
+        shared (bool): Whether the entries must be shared with other processes, e.g. background jobs;
+                       the memory store is then replaced by the disk store.
+
+    Returns:
+        MemorySessionStore or DiskSessionStore: The store.
+    """
+    if kind == "memory" and shared:
+        warnings.warn('Background jobs run in other processes, which do not share SESSION_STORE = "memory"; '
+                      'using the disk session store instead.')
+        kind = "disk"
+    if kind == "memory":
+        return MemorySessionStore()
+    if kind == "disk":
+        return DiskSessionStore()
+    raise ValueError(f"Unknown session store '{kind}'; use 'memory' or 'disk'.")
+
+def _split_filter_part(filter_part):
+    """Column, operator and value of one condition of a filter query, e.g. '{age} > 1e5' -> ('age', 'gt', 1e5)."""
+    for operator_type in _FILTER_OPERATORS:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name       = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+                value_part = value_part.strip()
+                quote      = value_part[:1]
+                if quote and quote == value_part[-1] and quote in ("'", '"', '`'):
+                    value = value_part[1:-1].replace('\\' + quote, quote)
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+                return name, operator_type[0].strip(), value
+    return None, None, None
+
+def filter_rows(df, filter_query):
+    """
+    Rows of a table matching the filter query of a data table.
+
+    Args:
+        df (pd.DataFrame): The table.
+        filter_query (str): Filter query, e.g. '{age} > 1e5 && {run_id} contains cs1'.
+
+    Returns:
+        pd.DataFrame: The matching rows.
+    """
+    for filter_part in (filter_query or "").split(' && '):
+        name, operator, value = _split_filter_part(filter_part)
+        if name not in df.columns:
+            continue
+        column = df[name]
+        if operator == 'contains':
+            df = df.loc[column.astype(str).str.contains(str(value), regex=False)]
+        elif operator in ('ge', 'le', 'lt', 'gt', 'ne', 'eq'):
+            try:
+                df = df.loc[getattr(column, operator)(value)]
+            except TypeError:
+                # A number compared with a text column (or the other way round) matches nothing
+                df = df.iloc[:0]
+    return df
+
+def table_page(df, page_current, page_size, sort_by=None, filter_query=None):
+    """
+    One page of a table, filtered and sorted as requested by a data table with server-side paging.
+
+    Args:
+        df (pd.DataFrame): The table.
+        page_current (int): Page number, from 0.
+        page_size (int): Rows per page.
+        sort_by (list): Sorting of the data table, e.g. [{'column_id': 'age', 'direction': 'asc'}].
+        filter_query (str): Filter query of the data table.
+
+    Returns:
+        tuple: (rows of the page as records, number of pages).
+    """
+    df = filter_rows(df, filter_query)
+    if sort_by:
+        df = df.sort_values([column['column_id'] for column in sort_by],
+                            ascending=[column['direction'] == 'asc' for column in sort_by], kind='stable')
+    n_pages = max(1, -(-len(df) // page_size))
+    page    = df.iloc[page_current * page_size:(page_current + 1) * page_size]
+    return page.to_dict('records'), n_pages
@@ -0,0 +1,184 @@
+# File: CMZ_data_explorer/species_catalog.py
+# -*- coding: utf-8 -*-
+"""
+This module contains the species catalog of the model grids and the on-demand species columns.
+
+The species of a grid are discovered from the column names stored in the HDF5 grid file (every column
+of a run besides the physical quantities), and sorted by phase: gas, surface (prefix '#') and bulk
+(prefix '@'). data_extraction.py writes the catalog as a small JSON file next to the pickle file. The
+apps load it when they start and build their species dropdowns from it. Without a catalog file, the
+species lists of functionality.py are used.
+
+With the full UCLCHEM network (~300 species), only the species of mol_all are kept in the pickle file.
+The others are written to one .npy file per species (the abundances of every row of the pickle file, in
+the same order), in a folder next to the pickle file. The apps read such a column from its memory-mapped
+file the first time the species is selected, so the startup time and memory of the apps do not grow
+with the size of the network.
+"""
+# Import necessary libraries
+import json
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from functionality import mol_all_gas, mol_all_surface, mol_all_bulk
+
+# Columns of a UCLCHEM run that are not species
+NON_SPECIES_COLUMNS = {'Time', 'Density', 'gasTemp', 'dustTemp', 'Av', 'av', 'radfield', 'zeta', 'point',
+                       'BULK', 'SURFACE'}
+# Phases of the catalog, in the order of the dropdowns
+PHASES = ['gas', 'surface', 'bulk']
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+def species_phase(name):
+    """
+    Phase of a species from its name, e.g. 'CH3OH' -> 'gas', '#CH3OH' -> 'surface', '@CH3OH' -> 'bulk'.
+
+    Args:
+        name (str): Name of the species.
+
+    Returns:
+        str: 'gas', 'surface' or 'bulk'.
+    """
+    if name.startswith('#'):
+        return 'surface'
+    if name.startswith('@'):
+        return 'bulk'
+    return 'gas'
+
+def hdf_columns(path, key):
+    """
+    Column names of one table of an HDF5 file written by pandas, read from its metadata only.
+
+    Args:
+        path (str): Path to the HDF5 file.
+        key (str): Key of the table, e.g. a run_id of the grid.
+
+    Returns:
+        list: The column names.
+    """
+    # Only needed when extracting the grid, not by the apps
+    import h5py
+    with h5py.File(path, 'r') as file:
+        group = file[key]
+        # Tables in the 'fixed' format keep their column names in 'axis0'
+        if 'axis0' in group:
+            return [name.decode() if isinstance(name, bytes) else str(name) for name in group['axis0'][()]]
+    # The 'table' format describes its columns in PyTables attributes: read an empty slice of the table
+    return list(pd.read_hdf(path, key, start=0, stop=0).columns)
+
+def discover_species(path, key):
+    """
+    Species of a grid, from the columns of one of its runs.
+
+    Args:
+        path (str): Path to the grid file.
+        key (str): run_id of a run of the grid.
+
+    Returns:
+        list: The species, in the order of the grid file.
+    """
+    return [name for name in hdf_columns(path, key) if name not in NON_SPECIES_COLUMNS]
+
+def make_catalog(species):
+    """
+    Catalog of some species.
+
+    Args:
+        species (list): Names of the species.
+
+    Returns:
+        dict: {phase: species of the phase} for every phase of PHASES, in the given order.
+    """
+    catalog = {phase: [] for phase in PHASES}
+    for name in dict.fromkeys(species):
+        catalog[species_phase(name)].append(name)
+    return catalog
+
+def catalog_species(catalog):
+    """All the species of a catalog, phase by phase."""
+    return [name for phase in PHASES for name in catalog[phase]]
+
+def write_catalog(catalog, path):
+    """
+    Write a catalog to a JSON file, replacing the old one atomically.
+
+    Args:
+        catalog (dict): Output of make_catalog.
+        path (str): Path of the JSON file.
+    """
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'w') as file:
+        json.dump(catalog, file, indent=1)
+    os.replace(temporary, path)
+
+def load_catalog(path):
+    """
+    Read the catalog of a grid.
+
+    Args:
+        path (str): Path of the JSON file written by data_extraction.py.
+
+    Returns:
+        dict: {phase: species}; the species lists of functionality.py if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return {'gas': list(mol_all_gas), 'surface': list(mol_all_surface), 'bulk': list(mol_all_bulk)}
+    with open(path) as file:
+        catalog = json.load(file)
+    return {phase: list(catalog.get(phase, [])) for phase in PHASES}
+
+class SpeciesColumns:
+    """
+    Folder of species columns: one .npy file per species, aligned with the rows of a pickle file.
+
+    Example:
+        columns = SpeciesColumns(cshock_species_dir)
+        cshock_df = columns.append_to(cshock_df, ['H2S', '#H2S'])
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def _path(self, name):
+        return self.directory / f"{name}.npy"
+
+    def __contains__(self, name):
+        return self._path(name).exists()
+
+    def read(self, name):
+        """Memory-mapped, read-only column of a species."""
+        return np.load(self._path(name), mmap_mode='r')
+
+    def write(self, name, values):
+        """Write the column of a species, replacing the old one atomically."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temporary = self.directory / f"{name}.{os.getpid()}.tmp.npy"
+        np.save(temporary, np.asarray(values, dtype=float))
+        os.replace(temporary, self._path(name))
+
+    def append_to(self, df, species):
+        """
+        Add the columns of some species to the table they are aligned with.
+
+        Args:
+            df (pd.DataFrame): Long model table read from the pickle file.
+            species (list): Species with a column file (the others are ignored).
+
+        Returns:
+            pd.DataFrame: df with the columns of the species, or df itself if there is none to add.
+        """
+        species = [name for name in species if name not in df.columns and name in self]
+        if not species:
+            return df
+        columns = {}
+        for name in species:
+            values = self.read(name)
+            if len(values) != len(df):
+                raise ValueError(f"The column file of {name} has {len(values)} rows but the table has {len(df)}; "
+                                 f"extract the species again.")
+            columns[name] = np.array(values)
+        return pd.concat([df, pd.DataFrame(columns, index=df.index)], axis=1)
@@ -0,0 +1,178 @@
+# File: CMZ_data_explorer/sweep.py
+# -*- coding: utf-8 -*-
+"""
+This module contains the parameter-sweep view of the visualization apps (Shocks.py and Protostellar_objects.py):
+the abundance of a species at a reference point of every run (a fixed age, the start or the end of the
+stage, or its peak within the stage), plotted against one grid parameter, with the other parameters
+as colors and facets.
+
+The value of every run of a stage is computed at once, with vectorized reductions over the rows of the
+stage table ordered by run (see run_index.py), and cached per (stage, species, reference point).
+"""
+# Import necessary libraries
+import numpy as np
+import plotly.express as px
+from functionality import format_molecule_HTML
+from selection_cache import ResultCache, cache_budget
+from config import SWEEP_CACHE_SIZE, SWEEP_ABUNDANCE_FLOOR
+
+# Reference points of a run, with their labels
+REFERENCES = {
+    "age": "At a fixed age",
+    "start": "Start of the stage",
+    "end": "End of the stage",
+    "peak": "Peak within the stage",
+}
+
+# Per-run values of recent requests (see selection_cache.py)
+_sweep_cache = ResultCache(SWEEP_CACHE_SIZE, cache_budget)
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+def _first_at_or_after(candidates, starts, stops):
+    """
+    First position of a sorted array of candidate positions within each [start, stop) range.
+
+    Returns:
+        tuple: (positions, found) - positions are only meaningful where found is True.
+    """
+    if candidates.size == 0:
+        return starts.copy(), np.zeros(len(starts), dtype=bool)
+    k         = np.searchsorted(candidates, starts)
+    positions = candidates[np.minimum(k, candidates.size - 1)]
+    return positions, (k < candidates.size) & (positions < stops)
+
+def run_values(runs, species, reference, age=None, parameters=()):
+    """
+    Value of a species at a reference point of every run of a table, vectorized over all runs.
+
+    Args:
+        runs (RunIndex): Run index of the table (e.g. of a stage table).
+        species (str): The species.
+        reference (str): 'age' (log-log interpolation at a fixed age), 'start', 'end' or 'peak'.
+        age (float): Age of the 'age' reference point [yr].
+        parameters (list): Parameter columns reported for every run.
+
+    Returns:
+        pd.DataFrame: One row per run with 'run_id', the parameters, 'age' (of the reference point)
+                      and 'value' (NaN when a run does not reach the reference point).
+    """
+    starts, stops = runs.starts, runs.stops
+    values = runs.df[species].to_numpy(dtype=float)[runs.order]
+    ages   = runs.df['age'].to_numpy(dtype=float)[runs.order]
+
+    if reference == "start":
+        positions, found = starts, np.ones(len(starts), dtype=bool)
+    elif reference == "end":
+        positions, found = stops - 1, np.ones(len(starts), dtype=bool)
+    elif reference == "peak":
+        # np.fmax ignores NaN values; the peak is the first timestep reaching the maximum of the run
+        peaks = np.fmax.reduceat(values, starts)
+        positions, found = _first_at_or_after(np.flatnonzero(values == np.repeat(peaks, stops - starts)), starts, stops)
+    elif reference == "age":
+        positions, found = _first_at_or_after(np.flatnonzero(ages >= age), starts, stops)
+        # Runs starting after the age do not reach it
+        found &= (positions > starts) | (ages[positions] == age)
+    else:
+        raise ValueError(f"Unknown reference point '{reference}'; use one of {list(REFERENCES)}.")
+
+    result_age   = ages[positions]
+    result_value = values[positions]
+    if reference == "age":
+        # Interpolate linearly in log10(age) and log10(abundance) between the timesteps around the age
+        before  = np.maximum(positions - 1, starts)
+        log_age = np.log10(np.maximum(ages, 1e-10))
+        span    = log_age[positions] - log_age[before]
+        weight  = np.divide(np.log10(age) - log_age[before], span, out=np.ones(len(span)), where=span > 0)
+        low     = np.log10(np.maximum(values[before], SWEEP_ABUNDANCE_FLOOR))
+        high    = np.log10(np.maximum(values[positions], SWEEP_ABUNDANCE_FLOOR))
+        result_value = 10 ** (low + weight * (high - low))
+        result_age   = np.full(len(positions), float(age))
+
+    table = runs.df.iloc[runs.order[starts], [runs.df.columns.get_loc(p) for p in parameters]].reset_index(drop=True)
+    table.insert(0, 'run_id', runs.run_ids)
+    table['age']   = np.where(found, result_age, np.nan)
+    table['value'] = np.where(found, result_value, np.nan)
+    return table
+
+def cached_run_values(cache_key, runs, species, reference, age=None, parameters=()):
+    """
+    run_values, cached per request. Only the most recent SWEEP_CACHE_SIZE requests are kept.
+
+    Args:
+        cache_key (tuple): Identifies the table, e.g. (stage,) - combined with the other arguments.
+        runs, species, reference, age, parameters: As for run_values.
+
+    Returns:
+        pd.DataFrame: Output of run_values.
+    """
+    key = (cache_key, species, reference, age if reference == "age" else None, tuple(parameters))
+    return _sweep_cache.get_or_compute(key, lambda: run_values(runs, species, reference, age, parameters))
+
+def clear_sweep_cache(data_version=None):
+    """
+    Remove the cached per-run values of one version of the data (see DataEngine.reload), or all of them.
+
+    Args:
+        data_version (str): Version of the data, the first item of the cache key of the table (all if None).
+    """
+    if data_version is None:
+        _sweep_cache.clear()
+    else:
+        _sweep_cache.discard(lambda key: key[0][0] == data_version)
+
+def sweep_figure(table, species, sweep_parameter, parameters, color=None, facet=None, y_scale="log",
+                 marker_size=12, title=None, labels=None):
+    """
+    Plot per-run values against a parameter. Runs that only differ in the sweep parameter are connected.
+
+    Args:
+        table (pd.DataFrame): Output of run_values (possibly filtered).
+        species (str): The species (for the axis title).
+        sweep_parameter (str): Parameter on the x-axis.
+        parameters (list): All parameters of the runs.
+        color (str): Parameter shown as the color of the lines (optional).
+        facet (str): Parameter shown as one panel per value (optional).
+        y_scale (str): 'log' or 'linear'.
+        marker_size (int): Size of the markers.
+        title (str): Title of the figure.
+        labels (dict): Labels of the parameters.
+
+    Returns:
+        plotly.graph_objects.Figure: The figure.
+    """
+    labels = dict(labels or {})
+    labels['value'] = f"X({format_molecule_HTML(species)})"
+    table  = table.dropna(subset=['value']).sort_values(sweep_parameter)
+
+    # Categorical colors and panels, ordered by value
+    category_orders = {}
+    for column in {color, facet} - {None, sweep_parameter}:
+        ordered = np.sort(table[column].unique())
+        table[column] = table[column].map("{:g}".format)
+        category_orders[column] = ["{:g}".format(value) for value in ordered]
+    others = [p for p in parameters if p not in (sweep_parameter, color, facet)]
+    table['line'] = table[others].astype(str).agg(", ".join, axis=1) if others else ""
+
+    x_values = table[sweep_parameter]
+    fig = px.line(
+        table,
+        x=sweep_parameter,
+        y="value",
+        color=color if color != sweep_parameter else None,
+        facet_col=facet if facet != sweep_parameter else None,
+        facet_col_wrap=3,
+        line_group="line",
+        markers=True,
+        log_x=bool(len(x_values)) and x_values.min() > 0 and x_values.max() / x_values.min() >= 100,
+        log_y=(y_scale == "log"),
+        hover_data={**{p: True for p in parameters}, 'run_id': True, 'age': ':.2e', 'line': False},
+        labels=labels,
+        category_orders=category_orders,
+        title=title,
+    )
+    fig.update_traces(marker=dict(size=marker_size / 2))
+    fig.update_layout(template="seaborn", font=dict(size=14))
+    return fig
@@ -0,0 +1,124 @@
+# File: CMZ_data_explorer/tests/conftest.py
+# -*- coding: utf-8 -*-
+"""
+Shared fixtures of the tests: a small synthetic C-shock grid with the layout of the pickle files
+(one row per run and timestep, the 'stage' column, the run parameters and a few species), so the tests
+run without the model grid. Run them from the codes folder with:
+
+    python -m pytest tests
+"""
+# Import necessary libraries
+import functools
+import itertools
+import os
+import pickle
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# The modules of the apps are imported from the codes folder, as the apps do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import data_engine
+from query_backend import make_query_backend
+from run_summary import summarize_runs
+from species_catalog import SpeciesColumns
+
+# Parameters of the synthetic grid (a subset of ranges_cshock)
+GRID = {
+    "shock_vel": [10., 20.],
+    "initialDens": [1e4, 1e5],
+    "zeta": [10., 100.],
+    "radfield": [10.],
+    "initialTemp": [15., 20.],
+}
+# Species of the synthetic grid
+SPECIES = ["CS", "HCN", "SIO", "#CO", "@CO"]
+# Species of the synthetic grid that are only in column files
+COLUMN_SPECIES = ["H2S", "#H2S"]
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+def make_model_df(seed=0, n_steps=40):
+    """
+    Long model table of a synthetic C-shock grid: every run starts at age 0 (pre-shock), is shocked between
+    10 and 300 yr and then cools down (post-shock) until 1e6 yr.
+
+    Args:
+        seed (int): Seed of the random abundances.
+        n_steps (int): Timesteps of every run.
+
+    Returns:
+        pd.DataFrame: The table, in run and time order.
+    """
+    rng  = np.random.default_rng(seed)
+    ages = np.r_[0., np.logspace(0, 6, n_steps - 1)]
+    runs = []
+    for i, values in enumerate(itertools.product(*GRID.values())):
+        parameters = dict(zip(GRID, values))
+        shocked    = (ages >= 10) & (ages <= 300)
+        temperature = np.where(shocked, parameters["initialTemp"] + 10 * parameters["shock_vel"], parameters["initialTemp"])
+        stage = np.where(ages == 0, "pre-shock", np.where(shocked, "shock", np.where(ages > 300, "post-shock", "unknown")))
+        run = pd.DataFrame({
+            "age": ages,
+            "locDens": parameters["initialDens"] * np.where(shocked, 4., 1.),
+            "locTemp": temperature,
+            "Av": np.full(n_steps, 1.),
+            "stage": stage,
+            "run_id": f"cs{i}",
+            **{name: np.full(n_steps, value) for name, value in parameters.items()},
+        })
+        for name in SPECIES:
+            # Abundances spanning several orders of magnitude, with a few missing values
+            abundance = 10 ** rng.uniform(-16, -6, n_steps)
+            abundance[rng.random(n_steps) < 0.05] = np.nan
+            run[name] = abundance
+        runs.append(run)
+    return pd.concat(runs, ignore_index=True)
+
+def make_engine(directory, monkeypatch, backend="pandas", session_store=None):
+    """
+    Engine of the synthetic grid, with its pickle, summary and species column files written to a folder
+    and used in place of the C-shock files of config.py.
+
+    Args:
+        directory (pathlib.Path): Folder of the data files.
+        monkeypatch (pytest.MonkeyPatch): Restores the configuration after the test.
+        backend (str): Query backend, e.g. 'duckdb'.
+        session_store (MemorySessionStore or DiskSessionStore): Session store of the engine.
+
+    Returns:
+        DataEngine: The engine.
+    """
+    model_df = make_model_df()
+    pkl = directory / "cshock.pkl"
+    with open(pkl, 'wb') as file:
+        pickle.dump(model_df, file)
+    summary_pkl = directory / "cshock_summary.pkl"
+    with open(summary_pkl, 'wb') as file:
+        pickle.dump(summarize_runs(model_df, list(GRID), species=SPECIES), file)
+    species_columns = SpeciesColumns(directory / "species")
+    rng = np.random.default_rng(1)
+    for name in COLUMN_SPECIES:
+        species_columns.write(name, 10 ** rng.uniform(-16, -6, len(model_df)))
+
+    monkeypatch.setattr(data_engine, "LOW_MEMORY_MODE", False)
+    monkeypatch.setattr(data_engine, "make_query_backend", functools.partial(make_query_backend, backend=backend))
+    monkeypatch.setitem(data_engine.MODELS, "cshock", {
+        **data_engine.MODELS["cshock"],
+        "pkl": str(pkl), "summary_pkl": str(summary_pkl), "catalog_json": str(directory / "catalog.json"),
+        "species_dir": str(directory / "species"), "store_dir": str(directory / "store"), "parameters": list(GRID),
+    })
+    return data_engine.DataEngine("cshock", session_store)
+
+@pytest.fixture
+def model_df():
+    return make_model_df()
+
+@pytest.fixture
+def stage_tables(model_df):
+    """Stage tables of the synthetic grid, as built by DataEngine.load."""
+    return {table: model_df[model_df['stage'] == stage].reset_index(drop=True)
+            for table, stage in {"shock": "shock", "postshock": "post-shock"}.items()}
@@ -0,0 +1,53 @@
+# File: CMZ_data_explorer/tests/test_aggregation.py
+# -*- coding: utf-8 -*-
+"""Tests of the row estimates and binned percentiles of oversized selections (aggregation.py)."""
+# Import necessary libraries
+import numpy as np
+import pandas as pd
+import pytest
+from aggregation import parameter_row_counts, estimate_rows, binned_percentiles, envelope_band
+from conftest import GRID
+
+
+def test_estimate_rows_matches_the_filtered_table(model_df):
+    counts    = parameter_row_counts(model_df, list(GRID))
+    selection = {"zeta": [10.], "shock_vel": [10., 20.], "initialTemp": [20.]}
+    mask      = np.ones(len(model_df), dtype=bool)
+    for parameter, values in selection.items():
+        mask &= model_df[parameter].isin(values).to_numpy()
+    assert estimate_rows(counts, selection) == mask.sum()
+    assert estimate_rows(counts, {"zeta": []}) == 0
+
+@pytest.mark.parametrize("percentiles", [(16, 50, 84), (50, 50, 84), (60, 50, 80), (50, 50, 50)])
+def test_binned_percentiles_are_taken_across_runs(stage_tables, percentiles):
+    df    = stage_tables["postshock"]
+    table = binned_percentiles(df, ["CS", "HCN"], n_bins=4, percentiles=percentiles, group_columns=["zeta"])
+    assert list(table.columns) == ["zeta", "age", "species", "lower", "median", "upper", "runs"]
+    assert table["species"].unique().tolist() == ["CS", "HCN"]
+
+    # Reference: per (zeta, age bin), the median of every run in the bin, then the percentiles of these medians
+    log_age = np.log10(df["age"].to_numpy())
+    edges   = np.linspace(log_age.min(), log_age.max() + 1e-9, 5)
+    age_bin = np.searchsorted(edges, log_age, side="right") - 1
+    for row in table.itertuples():
+        in_bin  = (df["zeta"].to_numpy() == row.zeta) & (10 ** (0.5 * (edges[age_bin] + edges[age_bin + 1])) == row.age)
+        medians = df.loc[in_bin].groupby("run_id")[row.species].median().dropna().to_numpy()
+        assert row.runs == df.loc[in_bin, "run_id"].nunique()
+        np.testing.assert_allclose([row.lower, row.median, row.upper], np.percentile(medians, percentiles))
+
+def test_runs_with_more_timesteps_do_not_weigh_more():
+    # Two runs in one bin: one with many timesteps at 1, one with a single timestep at 100
+    df = pd.DataFrame({"age": [1e3] * 10, "run_id": ["cs0"] * 9 + ["cs1"], "CS": [1.] * 9 + [100.]})
+    table = binned_percentiles(df, ["CS"], n_bins=1, percentiles=(0, 50, 100))
+    assert table[["lower", "median", "upper", "runs"]].values.tolist() == [[1., 50.5, 100., 2]]
+
+def test_binned_percentiles_of_an_empty_selection(stage_tables):
+    table = binned_percentiles(stage_tables["shock"].iloc[:0], ["CS"])
+    assert table.empty
+    assert list(table.columns) == ["age", "species", "lower", "median", "upper", "runs"]
+
+@pytest.mark.parametrize("values, band", [([16, 84], (16, 50, 84)), ([50, 84], (49, 50, 84)),
+                                          ([60, 80], (49, 50, 80)), ([50, 50], (49, 50, 51)),
+                                          ([84, 16], (16, 50, 84))])
+def test_envelope_band_surrounds_the_median(values, band):
+    assert envelope_band(values) == band
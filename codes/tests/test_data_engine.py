@@ -0,0 +1,90 @@
+# File: CMZ_data_explorer/tests/test_data_engine.py
+# -*- coding: utf-8 -*-
+"""Tests of the data engine (data_engine.py): species added from their column files, and reloads of the data."""
+# Import necessary libraries
+import threading
+import pandas as pd
+import pytest
+import ratios
+from query_backend import DATABASE_SUFFIXES
+from conftest import COLUMN_SPECIES, make_engine
+
+
+@pytest.fixture(params=["pandas", "numpy", *DATABASE_SUFFIXES])
+def engine(request, tmp_path, monkeypatch):
+    """Engine of the synthetic grid with each query backend."""
+    return make_engine(tmp_path, monkeypatch, request.param)
+
+def test_ensure_species_adds_only_the_new_columns(engine, monkeypatch):
+    expected = engine.load(COLUMN_SPECIES)
+    query    = engine.query
+    # Adding species must not read the pickle file again
+    monkeypatch.setattr(engine, "load", lambda species=(): pytest.fail("ensure_species loaded the data again"))
+
+    engine.ensure_species(["CS", COLUMN_SPECIES[0]])
+    engine.ensure_species(COLUMN_SPECIES)
+    assert list(engine.model_df.columns[-2:]) == COLUMN_SPECIES
+    pd.testing.assert_frame_equal(engine.model_df, expected["model_df"])
+    for table, df in expected["stage_tables"].items():
+        pd.testing.assert_frame_equal(engine.stage_tables[table], df)
+        assert engine.fit_tables[engine.stages[table]] is engine.stage_tables[table]
+        assert engine.stage_runs[table].df is engine.stage_tables[table]
+    assert engine.run_index.df is engine.model_df
+
+    # The queries of the new backend see the new columns; the previous backend is not changed
+    assert type(engine.query) is type(query) and "H2S" not in query.tables["shock"].columns
+    selection = {"zeta": [100.], "initialTemp": [15.]}
+    for table in engine.stage_tables:
+        pd.testing.assert_frame_equal(engine.query.select(table, selection, ["age", "run_id", "H2S", "#H2S"]),
+                                      expected["query"].select(table, selection, ["age", "run_id", "H2S", "#H2S"]),
+                                      check_index_type=False)
+        pd.testing.assert_frame_equal(
+            engine.query.binned_percentiles(table, selection, ["#H2S", "CS"], group_columns=["zeta"]),
+            expected["query"].binned_percentiles(table, selection, ["#H2S", "CS"], group_columns=["zeta"]),
+            check_exact=False)
+    pd.testing.assert_frame_equal(engine.stage_runs["postshock"].rows("cs3"),
+                                  expected["stage_runs"]["postshock"].rows("cs3"))
+
+def test_ensure_species_ignores_unknown_species(engine):
+    model_df = engine.model_df
+    engine.ensure_species(["CS", "XYZ"])
+    assert engine.model_df is model_df
+
+def test_reload_keeps_the_results_of_other_models(engine):
+    engine.ensure_species(COLUMN_SPECIES[:1])
+    selection_key  = engine.selection_key("shock", {"zeta": [10.]})
+    other_key      = ("hotcore-version", selection_key[1:])
+    compute        = lambda: pd.DataFrame({"ratio": [1.]})
+    ratios.cached_ratios_long_table(selection_key, compute, [("CS", "HCN")], ["age"])
+    ratios.cached_ratios_long_table(other_key, compute, [("CS", "HCN")], ["age"])
+
+    engine.reload("new-version")
+    assert engine.data_version == "new-version"
+    # The species read from column files are read again
+    assert COLUMN_SPECIES[0] in engine.stage_tables["shock"].columns
+    assert (selection_key, (("CS", "HCN"),), ("age",)) not in ratios._ratio_cache
+    assert (other_key, (("CS", "HCN"),), ("age",)) in ratios._ratio_cache
+    ratios.clear_ratio_cache()
+
+def test_species_added_during_a_reload_are_kept(engine, monkeypatch):
+    load = engine.load
+    loading, release = threading.Event(), threading.Event()
+    def slow_load(species):
+        loading.set()
+        release.wait(10)
+        return load(species)
+    monkeypatch.setattr(engine, "load", slow_load)
+
+    reload = threading.Thread(target=engine.reload, args=("new-version",))
+    reload.start()
+    loading.wait(10)
+    # A request selects a species while the new version is loaded
+    adding = threading.Thread(target=engine.ensure_species, args=(COLUMN_SPECIES[:1],))
+    adding.start()
+    adding.join(0.2)
+    release.set()
+    reload.join(10)
+    adding.join(10)
+    assert engine.data_version == "new-version"
+    assert COLUMN_SPECIES[0] in engine.stage_tables["shock"].columns
+    assert COLUMN_SPECIES[0] in engine.query.select("shock", {"zeta": [10.]}, [COLUMN_SPECIES[0]]).columns
@@ -0,0 +1,42 @@
+# File: CMZ_data_explorer/tests/test_figures.py
+# -*- coding: utf-8 -*-
+"""Tests of the abundance plot builders and of the lookup of its points (figures.py)."""
+# Import necessary libraries
+import numpy as np
+import pytest
+from aggregation import binned_percentiles, aggregated_figure
+from figures import abundance_figure, point_row, point_details
+from model_page import PAGES
+
+
+def click(fig, trace, point):
+    """clickData of a point of a figure, as sent by the browser."""
+    data       = fig.data[trace]
+    customdata = data.customdata[point]
+    return {"points": [{"curveNumber": trace, "pointIndex": point, "x": float(data.x[point]), "y": float(data.y[point]),
+                        "customdata": customdata.tolist() if isinstance(customdata, np.ndarray) else customdata.item()}]}
+
+@pytest.fixture
+def frame(stage_tables):
+    df = stage_tables["postshock"]
+    df.insert(df.columns.get_loc("zeta") + 1, "zeta_scaled", 1.310 * 1e-17 * df["zeta"])
+    return df
+
+@pytest.mark.parametrize("compact_hover", [True, False])
+def test_clicked_point_is_its_row(frame, compact_hover):
+    page = PAGES["cshock"]
+    df   = frame[frame["zeta"] == 100.].iloc[::3]
+    fig  = abundance_figure(df, ["CS", "HCN"], "Post-shock", "log", 5, page["abundance_hover_data"],
+                            page["abundance_labels"], page["abundance_hovertemplate"], compact_hover=compact_hover)
+    ages = frame["age"].to_numpy()
+    for trace in range(2):
+        for point in (0, 7, len(df) - 1):
+            assert point_row(click(fig, trace, point), ages) == df.index[point]
+    details = point_details(click(fig, 1, 7), frame, page["abundance_hover_data"], page["abundance_labels"])
+    assert f"**Run**: {df['run_id'].iloc[7]} (post-shock)" in details.children
+
+def test_envelope_points_are_not_rows(frame):
+    fig = aggregated_figure(binned_percentiles(frame, ["CS"], n_bins=5), "Post-shock", "log", 5)
+    assert point_row(click(fig, 2, 1), frame["age"].to_numpy()) is None
+    assert point_row(None, frame["age"].to_numpy()) is None
+    assert point_row({"points": [{"x": 1e3, "customdata": len(frame)}]}, frame["age"].to_numpy()) is None
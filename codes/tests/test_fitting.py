@@ -0,0 +1,69 @@
+# File: CMZ_data_explorer/tests/test_fitting.py
+# -*- coding: utf-8 -*-
+"""Tests of the observation-fitting engine (fitting.py)."""
+# Import necessary libraries
+import numpy as np
+import pandas as pd
+import pytest
+from fitting import parse_observations, score_models, fit_models
+from config import FIT_DEFAULT_ERROR_DEX
+from conftest import GRID, SPECIES
+
+
+def test_parse_observations():
+    observations = parse_observations("""
+        # Abundance, ratio and upper limit
+        CS 1e-8 0.2
+        CS/HCN 0.5
+        SIO < 1e-10
+    """, SPECIES)
+    assert observations == [
+        {'name': 'CS', 'numerator': 'CS', 'denominator': None, 'value': 1e-8, 'error': 0.2, 'upper_limit': False},
+        {'name': 'CS/HCN', 'numerator': 'CS', 'denominator': 'HCN', 'value': 0.5, 'error': FIT_DEFAULT_ERROR_DEX,
+         'upper_limit': False},
+        {'name': 'SIO', 'numerator': 'SIO', 'denominator': None, 'value': 1e-10, 'error': FIT_DEFAULT_ERROR_DEX,
+         'upper_limit': True},
+    ]
+    assert parse_observations("", SPECIES) == []
+
+@pytest.mark.parametrize("text", ["XYZ 1e-8", "CS/XYZ 1", "CS abc", "CS -1e-8", "CS 1e-8 0", "CS 1e-8 0.2 extra"])
+def test_parse_observations_rejects_bad_lines(text):
+    with pytest.raises(ValueError):
+        parse_observations(text, SPECIES)
+
+def test_best_model_is_the_observed_one(model_df):
+    # Observations made from one timestep of the grid: it is the best match, with a chi-square of zero
+    target       = model_df.dropna(subset=["CS", "HCN", "SIO"]).iloc[123]
+    observations = parse_observations(f"CS {target['CS']}\nSIO/HCN {target['SIO'] / target['HCN']} 0.1", SPECIES)
+    best = fit_models(model_df, observations, list(GRID), top_k=5)
+    assert len(best) == 5 and best['rank'].tolist() == [1, 2, 3, 4, 5]
+    assert (best.loc[0, 'run_id'], best.loc[0, 'age']) == (target['run_id'], target['age'])
+    assert best.loc[0, 'chi2'] == pytest.approx(0., abs=1e-20)
+    assert best['chi2'].is_monotonic_increasing
+    np.testing.assert_allclose(best.loc[0, ['model CS', 'model SIO/HCN']], [target['CS'], target['SIO'] / target['HCN']])
+
+    # Chi-square of every row, computed directly
+    chi2 = (((np.log10(model_df['CS']) - np.log10(target['CS'])) / FIT_DEFAULT_ERROR_DEX) ** 2
+            + ((np.log10(model_df['SIO'] / model_df['HCN']) - np.log10(target['SIO'] / target['HCN'])) / 0.1) ** 2)
+    finite = np.isfinite(chi2.to_numpy())
+    np.testing.assert_allclose(score_models(model_df, observations)[finite], chi2.to_numpy()[finite], atol=1e-20)
+
+    # One timestep per run
+    per_run = fit_models(model_df, observations, list(GRID), top_k=100, one_per_run=True)
+    assert per_run['run_id'].is_unique and len(per_run) == model_df['run_id'].nunique()
+
+def test_upper_limits_only_penalize_models_above_them():
+    df = pd.DataFrame({"SIO": [1e-12, 1e-10, 1e-8]})
+    observations = parse_observations("SIO < 1e-10 0.5", ["SIO"])
+    np.testing.assert_allclose(score_models(df, observations), [0., 0., (2 / 0.5) ** 2])
+
+@pytest.mark.parametrize("top_k", [0, -3, 2.0])
+def test_top_k_is_at_least_one(model_df, top_k):
+    observations = parse_observations("CS 1e-8", SPECIES)
+    assert len(fit_models(model_df, observations, list(GRID), top_k=top_k)) == max(1, int(top_k))
+
+def test_processes_give_the_serial_ranking(model_df):
+    observations = parse_observations("CS 1e-8\nHCN/SIO 3 0.5\n#CO < 1e-6", SPECIES)
+    serial   = fit_models(model_df, observations, list(GRID), top_k=30, chunk_size=100)
+    parallel = fit_models(model_df, observations, list(GRID), top_k=30, chunk_size=100, n_processes=2)
+    pd.testing.assert_frame_equal(parallel, serial)
@@ -0,0 +1,49 @@
+# File: CMZ_data_explorer/tests/test_model_page.py
+# -*- coding: utf-8 -*-
+"""Tests of the callbacks of the explorer page of a model grid (model_page.py), called as Dash calls them."""
+# Import necessary libraries
+import contextvars
+import dash
+import pytest
+from dash._callback_context import context_value
+from dash._utils import AttributeDict
+from model_page import ModelPage
+from session_store import MemorySessionStore, new_session_id
+from conftest import GRID, COLUMN_SPECIES, make_engine
+
+
+def call_callback(callback, triggered_id, *args):
+    """Call a callback as triggered by a property of a component, e.g. 'btn_csv.n_clicks'."""
+    def run():
+        context_value.set(AttributeDict(triggered_inputs=[{"prop_id": triggered_id, "value": 1}]))
+        return callback(*args)
+    return contextvars.copy_context().run(run)
+
+@pytest.fixture
+def page(tmp_path, monkeypatch):
+    engine = make_engine(tmp_path, monkeypatch, session_store=MemorySessionStore())
+    return ModelPage(dash.Dash(__name__), engine, None)
+
+@pytest.fixture
+def session(page):
+    engine    = page.engine
+    selection = {"zeta": [10.], "shock_vel": [20.]}
+    return engine.save_session(None, "shock", selection, ["CS", "HCN"], engine.selected_positions("shock", selection),
+                               new_session_id)
+
+def test_ratio_csv_is_only_sent_when_its_button_is_clicked(page, session):
+    arguments = (session, ["CS"], ["HCN"], ["enabled"], "log", 5, ["grid"], 1)
+    figure, message, download = call_callback(page.update_ratio_plot, "btn_ratio_csv.n_clicks", *arguments)
+    assert message == "" and download["filename"].endswith(".csv")
+    # After a click, changing the plot does not send the file again
+    _, _, download = call_callback(page.update_ratio_plot, "y-axis-scale.value", *arguments)
+    assert download is dash.no_update
+
+def test_preview_adds_the_species_before_the_job_starts(page):
+    # update_preview runs in the request, before the background job of update_output is forked
+    filters = [GRID[parameter] for _, parameter in page.filters]
+    display = ("log", 5, ["grid"], [], "points", [16, 50, 84], [])
+    assert COLUMN_SPECIES[0] not in page.engine.stage_tables["shock"].columns
+    with pytest.raises(dash.exceptions.PreventUpdate):
+        page.update_preview("shock", ["CS", COLUMN_SPECIES[0]], [], [], *filters, *display)
+    assert COLUMN_SPECIES[0] in page.engine.stage_tables["shock"].columns
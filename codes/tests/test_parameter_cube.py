@@ -0,0 +1,60 @@
+# File: CMZ_data_explorer/tests/test_parameter_cube.py
+# -*- coding: utf-8 -*-
+"""Tests of the parameter cube (parameter_cube.py): its slices against the rows of the long model table."""
+# Import necessary libraries
+import numpy as np
+import pytest
+from parameter_cube import build_parameter_cube, ParameterCube
+from conftest import GRID, SPECIES
+
+# Parameters of one run of the synthetic grid
+RUN = {"shock_vel": 20., "initialDens": 1e5, "zeta": 10., "radfield": 10., "initialTemp": 15.}
+
+
+def run_rows(model_df, **parameters):
+    """Rows of the run with these parameters, without the age 0 (outside the logarithmic age axis)."""
+    rows = model_df[np.logical_and.reduce([model_df[name] == value for name, value in parameters.items()])]
+    return rows[rows["age"] > 0]
+
+def test_slice_of_a_run_is_its_rows(model_df, tmp_path):
+    # The runs have 39 positive ages, spaced as the age axis of the cube
+    cube = build_parameter_cube(model_df, list(GRID), tmp_path / "cube", species=SPECIES, n_ages=39)
+    rows = run_rows(model_df, **RUN)
+    np.testing.assert_allclose(cube.ages, rows["age"], rtol=1e-12)
+
+    values, coords = cube.slice(species=["CS", "SIO"], **RUN)
+    assert values.shape == (39, 2) and list(coords) == ["age", "species"]
+    np.testing.assert_allclose(values, rows[["CS", "SIO"]], rtol=1e-6)
+    stages, _ = cube.stage_slice(**RUN)
+    assert stages.tolist() == rows["stage"].tolist()
+
+    # The accessor opened again reads the same files
+    np.testing.assert_array_equal(ParameterCube(tmp_path / "cube").slice(species="CS", **RUN)[0], values[:, 0])
+
+def test_ages_between_timesteps_are_interpolated_in_log(model_df, tmp_path):
+    # Every other age of the cube is a timestep; the ages between are the geometric means of their neighbours
+    cube   = build_parameter_cube(model_df, list(GRID), tmp_path / "cube", species=SPECIES, n_ages=77)
+    rows   = run_rows(model_df, **RUN)["HCN"].to_numpy()
+    values = cube.slice(species="HCN", **RUN)[0]
+    np.testing.assert_allclose(values[::2], rows, rtol=1e-6)
+    np.testing.assert_allclose(values[1::2], np.sqrt(rows[:-1] * rows[1:]), rtol=1e-5)
+
+def test_slice_over_an_axis_and_an_age(model_df, tmp_path):
+    cube = build_parameter_cube(model_df, list(GRID), tmp_path / "cube", species=SPECIES, n_ages=39)
+    run  = {name: value for name, value in RUN.items() if name != "zeta"}
+    age  = cube.ages[20]
+    values, coords = cube.slice(species="CS", age=age, **run)
+    assert list(coords) == ["zeta"] and coords["zeta"].tolist() == GRID["zeta"]
+    for zeta, value in zip(GRID["zeta"], values):
+        rows = run_rows(model_df, zeta=zeta, **run)
+        np.testing.assert_allclose(value, rows.loc[np.isclose(rows["age"], age), "CS"], rtol=1e-6)
+
+def test_bad_selections_and_axes_are_rejected(model_df, tmp_path):
+    cube = build_parameter_cube(model_df, list(GRID), tmp_path / "cube", species=SPECIES, n_ages=39)
+    with pytest.raises(ValueError):
+        cube.slice(species="CS", zeta=50.)
+    with pytest.raises(ValueError):
+        cube.slice(species="CS", unknown=1.)
+    # Without the temperature, two runs share the same cell
+    with pytest.raises(ValueError):
+        build_parameter_cube(model_df, list(GRID)[:-1], tmp_path / "other", species=SPECIES)
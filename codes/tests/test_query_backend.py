@@ -0,0 +1,77 @@
+# File: CMZ_data_explorer/tests/test_query_backend.py
+# -*- coding: utf-8 -*-
+"""Tests of the query backends (query_backend.py): every backend returns the tables of the pandas backend."""
+# Import necessary libraries
+import numpy as np
+import pandas as pd
+import pytest
+from query_backend import DATABASE_SUFFIXES, QueryBackend, SQLBackend, compare_backends, make_query_backend
+from conftest import GRID
+
+# Selections of the cross-check: everything, and a few parameter values
+SELECTIONS = [
+    {parameter: values for parameter, values in GRID.items()},
+    {"zeta": [100.], "shock_vel": [20.], "initialDens": [1e4, 1e5]},
+]
+
+
+def test_backends_return_the_same_tables(stage_tables):
+    timings = compare_backends(
+        stage_tables,
+        [(table, selection) for table in stage_tables for selection in SELECTIONS],
+        species=["CS", "#CO"],
+        pairs=[("CS", "HCN"), ("#CO", "CS")],
+        id_columns=["age", "run_id", "zeta"],
+        group_columns=["zeta"],
+        percentile_sets=[(16, 50, 84), (50, 50, 84), (60, 50, 80)],
+    )
+    assert {"envelope 50-50-84", "envelope 60-50-80"} <= set(timings.index)
+
+@pytest.mark.parametrize("backend", ["pandas", "numpy", *DATABASE_SUFFIXES])
+def test_empty_selection(stage_tables, tmp_path, backend):
+    data_path = tmp_path / "tables.pkl"
+    data_path.touch()
+    query = make_query_backend(stage_tables, str(data_path), backend)
+    # The text columns of empty results may be typed differently, so only their shape is compared
+    assert query.select("shock", {"zeta": []}, ["age", "run_id", "CS"]).shape == (0, 3)
+    ratios = query.ratios_long_table("shock", {"zeta": []}, [("CS", "HCN")], ["age", "run_id"])
+    assert ratios.empty and list(ratios.columns) == list(
+        QueryBackend(stage_tables).ratios_long_table("shock", {"zeta": []}, [("CS", "HCN")], ["age", "run_id"]).columns)
+    assert query.binned_percentiles("shock", {"zeta": []}, ["CS"]).empty
+
+def test_sql_backend_is_abstract():
+    with pytest.raises(TypeError):
+        SQLBackend({}, "unused.db")
+
+def test_unknown_backend(stage_tables, tmp_path):
+    with pytest.raises(ValueError):
+        make_query_backend(stage_tables, str(tmp_path / "tables.pkl"), "spreadsheet")
+
+@pytest.mark.parametrize("backend", ["pandas", "numpy", *DATABASE_SUFFIXES])
+def test_added_columns_are_queried(stage_tables, tmp_path, backend):
+    data_path = tmp_path / "tables.pkl"
+    data_path.touch()
+    query = make_query_backend(stage_tables, str(data_path), backend)
+
+    # A species added while the app runs, as by DataEngine.with_species
+    extended = {name: df.assign(H2S=2 * df["CS"]) for name, df in stage_tables.items()}
+    added    = query.with_columns(extended, ["H2S"])
+    assert type(added) is type(query)
+    assert "H2S" not in query.tables["shock"].columns
+
+    reference = QueryBackend(extended)
+    selection = SELECTIONS[1]
+    pd.testing.assert_frame_equal(added.select("shock", selection, ["age", "run_id", "H2S"]),
+                                  reference.select("shock", selection, ["age", "run_id", "H2S"]),
+                                  check_index_type=False)
+    pd.testing.assert_frame_equal(added.ratios_long_table("shock", selection, [("H2S", "CS")], ["age", "run_id"]),
+                                  reference.ratios_long_table("shock", selection, [("H2S", "CS")], ["age", "run_id"]),
+                                  check_index_type=False)
+    pd.testing.assert_frame_equal(added.binned_percentiles("postshock", selection, ["H2S", "CS"], n_bins=5),
+                                  reference.binned_percentiles("postshock", selection, ["H2S", "CS"], n_bins=5),
+                                  check_exact=False)
+    # The columns that were already there are still queried as before
+    pd.testing.assert_frame_equal(added.select("postshock", selection, ["age", "CS"]),
+                                  query.select("postshock", selection, ["age", "CS"]))
+    np.testing.assert_array_equal(added.select("shock", selection, ["H2S"]).index,
+                                  query.select("shock", selection, ["age"]).index)
@@ -0,0 +1,72 @@
+# File: CMZ_data_explorer/tests/test_ratios.py
+# -*- coding: utf-8 -*-
+"""Tests of the batched ratio engine and of its per-selection cache (ratios.py)."""
+# Import necessary libraries
+import numpy as np
+import pandas as pd
+import pytest
+import ratios
+from ratios import normalize_pairs, compute_ratios, ratios_long_table, cached_ratios_long_table, clear_ratio_cache
+
+
+@pytest.fixture
+def abundances():
+    return pd.DataFrame({
+        "age": [1., 10., 100., 1000.],
+        "run_id": ["cs1", "cs1", "cs2", "cs2"],
+        "CS": [1e-8, 2e-8, np.nan, 4e-8],
+        "HCN": [1e-9, 0., -1e-9, 2e-9],
+        "SIO": [5e-10, 1e-10, 1e-11, 0.],
+    }, index=[7, 3, 5, 1])
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    """Start and leave every test with an empty ratio cache."""
+    clear_ratio_cache()
+    yield
+    clear_ratio_cache()
+
+def test_pairs_are_cleaned_in_order():
+    assert normalize_pairs([("CS", "HCN"), ("HCN", "HCN"), (None, "CS"), ("SIO", "CS"), ("CS", "HCN")]) == \
+        (("CS", "HCN"), ("SIO", "CS"))
+
+def test_zero_and_negative_denominators_give_nan(abundances):
+    table = compute_ratios(abundances, [("CS", "HCN"), ("SIO", "CS")])
+    assert list(table.columns) == ["CS/HCN", "SIO/CS"]
+    assert list(table.index) == [7, 3, 5, 1]
+    np.testing.assert_allclose(table["CS/HCN"], [10., np.nan, np.nan, 2e1])
+    np.testing.assert_allclose(table["SIO/CS"], [5e-2, 5e-3, np.nan, 0.])
+    assert not np.isinf(table.to_numpy()).any()
+
+def test_long_table_keeps_the_pair_and_row_order(abundances):
+    pairs = [("SIO", "CS"), ("CS", "HCN")]
+    table = ratios_long_table(abundances, pairs, ["age", "run_id"])
+    assert list(table.columns) == ["age", "run_id", "ratio_name", "numerator", "denominator",
+                                   "X_numerator", "X_denominator", "ratio"]
+    # All the rows of the first ratio, then all the rows of the second one
+    assert table["ratio_name"].tolist() == ["SIO/CS"] * 4 + ["CS/HCN"] * 4
+    assert table["age"].tolist() == abundances["age"].tolist() * 2
+    assert table["run_id"].tolist() == abundances["run_id"].tolist() * 2
+    np.testing.assert_array_equal(table["X_numerator"], np.r_[abundances["SIO"], abundances["CS"]])
+    np.testing.assert_array_equal(table["X_denominator"], np.r_[abundances["CS"], abundances["HCN"]])
+    wide = compute_ratios(abundances, pairs)
+    np.testing.assert_array_equal(table["ratio"], np.r_[wide["SIO/CS"], wide["CS/HCN"]])
+
+def test_cache_is_keyed_by_data_version(abundances):
+    calls = []
+    def compute():
+        calls.append(1)
+        return ratios_long_table(abundances, [("CS", "HCN")], ["age"])
+
+    selection = ("shock", (("zeta", (10.,)),))
+    first  = cached_ratios_long_table(("v1", selection), compute, [("CS", "HCN")], ["age"])
+    second = cached_ratios_long_table(("v1", selection), compute, [("CS", "HCN")], ["age"])
+    assert second is first and len(calls) == 1
+    # The same selection of another version of the data, or other ratios, is computed again
+    cached_ratios_long_table(("v2", selection), compute, [("CS", "HCN")], ["age"])
+    cached_ratios_long_table(("v1", selection), compute, [("HCN", "CS")], ["age"])
+    assert len(calls) == 3
+
+    clear_ratio_cache("v1")
+    assert (("v2", selection), (("CS", "HCN"),), ("age",)) in ratios._ratio_cache
+    assert (("v1", selection), (("CS", "HCN"),), ("age",)) not in ratios._ratio_cache
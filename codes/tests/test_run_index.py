@@ -0,0 +1,30 @@
+# File: CMZ_data_explorer/tests/test_run_index.py
+# -*- coding: utf-8 -*-
+"""Tests of the run index of a long model table (run_index.py)."""
+# Import necessary libraries
+import numpy as np
+import pandas as pd
+import pytest
+from run_index import RunIndex
+
+
+def test_rows_of_every_run(model_df):
+    # Runs interleaved, as in a table sorted by age instead of by run
+    df   = model_df.sort_values("age", kind="stable").reset_index(drop=True)
+    runs = RunIndex(df)
+    assert len(runs) == df["run_id"].nunique() and "cs3" in runs and "cs999" not in runs
+    for run_id, expected in df.groupby("run_id", sort=False):
+        pd.testing.assert_frame_equal(runs.rows(run_id), expected)
+        pd.testing.assert_frame_equal(runs.rows(run_id, ["age", "CS"]), expected[["age", "CS"]])
+        start, stop = runs.ranges[run_id]
+        assert stop - start == len(expected)
+        np.testing.assert_array_equal(runs.order[start:stop], expected.index)
+    with pytest.raises(KeyError):
+        runs.rows("cs999")
+
+def test_with_table_keeps_the_ranges(model_df):
+    runs  = RunIndex(model_df)
+    wider = runs.with_table(model_df.assign(H2S=1e-9))
+    assert wider.ranges is runs.ranges and "H2S" not in runs.df.columns
+    expected = model_df.loc[model_df["run_id"] == "cs5", ["age"]].assign(H2S=1e-9)
+    pd.testing.assert_frame_equal(wider.rows("cs5", ["age", "H2S"]), expected)
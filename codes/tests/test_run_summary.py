@@ -0,0 +1,53 @@
+# File: CMZ_data_explorer/tests/test_run_summary.py
+# -*- coding: utf-8 -*-
+"""Tests of the per-run summary table (run_summary.py) against a summary computed run by run."""
+# Import necessary libraries
+import numpy as np
+import pytest
+from run_summary import SUMMARY_STATISTICS, summarize_runs, select_summary, summary_y_range
+from conftest import GRID
+
+
+def _reference_statistics(values, ages, offset_age):
+    """Statistics of one run, stage and species, computed directly."""
+    positive = values[values > 0]
+    peak     = np.nanmax(values) if np.isfinite(values).any() else np.nan
+    span     = ages[-1] - ages[0]
+    at_offset = values[np.flatnonzero(ages <= ages[0] + offset_age)[-1]] if ages[-1] >= ages[0] + offset_age else np.nan
+    return {
+        'start': values[0],
+        'end': values[-1],
+        'min': positive.min() if positive.size else np.nan,
+        'peak': peak,
+        'peak_age': ages[np.flatnonzero(values == peak)[0]] if np.isfinite(peak) else np.nan,
+        'mean': np.trapezoid(values, ages) / span if span > 0 else values[0],
+        'at_offset': at_offset,
+    }
+
+def test_summary_matches_every_run(model_df):
+    species = ["CS", "#CO"]
+    summary = summarize_runs(model_df, list(GRID), species=species, offset_age=1e3)
+    assert len(summary) == model_df.groupby(['run_id', 'stage']).ngroups * len(species)
+
+    for (run_id, stage), rows in model_df.groupby(['run_id', 'stage']):
+        ages = rows['age'].to_numpy()
+        for name in species:
+            row = summary[(summary['run_id'] == run_id) & (summary['stage'] == stage) & (summary['species'] == name)]
+            assert len(row) == 1
+            row = row.iloc[0]
+            assert (row['start_age'], row['end_age'], row['n_steps']) == (ages[0], ages[-1], len(ages))
+            assert all(row[parameter] == rows[parameter].iloc[0] for parameter in GRID)
+            expected = _reference_statistics(rows[name].to_numpy(), ages, 1e3)
+            np.testing.assert_allclose([row[statistic] for statistic in SUMMARY_STATISTICS],
+                                       [expected[statistic] for statistic in SUMMARY_STATISTICS],
+                                       rtol=1e-12, equal_nan=True, err_msg=f"{run_id} {stage} {name}")
+
+def test_selected_summary_and_its_range(model_df):
+    summary  = summarize_runs(model_df, list(GRID), species=["CS", "HCN"])
+    selected = select_summary(summary, "post-shock", ["HCN"], {"zeta": [10.]})
+    assert set(selected['species']) == {"HCN"} and set(selected['zeta']) == {10.}
+    assert len(selected) == model_df.loc[model_df['zeta'] == 10., 'run_id'].nunique()
+
+    rows = model_df[(model_df['stage'] == "post-shock") & (model_df['zeta'] == 10.)]['HCN']
+    assert summary_y_range(selected) == pytest.approx((rows[rows > 0].min(), rows.max()))
+    assert summary_y_range(selected.iloc[:0]) is None
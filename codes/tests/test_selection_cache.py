@@ -0,0 +1,58 @@
+# File: CMZ_data_explorer/tests/test_selection_cache.py
+# -*- coding: utf-8 -*-
+"""Tests of the result caches (selection_cache.py) and of the results kept for them by background jobs."""
+# Import necessary libraries
+import multiprocessing
+import numpy as np
+import pytest
+from selection_cache import ResultCache, CacheBudget
+from background_jobs import SerializedDiskcacheManager, JobResults
+
+diskcache = pytest.importorskip("diskcache")
+
+
+def fail():
+    raise AssertionError("The result was computed again")
+
+def test_least_recently_used_results_are_dropped():
+    cache = ResultCache(2)
+    cache.get_or_compute("a", lambda: 1)
+    cache.get_or_compute("b", lambda: 2)
+    assert cache.get_or_compute("a", fail) == 1
+    cache.get_or_compute("c", lambda: 3)
+    assert "a" in cache and "c" in cache and "b" not in cache
+
+    cache.discard(lambda key: key == "a")
+    assert list(cache.entries) == ["c"]
+
+def test_budget_drops_the_oldest_result_of_any_cache():
+    # Room for two of the results (800 bytes each)
+    budget = CacheBudget(2000 / 2 ** 20)
+    first, second = ResultCache(8, budget), ResultCache(8, budget)
+    first.get_or_compute("a", lambda: np.zeros(100))
+    second.get_or_compute("b", lambda: np.zeros(100))
+    first.get_or_compute("c", lambda: np.zeros(100))
+    assert "a" not in first and "b" in second and "c" in first
+
+def _job(cache, key):
+    """A background job: computes a result in a forked process, then exits."""
+    cache.shared.manager.handle.close()
+    cache.get_or_compute(key, lambda: {"positions": np.arange(5)})
+
+def test_results_of_jobs_are_found_after_the_job(tmp_path):
+    manager = SerializedDiskcacheManager(diskcache.Cache(str(tmp_path)))
+    cache   = ResultCache(8, shared=JobResults(manager, "cshock figures"))
+    key     = ("version", ("shock", (("zeta", (10.,)),)), ("CS",))
+
+    job = multiprocessing.get_context("fork").Process(target=_job, args=(cache, key))
+    job.start()
+    job.join(30)
+    assert job.exitcode == 0
+    assert key not in cache.entries and key in cache
+    np.testing.assert_array_equal(cache.get_or_compute(key, fail)["positions"], np.arange(5))
+    assert key in cache.entries
+
+    # Results computed in the app's process are only kept in its memory; other caches do not see the results
+    cache.get_or_compute("local", lambda: 1)
+    assert "local" not in cache.shared
+    assert key not in ResultCache(8, shared=JobResults(manager, "hotcore figures"))
@@ -0,0 +1,68 @@
+# File: CMZ_data_explorer/tests/test_session_store.py
+# -*- coding: utf-8 -*-
+"""Tests of the session stores and of the server-side paging of the data table (session_store.py)."""
+# Import necessary libraries
+import os
+import time
+import numpy as np
+import pandas as pd
+import pytest
+import session_store
+from session_store import MemorySessionStore, DiskSessionStore, make_session_store, new_session_id, table_page
+
+
+@pytest.fixture(params=["memory", "disk"])
+def store_factory(request, tmp_path):
+    """Creates a store of each kind with a given time to live."""
+    if request.param == "memory":
+        return MemorySessionStore
+    return lambda ttl: DiskSessionStore(tmp_path / "sessions", ttl)
+
+def test_entries_are_saved_and_replaced(store_factory):
+    store      = store_factory(60)
+    session_id = new_session_id()
+    assert store.get(session_id) is None
+
+    store.set(session_id, {"key": ("v1", "shock"), "positions": np.arange(5)})
+    entry = store.get(session_id)
+    assert entry["key"] == ("v1", "shock")
+    np.testing.assert_array_equal(entry["positions"], np.arange(5))
+
+    store.set(session_id, {"key": ("v1", "postshock"), "positions": np.arange(2)})
+    assert store.get(session_id)["key"] == ("v1", "postshock")
+    assert store.get(new_session_id()) is None
+
+def test_entries_expire(store_factory):
+    store = store_factory(0.05)
+    store.set("a1", {"positions": np.arange(3)})
+    time.sleep(0.2)
+    assert store.get("a1") is None
+
+def test_disk_session_ids_are_sanitized(tmp_path):
+    store = DiskSessionStore(tmp_path / "sessions", 60)
+    store.set("../../ab12", {"positions": np.arange(1)})
+    assert os.listdir(tmp_path) == ["sessions"]
+    assert os.listdir(tmp_path / "sessions") == ["ab12.pkl"]
+    assert store.get("../../ab12") is not None
+
+def test_shared_store_is_on_disk(tmp_path, monkeypatch):
+    # The disk store of the app is created in the temporary folder
+    monkeypatch.setattr(session_store, "SESSION_STORE_DIR", tmp_path)
+    monkeypatch.setattr(DiskSessionStore.__init__, "__defaults__", (tmp_path, session_store.SESSION_TTL))
+    with pytest.warns(UserWarning):
+        assert isinstance(make_session_store("memory", shared=True), DiskSessionStore)
+    assert isinstance(make_session_store("memory"), MemorySessionStore)
+    with pytest.raises(ValueError):
+        make_session_store("cloud")
+
+def test_table_page_filters_sorts_and_pages():
+    df = pd.DataFrame({"age": [1., 10., 100., 1000., 1e4], "run_id": ["cs1", "cs2", "cs1", "cs2", "cs10"]})
+    records, n_pages = table_page(df, 0, 2, sort_by=[{"column_id": "age", "direction": "desc"}],
+                                  filter_query="{run_id} contains cs1 && {age} ge 10")
+    assert n_pages == 1
+    assert [record["age"] for record in records] == [1e4, 100.]
+
+    records, n_pages = table_page(df, 2, 2)
+    assert n_pages == 3 and records == [{"age": 1e4, "run_id": "cs10"}]
+    # A number compared with a text column matches nothing
+    assert table_page(df, 0, 2, filter_query="{run_id} gt 5") == ([], 1)
@@ -0,0 +1,54 @@
+# File: CMZ_data_explorer/tests/test_sweep.py
+# -*- coding: utf-8 -*-
+"""Tests of the per-run values of the parameter sweep (sweep.py)."""
+# Import necessary libraries
+import numpy as np
+import pandas as pd
+import pytest
+from run_index import RunIndex
+from sweep import run_values
+
+
+@pytest.fixture
+def runs():
+    """Two runs with interleaved rows: 'a' from 1 to 1000 yr, 'b' from 50 to 500 yr with a tied peak."""
+    df = pd.DataFrame({
+        "run_id": ["a", "b", "a", "a", "b", "b", "a"],
+        "age":    [1., 50., 10., 100., 100., 500., 1000.],
+        "CS":     [1e-8, 1e-9, 1e-6, 1e-10, 1e-7, 1e-7, np.nan],
+        "zeta":   [1., 2., 1., 1., 2., 2., 1.],
+    })
+    return RunIndex(df)
+
+def test_start_end_and_peak(runs):
+    start = run_values(runs, "CS", "start", parameters=["zeta"])
+    assert list(start.columns) == ["run_id", "zeta", "age", "value"]
+    assert start["run_id"].tolist() == ["a", "b"] and start["zeta"].tolist() == [1., 2.]
+    np.testing.assert_array_equal(start[["age", "value"]], [[1., 1e-8], [50., 1e-9]])
+
+    # The last timestep, even with a missing value
+    end = run_values(runs, "CS", "end")
+    np.testing.assert_array_equal(end[["age", "value"]], [[1000., np.nan], [500., 1e-7]])
+
+    # The peak ignores missing values; of two equal maxima, the first one is reported
+    peak = run_values(runs, "CS", "peak")
+    np.testing.assert_array_equal(peak[["age", "value"]], [[10., 1e-6], [100., 1e-7]])
+
+def test_fixed_age_is_interpolated_in_log(runs):
+    # Halfway between 10 and 100 yr in log(age): halfway between 1e-6 and 1e-10 in log(abundance)
+    table = run_values(runs, "CS", "age", age=10 ** 1.5)
+    np.testing.assert_allclose(table.loc[0, "value"], 1e-8)
+    # Run 'b' starts after the age
+    assert table.loc[0, "age"] == pytest.approx(10 ** 1.5)
+    assert np.isnan(table.loc[1, ["age", "value"]].to_numpy(dtype=float)).all()
+
+    # A timestep of both runs
+    table = run_values(runs, "CS", "age", age=100.)
+    np.testing.assert_allclose(table["value"], [1e-10, 1e-7])
+    # After the last timestep of 'b', and next to the missing value of 'a'
+    table = run_values(runs, "CS", "age", age=700.)
+    assert table["value"].isna().all()
+
+def test_unknown_reference_point(runs):
+    with pytest.raises(ValueError):
+        run_values(runs, "CS", "middle")
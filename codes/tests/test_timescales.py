@@ -0,0 +1,58 @@
+# File: CMZ_data_explorer/tests/test_timescales.py
+# -*- coding: utf-8 -*-
+"""Tests of the characteristic timescales of the runs (timescales.py)."""
+# Import necessary libraries
+import numpy as np
+import pandas as pd
+import pytest
+from run_index import RunIndex
+from timescales import _first_in_runs, run_timescales
+
+
+@pytest.fixture
+def runs():
+    """Three runs with interleaved rows; 'c' never exceeds 1e-10 and its ice is never desorbed."""
+    df = pd.DataFrame({
+        "run_id": ["a", "b", "c", "a", "b", "c", "a", "b", "c", "a"],
+        "age":    [1., 1., 1., 10., 10., 10., 100., 100., 100., 1000.],
+        "CS":     [1e-12, 1e-9, 1e-12, 1e-9, 1e-12, np.nan, 1e-8, 1e-8, 1e-11, 1e-13],
+        "#CO":    [1e-5, 1e-4, 1e-6, 1e-7, 1e-4, 2e-6, 1e-4, 1e-6, 2e-6, 1e-6],
+        "zeta":   [1., 2., 3., 1., 2., 3., 1., 2., 3., 1.],
+    })
+    return RunIndex(df)
+
+def test_first_in_runs():
+    mask   = np.array([[False, True], [True, True], [False, False], [False, True], [True, False]])
+    starts = np.array([0, 2])
+    stops  = np.array([2, 5])
+    positions, found = _first_in_runs(mask, starts, stops)
+    assert found.tolist() == [[True, True], [True, True]]
+    assert positions.tolist() == [[1, 0], [4, 3]]
+    # A run without any True position is not found, even when the next run has one
+    positions, found = _first_in_runs(mask[:, :1] & (np.arange(5) > 1)[:, None], starts, stops)
+    assert found.ravel().tolist() == [False, True] and positions[1, 0] == 4
+
+def test_threshold_crossings(runs):
+    table = run_timescales(runs, "threshold", ["CS", "#CO"], threshold=1e-10, parameters=["zeta"])
+    assert list(table.columns) == ["run_id", "zeta", "species", "age"]
+    # The runs of the first species, then of the second one
+    assert table["run_id"].tolist() == ["a", "b", "c"] * 2
+    assert table["species"].tolist() == ["CS"] * 3 + ["#CO"] * 3
+    assert table["zeta"].tolist() == [1., 2., 3.] * 2
+    # Crossed at a later timestep, at the first one, and never (the missing value does not count)
+    np.testing.assert_array_equal(table["age"], [10., 1., np.nan, 1., 1., 1.])
+
+def test_desorption_after_the_peak(runs):
+    table = run_timescales(runs, "desorption", ["#CO"], fraction=0.1)
+    # 'a' drops below a tenth of its first value before its peak, which does not count
+    np.testing.assert_array_equal(table["age"], [1000., 100., np.nan])
+
+def test_transition_of_the_cshock_runs(model_df):
+    table = run_timescales(RunIndex(model_df), "transition", model="cshock")
+    first_post_shock = model_df[model_df["stage"] == "post-shock"].groupby("run_id", sort=False)["age"].min()
+    assert table["species"].unique().tolist() == ["Shock to post-shock"]
+    np.testing.assert_array_equal(table["age"], first_post_shock.loc[table["run_id"]])
+
+def test_unknown_timescale(runs):
+    with pytest.raises(ValueError):
+        run_timescales(runs, "freeze-out", ["CS"])
@@ -0,0 +1,168 @@
+# File: CMZ_data_explorer/timescales.py
+# -*- coding: utf-8 -*-
+"""
+This module contains the characteristic timescales of the visualization apps (Shocks.py and
+Protostellar_objects.py), for every run of a table and every requested species:
+
+    threshold     the age at which the abundance of a species first exceeds a threshold (by default the
+                  1E-14 line drawn on the abundance plots),
+    desorption    the age at which the abundance of an ice species ('#' surface, '@' bulk) first drops below
+                  a fraction of its peak, after the peak,
+    transition    the age at which a run enters its second stage: the post-shock stage of the C-shock runs
+                  (as find_age_for_post_shock in functionality.py) or the hot-core stage of the hot-core runs
+                  (as find_age_for_final_temp).
+
+All the runs and all the species are computed at once, with segmented reductions (np.minimum.reduceat,
+np.fmax.reduceat) over the rows of the table ordered by run (see run_index.py), and cached per
+(table, timescale, species, threshold).
+"""
+# Import necessary libraries
+import numpy as np
+import plotly.express as px
+from selection_cache import ResultCache, cache_budget
+from config import TIMESCALE_CACHE_SIZE, TIMESCALE_THRESHOLD, TIMESCALE_DESORPTION_FRACTION, TIMESCALE_HISTOGRAM_BINS
+
+# Timescales, with their labels
+TIMESCALES = {
+    "threshold": "Abundance first exceeds the threshold",
+    "desorption": "Desorption of the ice (after its peak)",
+    "transition": "Transition to the second stage",
+}
+
+# Second stage of the runs of each model: reached at the first age after min_age where the temperature of the gas
+# equals the temperature column of the run (see find_age_for_post_shock and find_age_for_final_temp)
+TRANSITIONS = {
+    "cshock": dict(label="Shock to post-shock", temperature="initialTemp", min_age=1e1),
+    "hotcore": dict(label="Warm-up to hot core", temperature="final_temp", min_age=0.0),
+}
+
+# Per-run timescales of recent requests (see selection_cache.py)
+_timescale_cache = ResultCache(TIMESCALE_CACHE_SIZE, cache_budget)
+
+# --------------------
+# FUNCTION DEFINITIONS
+# --------------------
+
+def is_ice(species):
+    """Whether a species is an ice species: on the grain surface ('#') or in the bulk of the ice ('@')."""
+    return species.startswith(("#", "@"))
+
+def _first_in_runs(mask, starts, stops):
+    """
+    First position of each run where a (rows x columns) mask, in run order, is True.
+
+    Returns:
+        tuple: (positions, found) of shape (runs x columns) - positions are only meaningful where found is True.
+    """
+    positions = np.where(mask, np.arange(len(mask))[:, None], len(mask))
+    first     = np.minimum.reduceat(positions, starts, axis=0)
+    return first, first < stops[:, None]
+
+def run_timescales(runs, kind, species=(), threshold=TIMESCALE_THRESHOLD, fraction=TIMESCALE_DESORPTION_FRACTION, model=None,
+                   parameters=()):
+    """
+    Characteristic timescale of every run of a table, for several species, vectorized over all runs and species.
+
+    Args:
+        runs (RunIndex): Run index of the table (a stage table, or the full table for the 'transition' timescale).
+        kind (str): 'threshold', 'desorption' or 'transition'.
+        species (list): The species ('threshold' and 'desorption' only).
+        threshold (float): Abundance of the 'threshold' timescale.
+        fraction (float): Fraction of the peak of the 'desorption' timescale.
+        model (str): 'cshock' or 'hotcore' ('transition' only).
+        parameters (list): Parameter columns reported for every run.
+
+    Returns:
+        pd.DataFrame: One row per run and species with 'run_id', the parameters, 'species' and 'age' (NaN when a
+                      run never reaches the timescale). The 'transition' timescale has one row per run, with the
+                      stages as 'species'.
+    """
+    starts, stops = runs.starts, runs.stops
+    ages = runs.df['age'].to_numpy(dtype=float)[runs.order]
+
+    if kind == "transition":
+        transition = TRANSITIONS[model]
+        names  = [transition["label"]]
+        temps  = runs.df['locTemp'].to_numpy(dtype=float)[runs.order]
+        target = runs.df[transition["temperature"]].to_numpy(dtype=float)[runs.order]
+        positions, found = _first_in_runs(((temps == target) & (ages > transition["min_age"]))[:, None], starts, stops)
+    elif kind in ("threshold", "desorption"):
+        names  = list(species)
+        values = runs.df[names].to_numpy(dtype=float)[runs.order]
+        if kind == "threshold":
+            positions, found = _first_in_runs(values > threshold, starts, stops)
+        else:
+            # Peak of every run (np.fmax ignores NaN values), and the first timestep reaching it
+            counts = stops - starts
+            peaks  = np.repeat(np.fmax.reduceat(values, starts, axis=0), counts, axis=0)
+            peak_positions, _ = _first_in_runs(values == peaks, starts, stops)
+            after  = np.arange(len(values))[:, None] >= np.repeat(peak_positions, counts, axis=0)
+            positions, found = _first_in_runs(after & (values < fraction * peaks), starts, stops)
+    else:
+        raise ValueError(f"Unknown timescale '{kind}'; use one of {list(TIMESCALES)}.")
+
+    # One row per run and species: the runs of the first species, then of the second one, ...
+    table = runs.df.iloc[runs.order[starts], [runs.df.columns.get_loc(p) for p in parameters]].reset_index(drop=True)
+    table.insert(0, 'run_id', runs.run_ids)
+    table = table.iloc[np.tile(np.arange(len(table)), len(names))].reset_index(drop=True)
+    table['species'] = np.repeat(names, len(starts))
+    table['age']     = np.where(found, ages[np.minimum(positions, len(ages) - 1)], np.nan).T.ravel()
+    return table
+
+def cached_run_timescales(cache_key, runs, kind, species=(), threshold=TIMESCALE_THRESHOLD, fraction=TIMESCALE_DESORPTION_FRACTION,
+                          model=None, parameters=()):
+    """
+    run_timescales, cached per request. Only the most recent TIMESCALE_CACHE_SIZE requests are kept.
+
+    Args:
+        cache_key (tuple): Identifies the table, e.g. (data version, stage) - combined with the other arguments.
+        runs, kind, species, threshold, fraction, model, parameters: As for run_timescales.
+
+    Returns:
+        pd.DataFrame: Output of run_timescales.
+    """
+    key = (cache_key, kind, tuple(species) if kind != "transition" else (),
+           threshold if kind == "threshold" else None, fraction if kind == "desorption" else None, tuple(parameters))
+    return _timescale_cache.get_or_compute(
+        key, lambda: run_timescales(runs, kind, species, threshold, fraction, model, parameters)
+    )
+
+def clear_timescale_cache(data_version=None):
+    """
+    Remove the cached per-run timescales of one version of the data (see DataEngine.reload), or all of them.
+
+    Args:
+        data_version (str): Version of the data, the first item of the cache key of the table (all if None).
+    """
+    if data_version is None:
+        _timescale_cache.clear()
+    else:
+        _timescale_cache.discard(lambda key: key[0][0] == data_version)
+
+def timescale_figure(table, n_bins=TIMESCALE_HISTOGRAM_BINS, title=None):
+    """
+    Histogram of the timescales of the runs, one color per species.
+
+    Args:
+        table (pd.DataFrame): Output of run_timescales (possibly filtered).
+        n_bins (int): Number of bins of log10(age).
+        title (str): Title of the figure.
+
+    Returns:
+        plotly.graph_objects.Figure: The figure.
+    """
+    table = table.dropna(subset=['age']).assign(log_age=lambda rows: np.log10(np.maximum(rows['age'], 1e-1)))
+    fig = px.histogram(
+        table,
+        x="log_age",
+        color="species",
+        barmode="overlay",
+        opacity=0.7,
+        labels={"log_age": "log<sub>10</sub>(Age [yr])", "species": "Species"},
+        title=title,
+    )
+    # Bins shared by all species; the age of the start of a run can be 0
+    low, high = (table['log_age'].min(), table['log_age'].max()) if len(table) else (0.0, 1.0)
+    fig.update_traces(xbins=dict(start=low, end=high + 1e-9, size=max(high - low, 1e-3) / n_bins))
+    fig.update_layout(template="seaborn", font=dict(size=14), yaxis_title="Number of runs", bargap=0)
+    return fig